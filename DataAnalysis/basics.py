@@ -1,5 +1,16 @@
-from . import pd, np, datetime
-from .database import utils as dbu
+from . import pd, np, datetime, logging, os
+from .config import DATA_VERSION_FILE
+from .database.utils.registry import DatabaseRegistry
+from .database.utils.pipeline import register_write_listener
+from .database.tools.dynamic_analysis import ROLLUP_CONSUMPTION_MEASURES, ROLLUP_SUM_COLUMNS
+
+
+logger = logging.getLogger('standard.analysis')
+db_reg = DatabaseRegistry()
+
+# databases the statistics are derived from; the cache is dropped whenever one of them changes
+STATISTICS_DATABASES = ('dynamic_analyses', 'master')
+STATISTICS_MEASURES = ('price',) + tuple(ROLLUP_CONSUMPTION_MEASURES)
 
 class InvalidAbbreviation(Exception):
     def __init__(self, message:str=None, **kwargs):
@@ -9,40 +20,145 @@ class InvalidAbbreviation(Exception):
 
 
 
+class StatisticsService:
+    """ In-process cache of overall and per-flavor averages served from Dynamic Analyses aggregates
+
+        The first request after a change reads every flavor's sums and counts from the rollup cube
+        in a single grouped query (plus the can measurements and flavor references), so each call
+        afterwards is a dictionary lookup. The cache is dropped when the pipeline reports a write to
+        one of STATISTICS_DATABASES and, for other processes (i.e. the web tier), whenever the shared
+        data version changes (the pipeline bumps it after every run that wrote data), so a lookup
+        only stats the version file.
+
+    """
+    def __init__(self):
+        self._cache:dict|None = None
+        self._signature:tuple|None = None
+
+    def __repr__(self):
+        return f'StatisticsService(cached={self._cache is not None})'
+
+    def invalidate(self):
+        """ Drops the cached statistics; they are rebuilt on the next request """
+        self._cache = None
+        return
+
+    def _on_pipeline_write(self, resources:tuple[str]):
+        if any(res.split('.')[0] in STATISTICS_DATABASES for res in resources):
+            self.invalidate()
+        return
+
+    # @@@@@@@@@@@@@@@@@@@ CACHE @@@@@@@@@@@@@@@@@@@
+
+    @staticmethod
+    def _data_version_signature() -> int:
+        try:
+            return os.stat(DATA_VERSION_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _statistics(self) -> dict:
+        signature = self._data_version_signature()
+        if self._cache is None or signature != self._signature:
+            self._cache = self._build()
+            self._signature = signature
+        return self._cache
+
+    @staticmethod
+    def _build() -> dict:
+        """ Reads all aggregates needed to answer any statistics request """
+        for db_name in STATISTICS_DATABASES:
+            if not db_reg.validate_registration(db_name):
+                db_reg.search_and_register_dbs()
+                break
+
+        dyn_db = db_reg.get_instance('dynamic_analyses')
+        master = db_reg.get_instance('master')
+
+        # every period type covers all boxes, so one type (summed over its periods and locations) is enough
+        sums = dyn_db.get_aggregate(ROLLUP_SUM_COLUMNS, 'rollup_cube', group_by=['flavor'], where_info=[('period_type', 'year')])
+        sums = sums.set_index('flavor')
+
+        def to_averages(totals:pd.DataFrame) -> pd.DataFrame:
+            counts = totals.filter(like='_count').replace(0, np.nan)
+            averages = pd.DataFrame({'price': totals['total_spend'] / counts['price_count']})
+            for prefix in ROLLUP_CONSUMPTION_MEASURES:
+                averages[prefix] = totals[f'{prefix}_sum'] / counts[f'{prefix}_count']
+            return averages.round(2)
 
-# working from purely raw data (no prior analyses/calculations)
-def get_average_empty_can_stats():
-    """Calculate average weight, """
-    for boxes in dbu.get_table_property('box_data', 'box_id'):
-        box = dbu.Box(boxes)
-        box._retrieve_data()
-        return box
+        by_flavor = to_averages(sums)
+        overall = to_averages(sums.sum().to_frame().T).iloc[0].to_dict()
 
+        # overall averages are stored under None, matching an unspecified flavor
+        averages = {flavor:row.to_dict() for flavor, row in by_flavor.iterrows()}
+        averages[None] = overall
 
+        can_measurements = dyn_db.get_data(['parameters', 'value'], 'can_measurements')
+        reference = master.get_data(['abbreviation'], 'reference', where_info=[('type', 'flavor')])
 
+        logger.info('Rebuilt statistics cache for %s flavors', len(sums))
+        return {
+            'averages': averages,
+            'can_measurements': dict(zip(can_measurements['parameters'], can_measurements['value'])),
+            'flavors': set(reference['abbreviation'])
+        }
+
+    # @@@@@@@@@@@@@@@@@@@ STATISTICS @@@@@@@@@@@@@@@@@@@
+
+    def get_average(self, measure:str, flavor_abbreviation:str|None=None) -> float|None:
+        """ Overall average of a measure, or the average for one flavor
+
+            Args:
+                measure (str) : One of price, dv (drink velocity), tts (time to start), finish (finish rate),
+                                pmr, or pvr
+                flavor_abbreviation (str) : Optionally specify a flavor. Default is None, which averages
+                                            over all flavors
+
+            Returns:
+                The average rounded to 2 decimals, or None if no box has the measure
+
+        """
+        assert measure in STATISTICS_MEASURES, f'Invalid measure: {measure}. Expected one from {STATISTICS_MEASURES}'
+        statistics = self._statistics()
+
+        if flavor_abbreviation is not None and flavor_abbreviation not in statistics['flavors']:
+            raise InvalidAbbreviation(abbreviation=flavor_abbreviation)
+
+        averages = statistics['averages'].get(flavor_abbreviation)
+
+        # valid flavors without purchases yet have no statistics
+        if averages is None or pd.isna(averages[measure]):
+            return None
+        return averages[measure]
+
+    def get_can_measurements(self) -> dict[str, float]:
+        """ Average full and empty can mass (g) and volume (fl oz) """
+        return dict(self._statistics()['can_measurements'])
+
+
+statistics = StatisticsService()
+register_write_listener(statistics._on_pipeline_write)
+
+
+
+
+def get_average_empty_can_stats() -> dict[str, float]:
+    """Average empty can mass and volume"""
+    measurements = statistics.get_can_measurements()
+    return {
+        'mass': measurements.get('avg_empty_can_mass'),
+        'volume': measurements.get('avg_empty_can_volume')
+    }
 
 
-# working from semi processed data (one level of analysis/calculation)
 def get_average_price(flavor_abbreviation:str=None) -> float:
     """Calculate overall average, or specify a flavor to calculate average for that specific flavor"""
-
-    if flavor_abbreviation == None:
-        return round(np.average([float(value) for value in dbu.get_table_property('box_data', 'price') if value != 'NA']), 2)
-    if dbu.check_abbreviation_existence(flavor_abbreviation):
-        return round(np.average([float(value) for value in dbu.get_table_property('box_data', 'price', 'flavor', flavor_abbreviation) if value != 'NA']), 2)
-    else:
-        raise InvalidAbbreviation(abbreviation=flavor_abbreviation)
+    return statistics.get_average('price', flavor_abbreviation)
 
 
 def get_average_drink_velocity(flavor_abbreviation:str=None) -> float:
     """Calculate overall DV, or specify a flavor to calculate DV for that specific flavor"""
-    
-    if flavor_abbreviation == None:
-        return round(np.average([float(value) for value in dbu.get_table_property('box_data', 'drink_velocity') if value != 'NA']), 2)
-    if dbu.check_abbreviation_existence(flavor_abbreviation):
-        return round(np.average([float(value) for value in dbu.get_table_property('box_data', 'drink_velocity', 'flavor', flavor_abbreviation) if value != 'NA']), 2)
-    else:
-        raise InvalidAbbreviation(abbreviation=flavor_abbreviation)
+    return statistics.get_average('dv', flavor_abbreviation)
 
 
 
@@ -53,4 +169,3 @@ def _get_time_difference(date_data:tuple[str,str], date_format:str='%m/%d/%Y') -
     datetime_version = [datetime.datetime.strptime(date, date_format) for date in date_data]
     difference = datetime_version[1] - datetime_version[0]
     return difference.days
-    
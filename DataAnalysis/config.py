@@ -1,10 +1,14 @@
 from . import logging, pathlib
+from .log_queue import start_queue_logging
+
+import multiprocessing
 
 # Date Time formats
 ALL_DATETIME_FORMATS = {
     'PRIM_DATE': '%m/%d/%Y', # default date format
     'ALT_DATE': '%B %d, %Y',
     'FILE_DATE': '%m%d%Y',
+    'FILE_DATETIME': '%m%d%Y_%H%M%S', # for outputs written more than once a day
     'PRIM_DATETIME': '%m/%d/%Y %H:%M:%S' # default datetime format
 }
 
@@ -13,6 +17,8 @@ DA_DIR = pathlib.Path(__file__).parent
 # modules
 DATABASE_UTIL_DIR = DA_DIR / 'database'
 DB_DIR = DA_DIR / 'databases'
+# counter bumped whenever the pipeline changes the databases; the website keys its page cache on it
+DATA_VERSION_FILE = DB_DIR / 'data_version.txt'
 
 LOGS_DIR = DA_DIR / 'logs'
 ALL_LOGS = LOGS_DIR / 'all.log'
@@ -23,14 +29,37 @@ ERROR_LOGGING_FILE = LOGS_DIR / 'errors.log'
 # (Default) Config and output directories 
 EXTERNAL_DATA_DIR = pathlib.Path(r'C:\Users\tmalo\Desktop\La Croix Data')
 DB_CONFIG_DIR = DATABASE_UTIL_DIR / 'config_sheets'
-SAVED_TABLE_DATA_DIR = DATABASE_UTIL_DIR / 'saved_table_data'
+CONFIG_SNAPSHOT_DIR = DATABASE_UTIL_DIR / 'config_snapshots' # compiled config sheets (see database/utils/config_snapshot.py)
+CHECKPOINT_DIR = DA_DIR / 'checkpoints'
+PROFILE_DIR = DA_DIR / 'profiles'
+CHART_DIR = DA_DIR / 'charts'
 DEFAULT_PROCESSING_OUTPUT_DIR = EXTERNAL_DATA_DIR / 'processed_data'
 
+# Profiles (people/households tracked separately)
+# each profile's raw data is in EXTERNAL_DATA_DIR / PROFILE_DATA_DIR_NAME / <profile id>; without that
+# directory, the raw data in EXTERNAL_DATA_DIR itself belongs to DEFAULT_PROFILE_ID
+PROFILE_DATA_DIR_NAME = 'profiles'
+DEFAULT_PROFILE_ID = 'default'
+PROFILE_WORKERS = 4 # processes used to process/analyze profiles in parallel
+
 # DB_DIR = EXTERNAL_DATA_DIR / 'databases'
 
 
 
 
+# Logging
+# the handlers of the standard logger write on a background thread, so log calls don't wait on file I/O
+ASYNC_LOGGING = True
+
+# level of each subsystem's logger (children of the standard logger, which holds the handlers)
+# i.e. set standard.processing to DEBUG to log the properties extracted from every MD file
+LOG_LEVELS = {
+    'standard.processing': 'INFO', # raw data extraction and processing (processor.py, raw_data.py)
+    'standard.analysis': 'DEBUG', # static/dynamic analyses, profile summaries, charts
+    'standard.pipeline': 'DEBUG', # scheduler, data context, checkpoints, ledgers, partitions, profiling
+    'standard.database': 'DEBUG' # database instances and the registry
+}
+
 LOGGING_CONFIG = {
     'version': 1,
     'disabled_existing_loggers': False,
@@ -48,6 +77,7 @@ LOGGING_CONFIG = {
             'class': 'logging.FileHandler',
             'filename': ALL_LOGS,
             'mode': 'w',
+            'delay': True,
             'formatter': 'generic'
         },
         'maintenance': {
@@ -55,6 +85,7 @@ LOGGING_CONFIG = {
             'class': 'logging.FileHandler',
             'filename': GENERAL_LOG_FILE,
             'mode': 'w',
+            'delay': True,
             'formatter': 'generic'
         },
         'error_file': {
@@ -62,6 +93,7 @@ LOGGING_CONFIG = {
             'class': 'logging.FileHandler',
             'filename': ERROR_LOGGING_FILE,
             'mode': 'w',
+            'delay': True,
             'formatter': 'error'
         },
         'console': {
@@ -75,9 +107,14 @@ LOGGING_CONFIG = {
             'handlers': ['all_logs', 'maintenance', 'console', 'error_file'],
             'level': 'DEBUG',
             'propagate': False
-        }
+        },
+        **{name:{'level': level} for name, level in LOG_LEVELS.items()}
     }
 }
 
-logging.config.dictConfig(LOGGING_CONFIG)        
+logging.config.dictConfig(LOGGING_CONFIG)
+
+# worker processes log through the parent process (see log_queue.init_worker_logging)
+if ASYNC_LOGGING and multiprocessing.parent_process() is None:
+    start_queue_logging('standard')
 
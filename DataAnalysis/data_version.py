@@ -0,0 +1,66 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+
+# The shared data version counter (a plain integer file), bumped by the pipeline and the website.
+#
+# This module only uses the standard library and imports nothing from the package, so the website
+# loads it by path (see LCTsite app/data/versioning.py) without importing pandas or the pipeline's
+# logging config.
+
+
+@contextlib.contextmanager
+def _exclusive_lock(lock_file:str):
+    """ Holds an exclusive lock on lock_file (blocking until other processes release it) """
+    with open(lock_file, 'a+b') as fn:
+        if fcntl:
+            fcntl.flock(fn, fcntl.LOCK_EX)
+        else:
+            fn.seek(0)
+            msvcrt.locking(fn.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fn, fcntl.LOCK_UN)
+            else:
+                fn.seek(0)
+                msvcrt.locking(fn.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def bump_version_file(version_file:str) -> int:
+    """ Increments the counter in version_file and returns the new value
+
+        The read-increment-write runs under an exclusive lock on ```<version_file>.lock```, so
+        concurrent bumps from any process never hand out the same number, and the new number is
+        written to a temporary file and swapped in, so readers never see a partial number.
+
+        Args:
+            version_file (str) : Path to the counter file (created with 1 if missing)
+
+        Returns:
+            The new version
+
+    """
+    version_file = str(version_file)
+    os.makedirs(os.path.dirname(version_file) or '.', exist_ok=True)
+
+    with _exclusive_lock(f'{version_file}.lock'):
+        try:
+            with open(version_file, 'r') as fn:
+                version = int(fn.read().strip() or 0) + 1
+        except (FileNotFoundError, ValueError):
+            version = 1
+
+        tmp_file = f'{version_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as fn:
+            fn.write(str(version))
+        os.replace(tmp_file, version_file)
+
+    return version
@@ -1,5 +1,5 @@
 
-from ..config import EXTERNAL_DATA_DIR, SAVED_TABLE_DATA_DIR
+from ..config import EXTERNAL_DATA_DIR, DB_CONFIG_DIR, CHECKPOINT_DIR, CHART_DIR
 
 
 
@@ -9,12 +9,97 @@ from ..config import EXTERNAL_DATA_DIR, SAVED_TABLE_DATA_DIR
 from .utils.general import create_reset_databases, DatabaseRegistry
 from .tools.reference import upload_reference_data
 from .tools.raw_data import process_and_export_lc_data
-from .tools.dynamic_analysis import default_fill_can_measurements, update_can_measurements, update_flavor_analysis
+from .tools.dynamic_analysis import default_fill_can_measurements, update_can_measurements, update_flavor_analysis, update_profile_flavor_analysis, update_rollup_cube, update_consumption_series, update_distribution_sketches
 from .tools.static_analyses import update_static_analyses
+from .tools.profile_summaries import update_profile_summaries
+from .tools.charts import render_charts
+from .utils.pipeline import PipelineStage, PipelineScheduler
+from .utils.profiling import StageProfiler
 
 
 db_reg = DatabaseRegistry(search_for_existing=True)
- 
+
+
+# NOTE registration order only matters between stages that touch the same tables; the
+# scheduler derives the dependency graph from what each stage reads and writes
+PIPELINE_STAGES = [
+    PipelineStage(
+        'upload_reference_data', upload_reference_data,
+        reads=(f'file:{DB_CONFIG_DIR / "reference_data.csv"}',),
+        writes=('master.reference',)
+    ),
+    PipelineStage(
+        'process_and_export_lc_data', process_and_export_lc_data,
+        reads=(f'file:{EXTERNAL_DATA_DIR}',),
+        writes=('raw_data.box_purchases', 'raw_data.box_flavors', 'raw_data.can_data', 'master.partition_state'),
+        partitions={'master.partition_state': ('stage', ('process_and_export_lc_data',))},
+        kwargs={'base_data_dir': str(EXTERNAL_DATA_DIR), 'display_processing_stats': True, 'db_export': True}
+    ),
+    PipelineStage(
+        'default_fill_can_measurements', default_fill_can_measurements,
+        writes=('dynamic_analyses.can_measurements',)
+    ),
+    # can measurements in dynamic analyses MUST be updated prior to calculating static analyses
+    PipelineStage(
+        'update_can_measurements', update_can_measurements,
+        reads=('raw_data.can_data',),
+        writes=('dynamic_analyses.can_measurements',)
+    ),
+    PipelineStage(
+        'update_static_analyses', update_static_analyses,
+        reads=('raw_data.box_purchases', 'raw_data.box_flavors', 'raw_data.can_data', 'dynamic_analyses.can_measurements'),
+        writes=('static_analyses.can_analysis', 'static_analyses.box_analysis', 'master.partition_state'),
+        partitions={'master.partition_state': ('stage', ('update_static_analyses',))}
+    ),
+    PipelineStage(
+        'update_flavor_analysis', update_flavor_analysis,
+        reads=('raw_data.box_flavors', 'static_analyses.box_analysis'),
+        writes=('dynamic_analyses.flavor_analysis',)
+    ),
+    PipelineStage(
+        'update_profile_flavor_analysis', update_profile_flavor_analysis,
+        reads=('raw_data.box_flavors', 'static_analyses.box_analysis'),
+        writes=('dynamic_analyses.profile_flavor_analysis', 'master.partition_state'),
+        partitions={'master.partition_state': ('stage', ('update_profile_flavor_analysis',))}
+    ),
+    PipelineStage(
+        'update_rollup_cube', update_rollup_cube,
+        reads=('raw_data.box_purchases', 'raw_data.box_flavors', 'static_analyses.box_analysis'),
+        writes=('dynamic_analyses.rollup_cube', 'dynamic_analyses.processed_items'),
+        partitions={'dynamic_analyses.processed_items': ('consumer', ('rollup_cube.purchases', 'rollup_cube.consumption'))}
+    ),
+    PipelineStage(
+        'update_consumption_series', update_consumption_series,
+        reads=('raw_data.box_purchases', 'raw_data.box_flavors', 'raw_data.can_data'),
+        writes=('dynamic_analyses.consumption_series', 'dynamic_analyses.processed_items'),
+        partitions={'dynamic_analyses.processed_items': ('consumer', ('consumption_series',))}
+    ),
+    PipelineStage(
+        'update_distribution_sketches', update_distribution_sketches,
+        reads=('raw_data.box_purchases', 'raw_data.box_flavors', 'raw_data.can_data', 'static_analyses.can_analysis'),
+        writes=('dynamic_analyses.distribution_sketches', 'dynamic_analyses.processed_items'),
+        partitions={'dynamic_analyses.processed_items': ('consumer', ('distribution_sketches.pmr', 'distribution_sketches.pvr'))}
+    ),
+    PipelineStage(
+        'update_profile_summaries', update_profile_summaries,
+        reads=('raw_data.box_purchases', 'raw_data.box_flavors', 'static_analyses.box_analysis'),
+        writes=('master.profile', 'master.profile_contributions', 'master.partition_state'),
+        partitions={'master.partition_state': ('stage', ('update_profile_summaries',))}
+    ),
+    # charts are pre-rendered for the website once the analyses are up to date
+    PipelineStage(
+        'render_charts', render_charts,
+        reads=('dynamic_analyses.flavor_analysis', 'dynamic_analyses.rollup_cube'),
+        writes=(f'file:{CHART_DIR}',),
+        kwargs={'output_dir': str(CHART_DIR)}
+    )
+]
+
+# graph targets of each preset; their dependencies are resolved by the scheduler
+PRESET_TARGETS:dict[int, tuple[str]|None] = {
+    1: None, # every stage
+    2: ('update_flavor_analysis', 'update_profile_flavor_analysis', 'update_rollup_cube', 'update_consumption_series', 'update_distribution_sketches', 'update_profile_summaries', 'render_charts')
+}
 
 
 
@@ -22,43 +107,94 @@ db_reg = DatabaseRegistry(search_for_existing=True)
 
 class DAUtilPipelinePresets:
     """ Various preserved states of common run sequences """
-    _total_presets:int = 0
+    _total_presets:int = len(PRESET_TARGETS)
+    scheduler = PipelineScheduler(PIPELINE_STAGES, checkpoint_dir=str(CHECKPOINT_DIR))
 
     @classmethod
-    def run_preset(cls, preset:int):
+    def run_preset(cls, preset:int, *, force:bool=False, checkpoint:bool=False, resume:bool=False, profiler:StageProfiler|None=None):
+        """ Runs a preset
+
+            Args:
+                preset (int) : Preset number
+                force (bool) : If true, re-runs the preset's stages even if their inputs are unchanged. Default is False.
+                checkpoint (bool) : If true, saves a checkpoint of every completed stage. Default is False.
+                resume (bool) : If true, stages with a checkpoint matching their inputs are restored from it
+                                instead of re-run (i.e. to pick up after a failed run). Default is False.
+                profiler (StageProfiler) : Optionally profile each stage that runs
+
+        """
         if preset == 1:
             cls.complete_database_reset()
-            cls.extract_and_update_databases()
-            return
+            cls.scheduler.run(PRESET_TARGETS[1], force=force, checkpoint=checkpoint, resume=resume, profiler=profiler)
         elif preset == 2:
             print(f'\t\tPreset 2 - Extracting raw data and updating static/dynamic analyses')
-            cls.extract_and_update_databases()
+            cls.extract_and_update_databases(force=force, checkpoint=checkpoint, resume=resume, profiler=profiler)
         
         else:
             raise ValueError(f'Invalid preset {preset}. Choose between 1 and {cls._total_presets}')
         
+        cls.scheduler.display_timings()
+        return
+
+    @classmethod
+    def run_stages(
+            cls,
+            stages:tuple[str],
+            *,
+            force:bool=False,
+            checkpoint:bool=False,
+            resume:bool=False,
+            profiler:StageProfiler|None=None,
+            profiles:tuple[str]|None=None
+        ):
+        """ Brings individual stages (and the stages they depend on) up to date without resetting anything
+
+            Args:
+                stages (tuple[str]) : Stage names (see PIPELINE_STAGES)
+                force (bool) : If true, re-runs the stages even if their inputs are unchanged. Default is False.
+                checkpoint (bool) : If true, saves a checkpoint of every completed stage. Default is False.
+                resume (bool) : If true, restores stages from matching checkpoints. Default is False.
+                profiler (StageProfiler) : Optionally profile each stage that runs
+                profiles (tuple[str]) : Optionally only re-process the data of these profiles
+
+        """
+        print(f'\t\tRunning stages {stages}')
+        cls.scheduler.run(stages, force=force, checkpoint=checkpoint, resume=resume, profiler=profiler, profiles=profiles)
+        cls.scheduler.display_timings()
+        return
+
+    @classmethod
+    def reprocess_profiles(cls, profiles:tuple[str], *, force:bool=False, checkpoint:bool=False, resume:bool=False, profiler:StageProfiler|None=None):
+        """ Re-extracts and re-analyzes the data of some profiles, leaving the rows of every other profile untouched
+
+            Runs the preset 2 targets; the per-profile stages only process the given profiles, while analyses
+            spanning every profile (i.e. flavor_analysis and the rollup cube) are updated as usual.
+
+            Args:
+                profiles (tuple[str]) : Profile ids (see partitions.profile_data_dirs)
+                force (bool) : If true, also re-runs the stages spanning every profile when their inputs are unchanged. Default is False.
+                checkpoint (bool) : If true, saves a checkpoint of every completed stage. Default is False.
+                resume (bool) : If true, restores stages from matching checkpoints. Default is False.
+                profiler (StageProfiler) : Optionally profile each stage that runs
+
+        """
+        print(f'\t\tRe-processing profiles {profiles}')
+        cls.scheduler.run(PRESET_TARGETS[2], force=force, checkpoint=checkpoint, resume=resume, profiler=profiler, profiles=profiles)
+        cls.scheduler.display_timings()
         return
                 
 
     @staticmethod
     def complete_database_reset():
-        """ Resets databases, fills default data and extracts csv/md data currently in directories
-
-            Order of operations:
-                1. Reset databases
-                2. Upload reference data
-                3. Fill general table of dynamic_analysis.db with default data
-                4. Extract box/can data from CSV/MD directories
-                5. Update general table with extracted values from Processor returned in operation 4
-        
-        
+        """ Resets databases; the pipeline stages then fill every table from scratch
+
+            Resetting also drops the stage state in the master database, so no stage
+            is skipped afterwards.
         
         """
         print(f'\t\tPreset 1 - Resets Databases, processes raw data, and fills all databases')
 
-        create_reset_databases(reset=True, save_table_data=True, output_dir_path=SAVED_TABLE_DATA_DIR)
-        upload_reference_data()
-        default_fill_can_measurements()
+        create_reset_databases(reset=True)
 
         return
     
@@ -80,27 +216,14 @@ class DAUtilPipelinePresets:
             db_export=True
         )
 
-    @staticmethod
-    def extract_and_update_databases():
+    @classmethod
+    def extract_and_update_databases(cls, *, force:bool=False, checkpoint:bool=False, resume:bool=False, profiler:StageProfiler|None=None):
         """ Process Exports and update analyses databases
 
-            Must be executed in this order. Specifically,
-            static_analyses must always come before table_general
-        
+            Runs the preset 2 targets. Stage order follows from the tables each stage
+            reads/writes (see PIPELINE_STAGES), and stages whose inputs are unchanged
+            since their last successful run are skipped.
         
         """
-        process_and_export_lc_data(
-            base_data_dir=str(EXTERNAL_DATA_DIR),
-            display_processing_stats=True,
-            db_export=True
-        )
-
-        # NOTE order is imperitive 
-        # can measurements in dynamic analyses MUST be updated prior to calculating static analyses
-        # then static analyses is required for updating the flavor analyses
-        update_can_measurements()
-        update_static_analyses()
-        update_flavor_analysis()
-
-        return
+        return cls.scheduler.run(PRESET_TARGETS[2], force=force, checkpoint=checkpoint, resume=resume, profiler=profiler)
         
\ No newline at end of file
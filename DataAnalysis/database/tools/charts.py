@@ -0,0 +1,171 @@
+from ... import logging, pd, os, json
+from ...utils import get_current_time
+
+from ..utils.context import DataContext
+from .dynamic_analysis import get_rollup_slice
+
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+from matplotlib.figure import Figure
+
+
+logger = logging.getLogger('standard.analysis')
+
+CHART_FORMATS = ('svg', 'png')
+MANIFEST_FILE = 'manifest.json'
+CHART_DPI = 100
+CHART_SIZE = (8, 4.5)
+
+# standard charts in display order: name -> (title, kind, x label, y label)
+STANDARD_CHARTS = {
+    'flavor_preference': ('Flavor Preference', 'bar', 'Flavor', 'Boxes Purchased'),
+    'finish_rate': ('Average Finish Rate', 'bar', 'Flavor', 'Finish Rate'),
+    'price_by_location': ('Average Price by Location', 'bar', 'Location', 'Price ($)'),
+    'drink_velocity_over_time': ('Drink Velocity Over Time', 'line', 'Month', 'Drink Velocity (days)'),
+}
+
+
+
+def render_charts(
+        output_dir:str,
+        *,
+        formats:tuple[str]=CHART_FORMATS,
+        max_workers:int=4,
+        context:DataContext|None=None
+    ) -> dict:
+    """ Renders the standard charts to files named by their content hash and writes a manifest of them
+
+        Chart data comes from the analysis tables only (nothing is computed per request); rendering
+        is split over a process pool since matplotlib is CPU bound and not thread safe. Unchanged
+        charts keep their file names, so clients can cache chart files indefinitely.
+
+        Args:
+            output_dir (str) : Directory of the chart files and manifest.json
+            formats (tuple[str]) : Image formats rendered for every chart. Default is svg and png
+            max_workers (int) : Maximum number of rendering processes
+            context (DataContext) : Optionally read tables from a pipeline context
+
+        Returns:
+            The manifest
+
+    """
+    assert all(fmt in CHART_FORMATS for fmt in formats), f'Invalid chart format(s): {formats}. Expected from {CHART_FORMATS}'
+    context = context if context else DataContext()
+    os.makedirs(output_dir, exist_ok=True)
+
+    chart_data = _chart_data(context)
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(chart_data))) as executor:
+        futures = {name:executor.submit(_render_chart, name, data, formats) for name, data in chart_data.items()}
+        rendered = {name:future.result() for name, future in futures.items()}
+
+    charts = {}
+    for name, images in rendered.items():
+        title = STANDARD_CHARTS[name][0]
+        charts[name] = {'title': title}
+        for fmt, image in images.items():
+            charts[name][fmt] = _write_hashed(output_dir, name, fmt, image)
+
+    manifest = {'generated': get_current_time('PRIM_DATETIME'), 'charts': charts}
+    previous = read_chart_manifest(output_dir)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(f'{manifest_path}.tmp', 'w') as fn:
+        json.dump(manifest, fn, indent=2)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+    # files of the previous manifest are kept for pages rendered before this one
+    _remove_unreferenced(output_dir, [manifest, previous])
+
+    logger.info('Rendered %s charts (%s) to %s', len(charts), ", ".join(formats), output_dir)
+    return manifest
+
+
+def read_chart_manifest(output_dir:str) -> dict|None:
+    """ Returns the manifest of the last rendered charts, or None if none were rendered yet """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r') as fn:
+            return json.load(fn)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _chart_data(context:DataContext) -> dict[str, dict[str, list]]:
+    """ x/y values of every standard chart """
+    flavors = context.get('dynamic_analyses', 'flavor_analysis', ['flavor', 'total_purchased', 'average_finish_rate'])
+    flavors = flavors.sort_values('total_purchased', ascending=False)
+
+    locations = get_rollup_slice('year', group_by=('location',))
+    locations = locations.dropna(subset=['average_price'])
+
+    velocity = get_rollup_slice('month', group_by=('period',))
+    velocity = velocity.dropna(subset=['average_drink_velocity'])
+
+    def series(x:pd.Series, y:pd.Series) -> dict[str, list]:
+        return {'x': x.astype(str).to_list(), 'y': y.astype(float).round(4).to_list()}
+
+    return {
+        'flavor_preference': series(flavors['flavor'], flavors['total_purchased']),
+        'finish_rate': series(flavors['flavor'], flavors['average_finish_rate'].fillna(0)),
+        'price_by_location': series(locations['location'], locations['average_price']),
+        'drink_velocity_over_time': series(velocity['period'], velocity['average_drink_velocity']),
+    }
+
+
+def _render_chart(name:str, data:dict[str, list], formats:tuple[str]) -> dict[str, bytes]:
+    """ Renders one chart to every format (runs in a worker process) """
+    title, kind, xlabel, ylabel = STANDARD_CHARTS[name]
+
+    # Figure is used directly instead of pyplot so no GUI backend or global figure state is involved
+    fig = Figure(figsize=CHART_SIZE, dpi=CHART_DPI, layout='tight')
+    ax = fig.add_subplot()
+
+    if kind == 'bar':
+        ax.bar(data['x'], data['y'], color='#3a7ca5')
+    else:
+        ax.plot(data['x'], data['y'], marker='o', color='#3a7ca5')
+        ax.set_xticks(ax.get_xticks()[::max(len(data['x']) // 12, 1)])
+
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.tick_params(axis='x', labelrotation=45)
+    if not data['x']:
+        ax.text(0.5, 0.5, 'No data yet', ha='center', va='center', transform=ax.transAxes)
+
+    images = {}
+    # no timestamps or random element ids in the files, so identical charts hash identically
+    with matplotlib.rc_context({'svg.hashsalt': name}):
+        for fmt in formats:
+            buffer = io.BytesIO()
+            metadata = {'Date': None} if fmt == 'svg' else {'Software': None}
+            fig.savefig(buffer, format=fmt, metadata=metadata)
+            images[fmt] = buffer.getvalue()
+    return images
+
+
+def _write_hashed(output_dir:str, name:str, fmt:str, image:bytes) -> str:
+    """ Writes an image as ```<name>.<content hash>.<format>``` (if not already there) and returns the file name """
+    filename = f'{name}.{hashlib.sha256(image).hexdigest()[:12]}.{fmt}'
+    path = os.path.join(output_dir, filename)
+
+    if not os.path.exists(path):
+        with open(f'{path}.tmp', 'wb') as fn:
+            fn.write(image)
+        os.replace(f'{path}.tmp', path)
+    return filename
+
+
+def _remove_unreferenced(output_dir:str, manifests:list[dict|None]):
+    referenced = {MANIFEST_FILE}
+    for manifest in manifests:
+        if manifest:
+            referenced |= {chart[fmt] for chart in manifest['charts'].values() for fmt in CHART_FORMATS if fmt in chart}
+
+    for filename in os.listdir(output_dir):
+        if filename not in referenced and not filename.startswith('.'):
+            os.remove(os.path.join(output_dir, filename))
+    return
@@ -1,9 +1,13 @@
 from ... import Literal, logging, pd, generate, os, np, datetime
-from ...config import DB_DIR
+from ...config import DB_DIR, PROFILE_WORKERS
 
 from ..utils.registry import DatabaseRegistry, Database
+from ..utils.ledger import ProcessedLedger
+from ..utils.sketch import TDigest
+from ..utils.context import DataContext
+from ..utils.partitions import PARTITION_COLUMN, PartitionState, partition_values, split_partitions, frame_fingerprint, map_partitions
 
-logger = logging.getLogger('standard')
+logger = logging.getLogger('standard.analysis')
 db_reg = DatabaseRegistry()
 
 GENERAL_PARAMETERS = [
@@ -13,10 +17,44 @@ GENERAL_PARAMETERS = [
     'avg_empty_can_volume'
 ]
 
-
-
-def default_fill_can_measurements():
-    dyn_db = db_reg.get_instance('dynamic_analyses')
+# rollup cube periods mapped to their pandas period frequency
+ROLLUP_PERIODS = {
+    'month': 'M',
+    'quarter': 'Q',
+    'year': 'Y'
+}
+
+# measures folded in once a box is purchased vs once a box is finished
+ROLLUP_PURCHASE_MEASURES = ['box_count', 'price_count', 'total_spend']
+ROLLUP_CONSUMPTION_MEASURES = {  # cube measure prefix -> (box_analysis column, rollup slice column)
+    'dv': ('drink_velocity', 'average_drink_velocity'),
+    'tts': ('time_to_start', 'average_time_to_start'),
+    'finish': ('completion_percentage', 'average_finish_rate'),
+    'pmr': ('average_pmr', 'average_pmr'),
+    'pvr': ('average_pvr', 'average_pvr')
+}
+ROLLUP_SUM_COLUMNS = ROLLUP_PURCHASE_MEASURES + [f'{prefix}_{agg}' for prefix in ROLLUP_CONSUMPTION_MEASURES for agg in ('sum', 'count')]
+
+# rolling window lengths (days) of the consumption series
+CONSUMPTION_WINDOWS = (7, 30, 90)
+
+# cans per box (flavor) when a box has no can data; boxes are 8 cans unless noted by location
+DEFAULT_CANS_PER_BOX = 8
+LOCATION_CANS_PER_BOX = {
+    'WLG': 6
+}
+
+# distribution sketch scopes and metrics mapped to their source columns
+SKETCH_SCOPES = ('flavor', 'location')
+SKETCH_METRICS = {
+    'pmr': 'percentage_mass_remaining',
+    'pvr': 'percentage_volume_remaining'
+}
+
+
+
+def default_fill_can_measurements(context:DataContext|None=None):
+    context = context if context else DataContext()
 
     table_data = {
         'parameters': GENERAL_PARAMETERS,
@@ -24,22 +62,19 @@ def default_fill_can_measurements():
     }
 
     td_df = pd.DataFrame(table_data)
+    context.sink('dynamic_analyses', 'can_measurements', td_df, if_exists='replace')
 
-    conn, _ = dyn_db.create_connection()
-    td_df.to_sql(name='can_measurements', con=conn, if_exists='replace', index=False)
-    dyn_db.close_commit(conn)
-
-    logger.info(f'Filled DynamicAnalyses Can Measurements table with default parameters: {table_data['parameters']}')
+    logger.info('Filled DynamicAnalyses Can Measurements table with default parameters: %s', table_data['parameters'])
 
-def update_can_measurements():
+def update_can_measurements(context:DataContext|None=None):
     """ Updates the parameters in the can measurements table 
     
     
     """
-    raw_data_db = db_reg.get_instance('raw_data')
+    context = context if context else DataContext()
 
     # update empty can measurements
-    ec_measurements = raw_data_db.get_data(['initial_mass', 'initial_volume', 'empty_can_mass'], 'can_data')
+    ec_measurements = context.get('raw_data', 'can_data', ['initial_mass', 'initial_volume', 'empty_can_mass'])
 
     # Remove empty values and calculate volume (fl oz) for each remaining mass
     valid_measurements = ec_measurements[ec_measurements['empty_can_mass'].notna()].reset_index()
@@ -73,54 +108,405 @@ def update_can_measurements():
 
 
 
-def update_flavor_analysis(if_exists:Literal['fail', 'replace', 'append']='append', display_update:bool=False):
+def update_flavor_analysis(
+        if_exists:Literal['fail', 'replace', 'append']='replace',
+        display_update:bool=False,
+        context:DataContext|None=None
+    ):
+    """ Calculates the analysis of every flavor across all profiles (rewriting the whole table by default, 
+        since every flavor is recalculated from all boxes)
+    
     """
+    context = context if context else DataContext()
     
+    static_df = context.get('static_analyses', 'box_analysis')
+    flavor_df = context.get('raw_data', 'box_flavors', ['id', 'flavor'])
+
+    df = _flavor_summary(flavor_df, static_df)
+
+    if display_update:
+        print(df)
+
+    context.sink('dynamic_analyses', 'flavor_analysis', df, if_exists=if_exists)
+
+    logger.info('Updated flavor_analysis table of Dynamic Analyses')
+
+    return
+
+
+def update_profile_flavor_analysis(
+        profiles:tuple[str]|None=None,
+        *,
+        max_workers:int=PROFILE_WORKERS,
+        context:DataContext|None=None
+    ):
+    """ Calculates the flavor analysis of each profile whose boxes or box analyses changed, replacing only
+        that profile's rows of the profile_flavor_analysis table of Dynamic Analyses
+
+        Args:
+            profiles (tuple[str]) : Optionally only (re-)analyze these profiles, whether or not their data changed.
+                                    Default is None, which analyzes every profile with changed data.
+            max_workers (int) : Maximum number of profiles analyzed at once
+            context (DataContext) : Optionally read (and write) tables through a pipeline context
     
     """
+    context = context if context else DataContext()
 
-    static_analyses = db_reg.get_instance('static_analyses')
-    raw_data = db_reg.get_instance('raw_data')
-    
-    static_df = static_analyses.get_data(['*'], 'box_analysis')
-    flavor_df = raw_data.get_data(['id', 'flavor'], 'box_flavors')
+    static_df = context.get('static_analyses', 'box_analysis')
+    flavor_df = context.get('raw_data', 'box_flavors', ['id', 'flavor', PARTITION_COLUMN])
 
-    all_data = []
-    for flavor, df in flavor_df.groupby('flavor'):
-        bf_ids = df['id'].to_list()
+    all_profiles = list(profiles) if profiles else partition_values(flavor_df)
+    profile_flavors = split_partitions(flavor_df, all_profiles)
+    profile_statics = split_partitions(static_df, all_profiles)
 
-        analyses = static_df[static_df['box_id'].isin(bf_ids)]
+    state = PartitionState('update_profile_flavor_analysis')
+    fingerprints = {profile:frame_fingerprint(profile_flavors[profile], profile_statics[profile]) for profile in all_profiles}
+    changed = all_profiles if profiles else state.changed(fingerprints)
+    # flavor analyses of profiles whose boxes were all removed
+    removed = [] if profiles else state.stale(all_profiles)
 
-        
-        
-        package = { # NOTE all means are double mean
-            'flavor': flavor,
-            'total_purchased': len(df),
-            'average_drink_velocity':analyses['drink_velocity'].mean(),
-            'average_time_to_start':analyses['time_to_start'].mean(),
-            'average_finish_rate': analyses['completion_percentage'].mean(),
-            'average_pmr': analyses['average_pmr'].mean(), 
-            'average_pvr': analyses['average_pvr'].mean()
-        }
+    if removed:
+        context.sink_partitions('dynamic_analyses', 'profile_flavor_analysis', {profile:pd.DataFrame() for profile in removed})
+        state.forget(removed)
+        logger.info('Removed the profile_flavor_analysis rows of deleted profiles %s', removed)
 
-        all_data.append(package)
+    results = map_partitions(
+        _profile_flavor_summary, 
+        {profile:(profile, profile_flavors[profile], profile_statics[profile]) for profile in changed}, 
+        max_workers=max_workers
+    )
 
-    
-    df = pd.DataFrame(all_data)
+    if results:
+        context.sink_partitions('dynamic_analyses', 'profile_flavor_analysis', results)
+        state.record({profile:fingerprints[profile] for profile in changed})
 
-    if display_update:
-        print(df)
+    logger.info('Updated profile_flavor_analysis table of Dynamic Analyses for profiles %s', list(changed))
+    return
+
+
+def _flavor_summary(flavor_df:pd.DataFrame, static_df:pd.DataFrame) -> pd.DataFrame:
+    """ Number of boxes and mean box analyses of each flavor """
+    merged = flavor_df[['id', 'flavor']].merge(static_df.drop(columns=[PARTITION_COLUMN], errors='ignore'), left_on='id', right_on='box_id', how='left')
+    grouped = merged.groupby('flavor')
+
+    df = pd.DataFrame({ # NOTE all means are double mean
+        'total_purchased': grouped.size(),
+        'average_drink_velocity': grouped['drink_velocity'].mean(),
+        'average_time_to_start': grouped['time_to_start'].mean(),
+        'average_finish_rate': grouped['completion_percentage'].mean(),
+        'average_pmr': grouped['average_pmr'].mean(),
+        'average_pvr': grouped['average_pvr'].mean()
+    })
+    return df.rename_axis('flavor').reset_index()
+
+
+def _profile_flavor_summary(profile_id:str, flavor_df:pd.DataFrame, static_df:pd.DataFrame) -> pd.DataFrame:
+    """ Flavor analysis of one profile, keyed by <profile id>.<flavor> (run in a worker process) """
+    df = _flavor_summary(flavor_df, static_df)
+    df.insert(0, PARTITION_COLUMN, profile_id)
+    df.insert(0, 'id', profile_id + '.' + df['flavor'])
+    return df
+
+
+
+def update_rollup_cube(context:DataContext|None=None):
+    """ Incrementally folds new boxes into the flavor x location x period rollup cube of Dynamic Analyses
+
+        The cube stores sums and counts (not means) so new boxes can be added onto existing rows
+        and any slice can be re-aggregated in SQL. Each box (flavor) is folded in twice, tracked by
+        separate ledgers:
+            1. Once it is purchased -> box_count, price_count, total_spend
+            2. Once it is finished (has a drink velocity) -> dv, tts, finish, pmr, pvr sums and counts
+
+        Periods are based on the purchase date. Prices of multi-flavor purchases (i.e. costco packs)
+        are split evenly between the flavors of that purchase.
+
+    """
+    context = context if context else DataContext()
+    dyn_db = db_reg.get_instance('dynamic_analyses')
+
+    purchase_ledger = ProcessedLedger(dyn_db, 'rollup_cube.purchases')
+    consumption_ledger = ProcessedLedger(dyn_db, 'rollup_cube.consumption')
+
+    flavor_df = context.get('raw_data', 'box_flavors', ['id', 'box_id', 'flavor'])
+    purchase_df = context.get('raw_data', 'box_purchases', ['id', 'purchase_date', 'price', 'location'])
+    analysis_df = context.get('static_analyses', 'box_analysis', ['box_id'] + [col for col, _ in ROLLUP_CONSUMPTION_MEASURES.values()])
+
+    # one row per box (flavor) with its purchase and analysis data
+    boxes = flavor_df.merge(purchase_df.rename(columns={'id': 'box_id'}), on='box_id', how='left')
+    boxes['price'] = boxes['price'] / boxes.groupby('box_id')['id'].transform('size')
+    boxes['purchase_date'] = pd.to_datetime(boxes['purchase_date'], errors='coerce')
+    boxes['location'] = boxes['location'].fillna('NA')
+    boxes = boxes[boxes['purchase_date'].notna()]
+    boxes = boxes.merge(analysis_df.rename(columns={'box_id': 'id'}), on='id', how='left')
+
+    # purchase measures for boxes not folded in yet
+    new_purchases = boxes[boxes['id'].isin(purchase_ledger.filter_unprocessed(boxes['id'].to_list()))]
+    purchase_measures = pd.DataFrame({
+        'box_count': 1,
+        'price_count': new_purchases['price'].notna().astype(int),
+        'total_spend': new_purchases['price'].fillna(0)
+    }, index=new_purchases.index)
+
+    # consumption measures for finished boxes not folded in yet
+    finished = boxes[boxes['drink_velocity'].notna()]
+    new_finished = finished[finished['id'].isin(consumption_ledger.filter_unprocessed(finished['id'].to_list()))]
+    consumption_measures = pd.DataFrame(index=new_finished.index)
+    for prefix, (column, _) in ROLLUP_CONSUMPTION_MEASURES.items():
+        consumption_measures[f'{prefix}_sum'] = new_finished[column].fillna(0)
+        consumption_measures[f'{prefix}_count'] = new_finished[column].notna().astype(int)
+
+    contributions = pd.concat([
+        pd.concat([new_purchases[['purchase_date', 'flavor', 'location']], purchase_measures], axis=1),
+        pd.concat([new_finished[['purchase_date', 'flavor', 'location']], consumption_measures], axis=1)
+    ], ignore_index=True)
+
+    contributions[ROLLUP_SUM_COLUMNS] = contributions.reindex(columns=ROLLUP_SUM_COLUMNS).fillna(0)
+
+    # explode each contribution into one row per period type, then collapse onto cube keys
+    all_periods = []
+    for period_type, freq in ROLLUP_PERIODS.items():
+        periodic = contributions.drop(columns='purchase_date')
+        periodic.insert(0, 'period', contributions['purchase_date'].dt.to_period(freq).astype(str))
+        periodic.insert(0, 'period_type', period_type)
+        all_periods.append(periodic)
+
+    cube_delta = pd.concat(all_periods, ignore_index=True).groupby(['period_type', 'period', 'flavor', 'location'], as_index=False)[ROLLUP_SUM_COLUMNS].sum()
+    cube_delta.insert(0, 'id', cube_delta['period_type'] + '.' + cube_delta['period'] + '.' + cube_delta['flavor'] + '.' + cube_delta['location'])
+
+    # cube and ledgers are committed together so a box is never counted twice
+    conn, _ = dyn_db.create_connection()
+    dyn_db.upsert_values('rollup_cube', cube_delta, increment_columns=ROLLUP_SUM_COLUMNS, connection=conn)
+    purchase_ledger.record(new_purchases['id'].to_list(), connection=conn)
+    consumption_ledger.record(new_finished['id'].to_list(), connection=conn)
+    dyn_db.close_commit(conn)
+
+    logger.info('Folded %s purchased and %s finished boxes into the rollup cube', len(new_purchases), len(new_finished))
+    return
+
+
+def get_rollup_slice(
+        period_type:Literal['month', 'quarter', 'year']='month',
+        *,
+        flavor:str|None=None,
+        location:str|None=None,
+        group_by:tuple[str]=('period',)
+    ) -> pd.DataFrame:
+    """ Returns a slice of the rollup cube with its means, aggregated in SQL
 
+        Args:
+            period_type (str) : Time bucket of the slice. One of month, quarter, or year
+            flavor (str) : Optionally restrict the slice to one flavor abbreviation
+            location (str) : Optionally restrict the slice to one location abbreviation
+            group_by (tuple[str]) : Cube dimensions to keep. Remaining dimensions are summed over.
+                                    Default is by period only (i.e. all flavors and locations).
+
+        Returns:
+            A dataframe with the group_by columns, box_count, total_spend and the mean price, drink
+            velocity, time to start, finish rate, pmr and pvr of each group
+
+    """
+    assert period_type in ROLLUP_PERIODS, f'Invalid period type: {period_type}. Expected one from {ROLLUP_PERIODS.keys()}'
+    assert all(dim in ('period', 'flavor', 'location') for dim in group_by), f'Invalid rollup dimension(s): {group_by}'
+
+    dyn_db = db_reg.get_instance('dynamic_analyses')
+
+    where_info = [('period_type', period_type)]
+    if flavor:
+        where_info.append(('flavor', flavor))
+    if location:
+        where_info.append(('location', location))
+
+    sums = dyn_db.get_aggregate(ROLLUP_SUM_COLUMNS, 'rollup_cube', group_by=list(group_by), where_info=where_info)
+
+    rollup = sums[list(group_by) + ['box_count', 'total_spend']].copy()
+    rollup['average_price'] = sums['total_spend'] / sums['price_count'].replace(0, np.nan)
+    for prefix, (_, slice_column) in ROLLUP_CONSUMPTION_MEASURES.items():
+        rollup[slice_column] = sums[f'{prefix}_sum'] / sums[f'{prefix}_count'].replace(0, np.nan)
+
+    return rollup.sort_values(list(group_by), ignore_index=True)
+
+
+def update_consumption_series(context:DataContext|None=None):
+    """ Incrementally extends the daily consumption series of Dynamic Analyses with newly finished boxes
+
+        Each finished box spreads its cans evenly over its active span (start to finish date, inclusive).
+        Only boxes missing from the ledger are exploded into daily rates; the cumulative and rolling
+        (see CONSUMPTION_WINDOWS) columns are then re-derived from the stored daily series starting
+        at the earliest day the new boxes touch.
+
+    """
+    context = context if context else DataContext()
     dyn_db = db_reg.get_instance('dynamic_analyses')
+    ledger = ProcessedLedger(dyn_db, 'consumption_series')
+
+    flavor_df = context.get('raw_data', 'box_flavors', ['id', 'box_id', 'start_date', 'finish_date'])
+    purchase_df = context.get('raw_data', 'box_purchases', ['id', 'location'])
+    can_counts = context.get('raw_data', 'can_data')['box_id'].value_counts()
+
+    flavor_df = flavor_df.assign(
+        start_date=pd.to_datetime(flavor_df['start_date'], errors='coerce').dt.normalize(),
+        finish_date=pd.to_datetime(flavor_df['finish_date'], errors='coerce').dt.normalize()
+    )
+    finished = flavor_df[flavor_df['start_date'].notna() & (flavor_df['finish_date'] >= flavor_df['start_date'])]
+    boxes = finished[finished['id'].isin(ledger.filter_unprocessed(finished['id'].to_list()))]
+
+    if boxes.empty:
+        logger.info('No newly finished boxes to add to the consumption series')
+        return
+
+    # can amount per box, falling back to the typical box size of the purchase location
+    locations = boxes['box_id'].map(purchase_df.set_index('id')['location'])
+    default_cans = locations.map(LOCATION_CANS_PER_BOX).fillna(DEFAULT_CANS_PER_BOX)
+    cans = boxes['id'].map(can_counts).fillna(default_cans)
+
+    # interval -> calendar explode: repeat each box once per active day then offset by the day number
+    days = ((boxes['finish_date'] - boxes['start_date']).dt.days + 1).to_numpy()
+    starts = np.repeat(boxes['start_date'].to_numpy(dtype='datetime64[D]'), days)
+    day_offsets = np.arange(days.sum()) - np.repeat(np.cumsum(days) - days, days)
+    daily_rates = pd.Series(np.repeat(cans.to_numpy() / days, days), index=starts + day_offsets.astype('timedelta64[D]'))
+    new_daily = daily_rates.groupby(level=0).sum()
+
+    # merge onto the stored daily amounts (one row per day, not per box)
+    stored = dyn_db.get_data(['date', 'cans'], 'consumption_series')
+    stored_daily = pd.Series(stored['cans'].to_numpy(), index=pd.to_datetime(stored['date']))
+    daily = stored_daily.add(new_daily, fill_value=0)
+    daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq='D'), fill_value=0)
+
+    cumulative = daily.cumsum()
+    series = pd.DataFrame({
+        'date': daily.index.strftime('%Y-%m-%d'),
+        'cans': daily.to_numpy(),
+        'cumulative_cans': cumulative.to_numpy()
+    })
+    for window in CONSUMPTION_WINDOWS:
+        series[f'rolling_{window}'] = (cumulative - cumulative.shift(window, fill_value=0)).to_numpy()
+
+    # days before the first day touched by the new boxes are unchanged
+    changed = series[daily.index >= new_daily.index.min()]
 
     conn, _ = dyn_db.create_connection()
-    df.to_sql('flavor_analysis', conn, index=False, if_exists=if_exists)
+    dyn_db.upsert_values('consumption_series', changed, connection=conn)
+    ledger.record(boxes['id'].to_list(), connection=conn)
     dyn_db.close_commit(conn)
 
-    logger.info(f'Updated flavor_analysis table of Dynamic Analyses')
+    logger.info('Added %s boxes to the consumption series (%s days updated)', len(boxes), len(changed))
+    return
+
+
+def update_distribution_sketches(context:DataContext|None=None):
+    """ Merges newly analysed cans into the per flavor and per location PMR/PVR sketches of Dynamic Analyses
+
+        Each (scope, key, metric) row holds a serialized TDigest, so new cans are summarized and merged
+        onto the stored state instead of rescanning can_analysis. Each metric has its own ledger and a
+        can is only recorded once its value is finite, so cans analysed later are still merged.
+
+    """
+    context = context if context else DataContext()
+    dyn_db = db_reg.get_instance('dynamic_analyses')
+    ledgers = {metric:ProcessedLedger(dyn_db, f'distribution_sketches.{metric}') for metric in SKETCH_METRICS}
+
+    can_df = context.get('static_analyses', 'can_analysis', ['can_id'] + list(SKETCH_METRICS.values()))
+
+    # finite values of cans not folded into each metric's sketches yet
+    new_cans:dict[str, pd.DataFrame] = {}
+    for metric, column in SKETCH_METRICS.items():
+        finite = can_df[np.isfinite(pd.to_numeric(can_df[column], errors='coerce').to_numpy(dtype=float))]
+        new_cans[metric] = finite[finite['can_id'].isin(ledgers[metric].filter_unprocessed(finite['can_id'].to_list()))]
+
+    if all(df.empty for df in new_cans.values()):
+        logger.info('No newly analysed cans to add to the distribution sketches')
+        return
+
+    # link cans to their flavor and purchase location
+    can_boxes = context.get('raw_data', 'can_data', ['id', 'box_id']).set_index('id')['box_id']
+    flavor_df = context.get('raw_data', 'box_flavors', ['id', 'box_id', 'flavor']).set_index('id')
+    locations = context.get('raw_data', 'box_purchases', ['id', 'location']).set_index('id')['location']
+
+    stored = dyn_db.get_data(['id', 'sketch'], 'distribution_sketches')
+    stored_sketches = dict(zip(stored['id'], stored['sketch']))
+
+    updates = []
+    for metric, column in SKETCH_METRICS.items():
+        box_ids = new_cans[metric]['can_id'].map(can_boxes)
+        metric_df = new_cans[metric].assign(
+            flavor=box_ids.map(flavor_df['flavor']),
+            location=box_ids.map(flavor_df['box_id']).map(locations)
+        )
+
+        for scope in SKETCH_SCOPES:
+            for key, df in metric_df.groupby(scope):
+                sketch_id = f'{scope}.{key}.{metric}'
+                digest = TDigest.from_bytes(stored_sketches[sketch_id]) if sketch_id in stored_sketches else TDigest()
+                digest.update(df[column].to_numpy(dtype=float))
+
+                updates.append({
+                    'id': sketch_id,
+                    'scope': scope,
+                    'key': key,
+                    'metric': metric,
+                    'count': int(digest.count),
+                    'sketch': digest.to_bytes()
+                })
+
+    # sketches and ledgers are committed together so a can is never merged twice
+    conn, _ = dyn_db.create_connection()
+    dyn_db.upsert_values('distribution_sketches', pd.DataFrame(updates), connection=conn)
+    for metric, ledger in ledgers.items():
+        ledger.record(new_cans[metric]['can_id'].to_list(), connection=conn)
+    dyn_db.close_commit(conn)
 
+    logger.info('Merged %s into %s distribution sketches', {metric:len(df) for metric, df in new_cans.items()}, len(updates))
     return
 
 
+def get_distribution_summary(
+        metric:Literal['pmr', 'pvr'],
+        scope:Literal['flavor', 'location']='flavor',
+        key:str|None=None,
+        *,
+        quantiles:tuple[float]=(0.1, 0.5, 0.9),
+        bins:int=10
+    ) -> dict:
+    """ Summarizes a PMR/PVR distribution from its stored sketch(es)
+
+        Args:
+            metric (str) : Either pmr or pvr
+            scope (str) : Either flavor or location
+            key (str) : Flavor/location abbreviation. Default is None, which merges every sketch of
+                        the scope (i.e. the overall distribution)
+            quantiles (tuple[float]) : Quantiles to estimate
+            bins (int) : Number of equal width histogram bins
+
+        Returns:
+            A dict with the count, min, max, estimated quantiles (keyed by quantile) and histogram
+            (counts and bin edges), or None if no sketch exists
 
+    """
+    assert metric in SKETCH_METRICS, f'Invalid metric: {metric}. Expected one from {SKETCH_METRICS.keys()}'
+    assert scope in SKETCH_SCOPES, f'Invalid scope: {scope}. Expected one from {SKETCH_SCOPES}'
+
+    dyn_db = db_reg.get_instance('dynamic_analyses')
+
+    where_info = [('scope', scope), ('metric', metric)]
+    if key:
+        where_info.append(('key', key))
+
+    stored = dyn_db.get_data(['sketch'], 'distribution_sketches', where_info=where_info)
+    if stored.empty:
+        return None
+
+    digest = TDigest()
+    for sketch in stored['sketch']:
+        digest.merge(TDigest.from_bytes(sketch))
+
+    counts, edges = digest.histogram(bins)
+
+    return {
+        'count': int(digest.count),
+        'min': float(digest.min),
+        'max': float(digest.max),
+        'quantiles': dict(zip(quantiles, digest.quantile(quantiles).tolist())),
+        'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()}
+    }
 
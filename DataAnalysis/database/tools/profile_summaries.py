@@ -0,0 +1,145 @@
+from ... import logging, pd, np
+from ...config import DEFAULT_PROFILE_ID
+
+from ..utils.registry import DatabaseRegistry
+from ..utils.context import DataContext
+from ..utils.partitions import PARTITION_COLUMN, PartitionState, partition_values, split_partitions, frame_fingerprint
+
+logger = logging.getLogger('standard.analysis')
+db_reg = DatabaseRegistry()
+
+# summary measures -> (box_analysis column, profile average column)
+PROFILE_ANALYSIS_MEASURES = {
+    'dv': ('drink_velocity', 'average_dv'),
+    'tts': ('time_to_start', 'average_tts'),
+    'finish': ('completion_percentage', 'average_finish_rate'),
+    'pmr': ('average_pmr', 'average_pmr'),
+    'pvr': ('average_pvr', 'average_pvr')
+}
+PROFILE_SUM_COLUMNS = ['total_boxes', 'price_count', 'total_price_spent'] + [f'{prefix}_{agg}' for prefix in PROFILE_ANALYSIS_MEASURES for agg in ('sum', 'count')]
+
+# profile average column -> (sum column, count column)
+PROFILE_AVERAGES = {
+    'average_price': ('total_price_spent', 'price_count'),
+    **{average:(f'{prefix}_sum', f'{prefix}_count') for prefix, (_, average) in PROFILE_ANALYSIS_MEASURES.items()}
+}
+
+# columns of a profile summary (the sums and counts behind the averages are internal)
+PROFILE_SUMMARY_COLUMNS = ['id', 'name', 'total_boxes', 'total_price_spent', *PROFILE_AVERAGES]
+
+
+def update_profile_summaries(profiles:tuple[str]|None=None, *, context:DataContext|None=None):
+    """ Applies the changes of each profile's boxes to the profile summaries of the master database
+
+        Every box (flavor) contributes a count, its price and the sums/counts of its box analyses to its
+        profile's row. The current contribution of each box is kept in the profile_contributions table,
+        so only the difference between a box's new and stored contribution is added onto the profile
+        (new boxes are added, changed boxes adjusted and removed boxes subtracted). The averages are then
+        re-derived from the adjusted sums and counts, so reading a summary is a single-row lookup.
+        Profiles that no longer have any boxes have their summary, contributions and state removed.
+
+        Prices of multi-flavor purchases (i.e. costco packs) are split evenly between their flavors.
+
+        Args:
+            profiles (tuple[str]) : Optionally only update these profiles, whether or not their data changed.
+                                    Default is None, which updates every profile with changed data.
+            context (DataContext) : Optionally read the raw tables and analyses from a pipeline context
+
+    """
+    context = context if context else DataContext()
+    master = db_reg.get_instance('master')
+
+    flavor_df = context.get('raw_data', 'box_flavors', ['id', 'box_id', PARTITION_COLUMN])
+    purchase_df = context.get('raw_data', 'box_purchases', ['id', 'price'])
+    analysis_df = context.get('static_analyses', 'box_analysis', ['box_id'] + [col for col, _ in PROFILE_ANALYSIS_MEASURES.values()])
+
+    state = PartitionState('update_profile_summaries')
+
+    # profiles summarized before but without boxes now (i.e. deleted) are updated too, which removes them
+    current_profiles = partition_values(flavor_df)
+    summarized = set(master.get_data(['id'], 'profile')['id']) | set(state.recorded())
+    all_profiles = list(profiles) if profiles else sorted(set(current_profiles) | summarized)
+    profile_flavors = split_partitions(flavor_df, all_profiles)
+
+    # a profile's contributions depend on its boxes, their purchases and their analyses
+    inputs = {}
+    for profile, flavors in profile_flavors.items():
+        purchases = purchase_df[purchase_df['id'].isin(flavors['box_id'])]
+        analyses = analysis_df[analysis_df['box_id'].isin(flavors['id'])]
+        inputs[profile] = (flavors, purchases, analyses)
+
+    fingerprints = {profile:frame_fingerprint(*frames) for profile, frames in inputs.items()}
+    changed = all_profiles if profiles else state.changed(fingerprints)
+
+    if not changed:
+        logger.info('Profile summaries are up to date')
+        return
+
+    new = pd.concat([_box_contributions(profile, *inputs[profile]) for profile in changed], ignore_index=True).set_index('id')
+    old = pd.concat([master.get_data(['*'], 'profile_contributions', where_info=[(PARTITION_COLUMN, profile)]) for profile in changed], ignore_index=True).set_index('id')
+
+    # difference between the new and stored contribution of every box of the changed profiles
+    box_ids = new.index.union(old.index)
+    delta = new[PROFILE_SUM_COLUMNS].reindex(box_ids, fill_value=0) - old[PROFILE_SUM_COLUMNS].astype(float).reindex(box_ids, fill_value=0)
+    delta = delta[(delta != 0).any(axis=1)]
+    delta.insert(0, PARTITION_COLUMN, new[PARTITION_COLUMN].reindex(delta.index).fillna(old[PARTITION_COLUMN].reindex(delta.index)))
+
+    profile_delta = delta.groupby(PARTITION_COLUMN)[PROFILE_SUM_COLUMNS].sum().rename_axis('id').reset_index()
+    updated_boxes = new.loc[new.index.intersection(delta.index)].rename_axis('id').reset_index()
+    removed_boxes = old.index.difference(new.index).to_list()
+    removed_profiles = [profile for profile in changed if profile not in current_profiles]
+
+    # summaries and contributions are committed together so a box is never counted twice
+    conn, curs = master.create_connection()
+    curs.executemany(
+        f'INSERT OR IGNORE INTO profile(id, name, {", ".join(PROFILE_SUM_COLUMNS)}) VALUES (?, ?{", 0" * len(PROFILE_SUM_COLUMNS)})',
+        [(profile, profile) for profile in profile_delta['id']]
+    )
+    master.upsert_values('profile', profile_delta, increment_columns=PROFILE_SUM_COLUMNS, connection=conn)
+
+    averages = ', '.join(f'{average}={sum_col}/NULLIF({count_col}, 0)' for average, (sum_col, count_col) in PROFILE_AVERAGES.items())
+    curs.executemany(f'UPDATE profile SET {averages} WHERE id=?', [(profile,) for profile in profile_delta['id']])
+
+    master.upsert_values('profile_contributions', updated_boxes, connection=conn)
+    curs.executemany('DELETE FROM profile_contributions WHERE id=?', [(box_id,) for box_id in removed_boxes])
+    curs.executemany('DELETE FROM profile WHERE id=?', [(profile,) for profile in removed_profiles])
+    master.close_commit(conn)
+
+    state.record({profile:fingerprints[profile] for profile in changed if profile not in removed_profiles})
+    state.forget(removed_profiles)
+
+    logger.info('Applied %s changed box contributions to the summaries of profiles %s', len(delta), profile_delta["id"].to_list())
+    if removed_profiles:
+        logger.info('Removed the summaries of profiles without boxes %s', removed_profiles)
+    return
+
+
+def _box_contributions(profile_id:str, flavor_df:pd.DataFrame, purchase_df:pd.DataFrame, analysis_df:pd.DataFrame) -> pd.DataFrame:
+    """ Count, price and analysis sums/counts each box (flavor) of a profile adds to its summary """
+    boxes = flavor_df.merge(purchase_df.rename(columns={'id': 'box_id'}), on='box_id', how='left')
+    boxes['price'] = boxes['price'] / boxes.groupby('box_id')['id'].transform('size')
+    boxes = boxes.merge(analysis_df.rename(columns={'box_id': 'id'}), on='id', how='left')
+
+    contributions = pd.DataFrame({
+        'id': boxes['id'],
+        PARTITION_COLUMN: profile_id,
+        'total_boxes': 1.0,
+        'price_count': boxes['price'].notna().astype(float),
+        'total_price_spent': boxes['price'].astype(float).fillna(0)
+    })
+    for prefix, (column, _) in PROFILE_ANALYSIS_MEASURES.items():
+        values = pd.to_numeric(boxes[column], errors='coerce')
+        contributions[f'{prefix}_sum'] = values.fillna(0)
+        contributions[f'{prefix}_count'] = values.notna().astype(float)
+
+    return contributions
+
+
+def get_profile_summary(profile_id:str=DEFAULT_PROFILE_ID) -> dict|None:
+    """ Returns the summary (totals and averages) of a profile, or None if it has no boxes """
+    master = db_reg.get_instance('master')
+    summary = master.get_data(PROFILE_SUMMARY_COLUMNS, 'profile', where_info=[('id', profile_id)])
+
+    if summary.empty:
+        return None
+    return summary.replace({np.nan: None}).to_dict(orient='records')[0]
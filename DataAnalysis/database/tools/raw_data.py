@@ -1,13 +1,22 @@
-from ... import Literal, logging, os
+from ... import Literal, logging, os, pd
+from ...config import PROFILE_WORKERS
 
 from ..utils.registry import DatabaseRegistry
 from ..utils.processor import DataProcessor
+from ..utils.context import DataContext
+from ..utils.partitions import PartitionState, profile_data_dirs, map_partitions
+from ..utils.pipeline import file_resource_signature
 
+import hashlib
 
 
-logger = logging.getLogger('standard')
+
+logger = logging.getLogger('standard.processing')
 db_reg = DatabaseRegistry()
 
+# NOTE cannnn generalize to '_raw' presence, but being explicit is probably better
+RAW_DATA_SUBDIRS = ['csv_raw', 'md_raw']
+
 
 def process_and_export_lc_data(
         base_data_dir:str, 
@@ -19,9 +28,16 @@ def process_and_export_lc_data(
         file_export:Literal['csv', 'pickle']|None=None,
         output_dir_map:dict[str, str]|None=None,
         output_file_map:dict[str, str]|None=None,
-    ):
+        profiles:tuple[str]|None=None,
+        max_workers:int=PROFILE_WORKERS,
+        context:DataContext|None=None
+    ) -> dict[str, DataProcessor]:
     """ Processes all raw data in La Croix Data directory and exports to a database or specified file
 
+        Each profile's data (see partitions.profile_data_dirs) is processed in its own worker process. 
+        Database exports only replace the rows of the processed profiles, and profiles whose files are 
+        unchanged since their last export are skipped.
+
         Args:
             base_data_dir (str) : Path to the directory containing raw CSV and MD data
             filter_export_collections (tuple[str]) : Optionally filter for specific collections to export.
@@ -33,51 +49,123 @@ def process_and_export_lc_data(
                                Default is False. Must supply a DatabaseRegistry if True.
             database_registry (DatabaseRegistry) : Master collection of created and registered databases. Only
                                                    required if db_export=True
-            db_override (bool) : If true, will override any existing contents in the tables. Default is False.
+            db_override (bool) : If true, re-processes and overrides the rows of every profile, even if its files 
+                                 are unchanged. Default is False.
             file_export (Literal['csv', 'pickle']) : Specifies file type to export newly processed data to.
             output_dir_map (dict[str, str]) : Override default output directory locations. Only required if
                                               all=False AND output_dir_map is None.                            
             output_file_map (dict[str, str]) : Override default output file names.
+            profiles (tuple[str]) : Optionally only (re-)process these profiles, whether or not their files changed.
+                                    Default is None, which processes every profile with changed files.
+            max_workers (int) : Maximum number of profiles processed at once
+            context (DataContext) : Optionally export through a pipeline context so later stages
+                                    reuse the exported frames instead of reading raw_data.db
 
         Returns:
-            The processor object to utilize extracted metadata for other databases (i.e. true empty measurements for 
-            dynamic_analyses.db)
+            The processor object of each processed profile to utilize extracted metadata for other databases 
+            (i.e. true empty measurements for dynamic_analyses.db)
     
     """
     assert os.path.exists(base_data_dir), f'Base data dir path does not exist: {base_data_dir}'
     assert os.path.isdir(base_data_dir), f'Must supply a path to a directory, not: {base_data_dir}'
 
-    # NOTE cannnn generalize to '_raw' presence, but being explicit is probably better
-    req_subdirs = ['csv_raw', 'md_raw']
-    valid_subdirs = [i for i in os.listdir(base_data_dir) if i in req_subdirs]
-    assert len(valid_subdirs) == 2, f'Base data dir does not contain the required sub-directories: csv_raw or md_raw'
+    data_dirs = profile_data_dirs(base_data_dir)
 
-    csv_data, md_data = tuple([os.path.join(base_data_dir, rsd) for rsd in req_subdirs])
+    if profiles:
+        assert all(profile in data_dirs for profile in profiles), f'No raw data directory for profile(s): {[profile for profile in profiles if profile not in data_dirs]}'
+        data_dirs = {profile:data_dirs[profile] for profile in profiles}
 
-    procesor = DataProcessor()
-    procesor.run_pre_processing(csv_data_dir=csv_data, md_data_dir=md_data)
+    state = PartitionState('process_and_export_lc_data')
+    fingerprints = {profile:_raw_data_fingerprint(data_dir) for profile, data_dir in data_dirs.items()}
+
+    # exported profiles are only re-processed when their files changed, unless explicitly requested
+    if db_export and not (profiles or db_override):
+        changed = state.changed(fingerprints)
+        logger.info('Skipping unchanged profiles: %s', [profile for profile in data_dirs if profile not in changed])
+        data_dirs = {profile:data_dirs[profile] for profile in changed}
+
+    # rows of profiles whose data directory was removed are deleted with their state
+    if db_export and not profiles:
+        _remove_profiles(state.stale(list(fingerprints)), state, context)
+
+    processors:dict[str, DataProcessor] = map_partitions(
+        _process_profile, 
+        {profile:(profile, data_dir) for profile, data_dir in data_dirs.items()}, 
+        max_workers=max_workers
+    )
 
     if display_processing_stats:
-        procesor.display_run_stats()
+        for procesor in processors.values():
+            procesor.display_run_stats()
 
-    if db_export:
+    if db_export and processors:
         raw_data_db = db_reg.get_instance('raw_data')
-        
-        procesor.db_export(raw_data_db, filter_export_collections, override=db_override)
+        context = context if context else DataContext()
+
+        table_partitions:dict[str, dict] = {}
+        for profile, procesor in processors.items():
+            for table_name, df in procesor.get_table_frames(raw_data_db, filter_export_collections).items():
+                table_partitions.setdefault(table_name, {})[profile] = df
+
+        for table_name, partitions in table_partitions.items():
+            context.sink_partitions(raw_data_db.database_name, table_name, partitions)
 
-        logger.info('Finished exporting to database')
+        state.record({profile:fingerprints[profile] for profile in processors})
+
+        logger.info('Finished exporting profiles %s to database', list(processors))
     
     if file_export:
         all_data = True if filter_export_collections == '*' else False
-        procesor.file_export(
-            type=file_export,
-            all_data=all_data,
-            collections=filter_export_collections,
-            output_dir_map=output_dir_map,
-            output_file_map=output_file_map
-        )
+        for procesor in processors.values():
+            procesor.file_export(
+                type=file_export,
+                all_data=all_data,
+                collections=filter_export_collections,
+                output_dir_map=output_dir_map,
+                output_file_map=output_file_map
+            )
+
+        logger.info('Finished exporting data to %s', file_export)
+
+    return processors
 
-        logger.info(f'Finished exporting data to {file_export}')
 
+def _remove_profiles(removed:list[str], state:PartitionState, context:DataContext|None=None):
+    """ Deletes the raw data rows and partition state of profiles that no longer have a data directory """
+    if not removed:
+        return
+
+    raw_data_db = db_reg.get_instance('raw_data')
+    context = context if context else DataContext()
+    for table_name in raw_data_db.tables:
+        context.sink_partitions(raw_data_db.database_name, table_name, {profile:pd.DataFrame() for profile in removed})
+    state.forget(removed)
+
+    logger.info('Removed the raw data of deleted profiles %s', removed)
+    return
+
+
+def _raw_data_dirs(data_dir:str) -> tuple[str, str]:
+    """ Paths to the raw CSV and MD data of a profile """
+    valid_subdirs = [i for i in os.listdir(data_dir) if i in RAW_DATA_SUBDIRS]
+    assert len(valid_subdirs) == 2, f'{data_dir} does not contain the required sub-directories: csv_raw or md_raw'
+
+    return tuple([os.path.join(data_dir, rsd) for rsd in RAW_DATA_SUBDIRS])
+
+
+def _raw_data_fingerprint(data_dir:str) -> str:
+    """ Hash of the size and modification time of every raw data file of a profile """
+    hasher = hashlib.sha1()
+    for rsd in RAW_DATA_SUBDIRS:
+        hasher.update(file_resource_signature(os.path.join(data_dir, rsd)).encode())
+    return hasher.hexdigest()
+
+
+def _process_profile(profile_id:str, data_dir:str) -> DataProcessor:
+    """ Extracts and processes one profile's raw data (run in a worker process) """
+    csv_data, md_data = _raw_data_dirs(data_dir)
+
+    procesor = DataProcessor(profile_id)
+    procesor.run_pre_processing(csv_data_dir=csv_data, md_data_dir=md_data)
     return procesor
    
\ No newline at end of file
@@ -4,7 +4,7 @@ from ...config import DB_DIR, DB_CONFIG_DIR
 from ..utils.registry import DatabaseRegistry
 
 
-logger = logging.getLogger('standard')
+logger = logging.getLogger('standard.analysis')
 db_reg = DatabaseRegistry()
 
 rdf = DB_CONFIG_DIR / 'reference_data.csv'
@@ -29,5 +29,5 @@ def upload_reference_data(reference_data_file_path:str=str(rdf)):
 
     reference_df.to_sql('reference', con=conn, if_exists='replace', index=False)
     db.close_commit(conn)
-    logger.info(f'Created reference table in the master database')
+    logger.info('Created reference table in the master database')
     return
@@ -1,10 +1,12 @@
 
 from ... import Literal, logging, pd, generate, os, np, datetime
-from ...config import DB_DIR
+from ...config import DB_DIR, PROFILE_WORKERS
 
 from ..utils.registry import DatabaseRegistry, Database
+from ..utils.context import DataContext
+from ..utils.partitions import PARTITION_COLUMN, PartitionState, partition_values, split_partitions, frame_fingerprint, map_partitions
 
-logger = logging.getLogger('standard')
+logger = logging.getLogger('standard.analysis')
 db_reg = DatabaseRegistry()
 
 # threshold for a can to objectively be considered "finished"
@@ -12,44 +14,97 @@ db_reg = DatabaseRegistry()
 OFS_THRESHOLD = 0.015
 
 
-# NOTE currently pulls all saved data from raw_data -> only works when fully reseting databases (pipeline preset 1)
-# TODO need custom handling for post processing specific updates 
-def update_static_analyses(if_exists:Literal['fail', 'replace', 'append']='append'):
-    """ Compares box_flavor / can ids with static_analyses.db and fill/update for any missing IDs
+def update_static_analyses(
+        profiles:tuple[str]|None=None,
+        *,
+        max_workers:int=PROFILE_WORKERS,
+        context:DataContext|None=None
+    ):
+    """ Calculates the box and can analyses of each profile whose raw data changed, replacing only that 
+        profile's rows in static_analyses.db
 
+        Profiles are analyzed in parallel worker processes. A profile's analyses depend on its raw data and
+        the (global) average empty can mass, so a change of that average re-analyzes every profile.
 
+        Args:
+            profiles (tuple[str]) : Optionally only (re-)analyze these profiles, whether or not their data changed.
+                                    Default is None, which analyzes every profile with changed data.
+            max_workers (int) : Maximum number of profiles analyzed at once
+            context (DataContext) : Optionally read the raw tables from (and write the analyses through) a pipeline context
     
     """
-    # link up db home dir and conv db tables back to df
-    # calculate each column/table individually then combine into one DF
+    # raw tables come from the pipeline context when the previous stages left them in memory
+    context = context if context else DataContext()
     raw_data = db_reg.get_instance('raw_data')
-    static_anlys = db_reg.get_instance('static_analyses')
 
-    raw_conn, _ = raw_data.create_connection()
-    rd_dfs = {tablename:pd.read_sql(f'SELECT * FROM {tablename}', raw_conn) for tablename in raw_data.tables.keys()}
-    raw_data.close_commit(raw_conn)
+    rd_dfs = {tablename:context.get('raw_data', tablename) for tablename in raw_data.tables.keys()}
+    running_metrics = context.get('dynamic_analyses', 'can_measurements', ['parameters', 'value'])
+
+    all_profiles = list(profiles) if profiles else partition_values(rd_dfs['box_purchases'], rd_dfs['box_flavors'])
+
+    # raw tables split into each profile's rows
+    partitioned = {tablename:split_partitions(df, all_profiles) for tablename, df in rd_dfs.items()}
+    profile_dfs = {profile:{tablename:partitioned[tablename][profile] for tablename in rd_dfs} for profile in all_profiles}
+
+    state = PartitionState('update_static_analyses')
+    # of the can measurements, only the average empty can mass (see update_can_analyses) affects the analyses
+    fingerprints = {profile:frame_fingerprint(*dfs.values(), running_metrics.iloc[2:3]) for profile, dfs in profile_dfs.items()}
+    changed = all_profiles if profiles else state.changed(fingerprints)
+    # analyses of profiles whose raw data was removed
+    removed = [] if profiles else state.stale(all_profiles)
+
+    if removed:
+        for tablename in ('can_analysis', 'box_analysis'):
+            context.sink_partitions('static_analyses', tablename, {profile:pd.DataFrame() for profile in removed})
+        state.forget(removed)
+        logger.info('Removed the static analyses of deleted profiles %s', removed)
+
+    if not changed:
+        logger.info('Static analyses of every profile are up to date')
+        return
 
+    # calculate each column/table individually then combine into one DF
+    results = map_partitions(
+        _analyze_profile, 
+        {profile:(profile, profile_dfs[profile], running_metrics) for profile in changed}, 
+        max_workers=max_workers
+    )
 
-    ca_data = update_can_analyses(rd_dfs['can_data'], display_updates=False)
-    ba_data = update_box_analyses(rd_dfs, ca_data, display_updates=False)
+    context.sink_partitions('static_analyses', 'can_analysis', {profile:ca_data for profile, (ca_data, _) in results.items()})
+    context.sink_partitions('static_analyses', 'box_analysis', {profile:ba_data for profile, (_, ba_data) in results.items()})
 
-    conn, _ = static_anlys.create_connection()
-    ca_data.to_sql('can_analysis', conn, if_exists=if_exists, index=False)
-    ba_data.to_sql('box_analysis', conn, if_exists=if_exists, index=False)
-    static_anlys.close_commit(conn)
+    state.record({profile:fingerprints[profile] for profile in changed})
 
-    logger.info('Updated static_analyis.db')
+    logger.info('Updated static_analyis.db for profiles %s', list(changed))
     return
 
 
+def _analyze_profile(profile_id:str, raw_dfs:dict[str, pd.DataFrame], running_metrics:pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """ Calculates the can and box analyses of one profile's raw data (run in a worker process) """
+    ca_data = update_can_analyses(raw_dfs['can_data'], display_updates=False, running_metrics=running_metrics)
+    ba_data = update_box_analyses(raw_dfs, ca_data, display_updates=False)
+
+    for df in (ca_data, ba_data):
+        df[PARTITION_COLUMN] = profile_id
+
+    return ca_data, ba_data
+
 
-def update_can_analyses(can_df:pd.DataFrame, *, display_updates:bool=False):
+
+def update_can_analyses(
+        can_df:pd.DataFrame, 
+        *, 
+        display_updates:bool=False, 
+        context:DataContext|None=None,
+        running_metrics:pd.DataFrame|None=None
+    ):
     """
 
     """
     # use global averages if empty can mass/volume is not available
-    dyn_db = db_reg.get_instance('dynamic_analyses')
-    running_metrics = dyn_db.get_data(['parameters', 'value'], 'can_measurements')
+    if running_metrics is None:
+        context = context if context else DataContext()
+        running_metrics = context.get('dynamic_analyses', 'can_measurements', ['parameters', 'value'])
 
     mass_and_volumes = can_df[[i for i in can_df.columns if i.endswith('_mass') or i.endswith('_volume')]]
     
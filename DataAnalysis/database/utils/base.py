@@ -2,12 +2,12 @@
 from ... import datetime, Literal, logging, os, traceback, pd
 from ...config import ALL_DATETIME_FORMATS, DB_DIR
 
-from .custom_types import TablesMacroInfo, TableData, WhereStatement
+from .custom_types import ColumnSpec, TablesMacroInfo, TableData, WhereStatement
 
 import sqlite3 as sl
 
 
-logger = logging.getLogger('standard')
+logger = logging.getLogger('standard.database')
 
 
 
@@ -62,63 +62,85 @@ class Database():
         
         conn, curs = self.create_connection()
 
-        def create_column_script(td:pd.DataFrame) -> str:
+        def create_column_script(columns:tuple[ColumnSpec, ...]) -> str:
             """ Concatenates column specifiers; only one column apart of entire execute statement """
-            try:
-                cols_script:list[str] = [f'{row_data['header']} {row_data['header_data_type'].upper()}' for _,row_data in td.iterrows()]
+            cols_script:list[str] = [f'{col.header} {col.data_type}' for col in columns]
 
-                fks = extract_foreign_key(table_data=td)
+            # PK must be first in list
+            pk = [f'PRIMARY KEY ({columns[0].header})']
 
-                # PK must be first in list
-                pk = [f'PRIMARY KEY ({td['header'].to_list()[0]})']
+            fks = [f'FOREIGN KEY ({col.header}) REFERENCES {col.foreign_key[0]}({col.foreign_key[1]})' for col in columns if col.foreign_key]
 
-                if fks:
-                    return (', ').join(cols_script + pk + fks)
-                return (', ').join(cols_script + pk)
-            
-            except Exception as e:
-                traceback.print_exc()
-                logger.error(f'Error creating column script for DB table: {td}')
-
-        def extract_foreign_key(table_data:pd.DataFrame) -> list[str] | None:
-            
-            # extract only only properly specified/formatted foreign key values
-            valid_fks:list[tuple[int, str]] = [item for item in table_data['foreign_key'].items() if ';' in item[1]]
-
-            if len(valid_fks) == 0:
-                return
-            
-            formatted_foreign_keys:list[str] = []
-            for idx, value in valid_fks:
-                ref_table, ref_column = tuple(value.split(';'))
-                
-                header = table_data.loc[idx]['header']
-                stmt = f'FOREIGN KEY ({header}) REFERENCES {ref_table}({ref_column})'
-                formatted_foreign_keys.append(stmt)
-
-            return formatted_foreign_keys
+            return (', ').join(cols_script + pk + fks)
 
         try:
-            for table_name, table_df in self.table_data.items():
+            for table_name, columns in self.table_data.items():
                 self.tables[table_name] = {
-                    'header': table_df['header'].to_list()
+                    'header': [col.header for col in columns]
                 }
-                col_script = create_column_script(table_df)
+                col_script = create_column_script(columns)
                 curs.execute(f'CREATE TABLE IF NOT EXISTS {table_name}({col_script})')
-            logger.info(f'Created tables {self.tables.keys()} in {self.database_name}')
+            logger.info('Created tables %s in %s', list(self.tables), self.database_name)
             self.close_commit(conn)
             return
         except sl.OperationalError as e:
             # traceback.print_exc()
-            logger.error(f'Error creating table: {table_name}\n{col_script = }\n{e}\n')
+            logger.error('Error creating table: %s\ncol_script = %r\n%s\n', table_name, col_script, e)
             return
 
+    def existing_tables(self) -> set[str]:
+        """ Names of the tables that exist in the database file (as opposed to the configured ```self.tables```) """
+        conn, curs = self.create_connection()
+        tables = {info[0] for info in curs.execute('SELECT name FROM sqlite_master WHERE type=?', ('table',))}
+        self.close_commit(conn)
+        return tables
+
+    def has_table(self, table:str) -> bool:
+        """ True if the table exists in the database file """
+        return table in self.existing_tables()
+
+    def migrate_tables(self) -> dict[str, list[str]]:
+        """ Brings an existing database file up to the configured tables without dropping any data
+
+            Configured tables missing from the file are created, and configured columns missing from
+            existing tables are added (NULL for existing rows), so incremental runs work on databases
+            created before their tables/columns were added to the config.
+
+            Returns:
+                Each created or altered table mapped to the columns it gained
+        
+        """
+        if self.table_data is None:
+            return {}
+
+        existing = self.existing_tables()
+        migrated = {table_name:[col.header for col in columns] for table_name, columns in self.table_data.items() if table_name not in existing}
+        if migrated:
+            self.create_tables()
+
+        conn, curs = self.create_connection()
+        for table_name, columns in self.table_data.items():
+            if table_name in migrated:
+                continue
+
+            current = {info[1] for info in curs.execute(f'PRAGMA table_info({table_name})')}
+            added = [col for col in columns if col.header not in current]
+            for col in added:
+                curs.execute(f'ALTER TABLE {table_name} ADD COLUMN {col.header} {col.data_type}')
+            if added:
+                migrated[table_name] = [col.header for col in added]
+        self.close_commit(conn)
+
+        if migrated:
+            logger.info('Migrated %s tables of %s: %s', len(migrated), self.database_name, migrated)
+        return migrated
+
     def add_table_data(self, data:TableData, if_exist:Literal['ignore', 'overwrite']):
         """ Adds table data to instance 
         
             Args:
-                data (dict) : Map of table name to table data represented as a list of dictionaries. Typically 
-                              the result of db_table_config.csv processing.
+                data (dict) : Map of table name to its column specs. Typically a database of the
+                              compiled config snapshot (see config_snapshot.py).
                 if_exists (bool) : Determines behavior if database already has table config data assigned.
                     - *ignore*: Ignores the new data in favor of the existing data. No changes are made.
                     - *overwrite*: Overwrites the existing table config data with the new data
@@ -129,16 +151,16 @@ class Database():
         
         # checks whether table data already exists and behaves according to 'if_exists' parameter
         if isinstance(self.table_data, dict) and if_exist == 'ignore':
-            logger.warning(f'{self.database_name} already has table config data assigned and {if_exist = }')
+            logger.warning('%s already has table config data assigned and if_exist = %r', self.database_name, if_exist)
             return
         
         self.table_data = data
-        logger.info(f'(Re)assigned table config data for {self.database_name}')
+        logger.info('(Re)assigned table config data for %s', self.database_name)
 
         # fill table info
-        for table_name, table_df in self.table_data.items():
+        for table_name, columns in self.table_data.items():
             self.tables[table_name] = {
-                    'header': table_df['header'].to_list()
+                    'header': [col.header for col in columns]
                 }
 
         
@@ -151,7 +173,7 @@ class Database():
         for table in tables:
             curs.execute(f'DROP TABLE {table}')
         self.close_commit(conn)
-        logger.info(f'Removed all tables from {self.database_name}.db')
+        logger.info('Removed all tables from %s.db', self.database_name)
         return
             
 
@@ -207,7 +229,7 @@ class Database():
         assert table in self.tables.keys(), f'Invalid table name {table}. Expected one from {self.tables.keys()}'
 
         all_cols = [col for col in set_data.keys()] + [col for col in where_data.keys()]
-        assert all(col in self.table_data[table]['header'].to_list() for col in all_cols), f'Either set or where data contains invalid column name(s): {[col for col in all_cols if col not in self.table_data[table]['header']]}\n{self.table_data[table]['header'] = }'
+        assert all(col in self.tables[table]['header'] for col in all_cols), f'Either set or where data contains invalid column name(s): {[col for col in all_cols if col not in self.tables[table]['header']]}\n{self.tables[table]['header'] = }'
 
         # updating single vs multiple values
         # two if-else modules for more flexible SQL statements
@@ -232,8 +254,98 @@ class Database():
             print(f'{stmt = }')
             raise e
 
-        logger.info(f'Updated {table} at {set_data.keys()}')
+        logger.info('Updated %s at %s', table, list(set_data))
+
+        return
+
+    def get_aggregate(
+            self,
+            sum_columns:list[str],
+            table:str,
+            *,
+            group_by:list[str]|None=None,
+            where_info:list[tuple[str,str]]|None=None
+        ) -> pd.DataFrame:
+        """ SQL SUM of columns, optionally grouped and filtered, and returns as a dataframe
+
+            Aggregation happens inside SQLite so only one row per group is read back
+
+            Args:
+                sum_columns (list[str]) : Columns to sum. Each output column keeps its original name
+                table (str) : Name of the table being aggregated
+                group_by (list[str]) : Columns to group by. Default is None, which sums the entire table
+                where_info (list[tuple[str,str]]) : Column/value pairs for an SQL WHERE (joined with AND)
+
+        """
+        assert table in self.tables.keys(), f'Invalid table name {table}. Expected one from {self.tables.keys()}'
+
+        group_by = group_by if group_by else []
+        all_cols = sum_columns + group_by + [info[0] for info in where_info or []]
+        assert all(col in self.tables[table]['header'] for col in all_cols), f'Invalid column name(s): {[col for col in all_cols if col not in self.tables[table]['header']]}'
+
+        select = group_by + [f'SUM({col}) AS {col}' for col in sum_columns]
+        stmt = f'SELECT {', '.join(select)} FROM {table}'
+        params = ()
+
+        if where_info:
+            where_clause = self._generate_where_stmt(where_info)
+            stmt += f' WHERE {where_clause['stmt']}'
+            params = where_clause['values']
+
+        if group_by:
+            stmt += f' GROUP BY {', '.join(group_by)}'
+
+        conn, _ = self.create_connection()
+        data = pd.read_sql(stmt, conn, params=params)
+        self.close_commit(conn)
+        return data
+
+    def upsert_values(
+            self,
+            table:str,
+            data:pd.DataFrame,
+            *,
+            increment_columns:list[str]|None=None,
+            connection:sl.Connection|None=None
+        ):
+        """ Inserts rows, or updates any existing row with the same primary key
+
+            The primary key is the first header of the table (see create_tables). On conflict, columns
+            in increment_columns are added onto the existing values while every other column is
+            overwritten with the new value.
+
+            Args:
+                table (str) : Name of the table being updated
+                data (pd.DataFrame) : Rows to upsert. Must contain the primary key column
+                increment_columns (list[str]) : Columns that are incremented on conflict. Default is None,
+                                                which overwrites all columns.
+                connection (sl.Connection) : Optionally execute on an open connection (i.e. to share a
+                                             transaction). The caller is then responsible for committing.
+
+        """
+        assert table in self.tables.keys(), f'Invalid table name {table}. Expected one from {self.tables.keys()}'
+        assert all(col in self.tables[table]['header'] for col in data.columns), f'Data contains invalid column name(s): {[col for col in data.columns if col not in self.tables[table]['header']]}'
+
+        if data.empty:
+            return
+
+        key = self.tables[table]['header'][0]
+        columns = data.columns.to_list()
+        increment_columns = increment_columns if increment_columns else []
+
+        updates = ', '.join(f'{col}={col}+excluded.{col}' if col in increment_columns else f'{col}=excluded.{col}' for col in columns if col != key)
+        stmt = f'INSERT INTO {table}({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))}) ON CONFLICT({key}) DO UPDATE SET {updates}'
+
+        # SQLite doesn't understand numpy scalars
+        rows = [tuple(val.item() if hasattr(val, 'item') else val for val in row) for row in data.astype(object).where(data.notna(), None).itertuples(index=False)]
+
+        conn = connection if connection else self.create_connection()[0]
+        conn.executemany(stmt, rows)
+
+        if not connection:
+            self.close_commit(conn)
 
+        logger.info('Upserted %s rows of %s', len(rows), table)
         return
 
     def display_data(self):
@@ -0,0 +1,127 @@
+from ... import logging, os, pd
+from ...utils import PickleHandler, get_current_time
+
+from .registry import DatabaseRegistry
+
+import uuid
+
+
+logger = logging.getLogger('standard.pipeline')
+db_reg = DatabaseRegistry()
+pickler = PickleHandler()
+
+
+class CheckpointStore:
+    """ Saves the output tables of completed pipeline stages so a later run can restore them instead of
+        re-running the stage
+
+        Checkpoints are pickled outside of the databases (one file per stage), so they survive a
+        database reset. Each checkpoint records the stage's input fingerprint and a token for the run
+        that produced it, along with the tokens of the upstream checkpoints it was built from, so a
+        checkpoint is only reused on top of the exact upstream data it was computed from.
+
+        Args:
+            checkpoint_dir (str) : Directory containing the checkpoint files
+
+    """
+    def __init__(self, checkpoint_dir:str):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.checkpoint_dir = checkpoint_dir
+
+    def __repr__(self):
+        return f'CheckpointStore({self.checkpoint_dir})'
+
+    def _path(self, stage_name:str) -> str:
+        return os.path.join(self.checkpoint_dir, f'{stage_name}.pkl')
+
+    def load(self, stage_name:str) -> dict|None:
+        """ Returns the latest checkpoint of a stage, if any """
+        fp = self._path(stage_name)
+        if not os.path.exists(fp):
+            return None
+        return pickler.load_pickle(fp)
+
+    def save(
+            self,
+            stage_name:str,
+            fingerprint:str,
+            upstream_tokens:dict[str, str|None],
+            tables:tuple[str],
+            *,
+            partitions:dict[str, tuple[str, tuple]]|None=None
+        ) -> str:
+        """ Snapshots the current contents of the stage's output tables
+
+            Args:
+                stage_name (str) : Name of the completed stage
+                fingerprint (str) : Input fingerprint of the completed run
+                upstream_tokens (dict[str, str|None]) : Checkpoint tokens of the stages this one depends on
+                tables (tuple[str]) : Output tables as ```<database name>.<table name>```
+                partitions (dict[str, tuple[str, tuple]]) : For tables shared with other stages, maps the table
+                                                            to a column and the values marking this stage's rows.
+                                                            Only those rows are saved (and later restored).
+
+            Returns:
+                The token identifying this checkpoint
+
+        """
+        partitions = partitions if partitions else {}
+
+        frames = {}
+        for resource in tables:
+            db_name, table = resource.split('.', 1)
+            db = db_reg.get_instance(db_name)
+
+            if resource not in partitions:
+                frames[resource] = {'partition': None, 'data': db.get_data(['*'], table)}
+                continue
+
+            column, values = partitions[resource]
+            conn, _ = db.create_connection()
+            data = pd.read_sql(f'SELECT * FROM {table} WHERE {column} IN ({", ".join(["?"] * len(values))})', conn, params=tuple(values))
+            db.close_commit(conn)
+            frames[resource] = {'partition': (column, tuple(values)), 'data': data}
+
+        checkpoint = {
+            'stage': stage_name,
+            'fingerprint': fingerprint,
+            'token': uuid.uuid4().hex,
+            'upstream': upstream_tokens,
+            'created': get_current_time('PRIM_DATETIME'),
+            'frames': frames
+        }
+
+        # write then swap so a crash mid-save never leaves a truncated checkpoint behind
+        fp = self._path(stage_name)
+        tmp_fp = f'{fp[:-4]}.tmp.pkl'
+        pickler.save_pickle(checkpoint, tmp_fp)
+        os.replace(tmp_fp, fp)
+
+        return checkpoint['token']
+
+    @staticmethod
+    def restore(checkpoint:dict):
+        """ Replaces the contents of every table in the checkpoint with its saved frame """
+        by_database:dict[str, list[tuple[str, dict]]] = {}
+        for resource, frame in checkpoint['frames'].items():
+            db_name, table = resource.split('.', 1)
+            by_database.setdefault(db_name, []).append((table, frame))
+
+        for db_name, tables in by_database.items():
+            db = db_reg.get_instance(db_name)
+            conn, curs = db.create_connection()
+            existing = {info[0] for info in curs.execute('SELECT name FROM sqlite_master WHERE type=?', ('table',))}
+
+            for table, frame in tables:
+                # keep the table (and its primary key) created from the config when it exists
+                if table in existing and frame['partition']:
+                    column, values = frame['partition']
+                    curs.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["?"] * len(values))})', values)
+                elif table in existing:
+                    curs.execute(f'DELETE FROM {table}')
+                frame['data'].to_sql(table, conn, if_exists='append', index=False)
+
+            db.close_commit(conn)
+
+        logger.info('Restored %s from the %s checkpoint created %s', list(checkpoint["frames"]), checkpoint["stage"], checkpoint["created"])
+        return
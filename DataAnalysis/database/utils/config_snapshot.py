@@ -0,0 +1,166 @@
+from ... import logging, os, csv, yaml, pickle
+from ...config import DB_CONFIG_DIR, CONFIG_SNAPSHOT_DIR
+
+from .custom_types import ColumnSpec, ConfigSnapshot, ProccessingConfig, TableData
+
+import hashlib
+
+
+logger = logging.getLogger('standard.database')
+
+# bumped whenever ConfigSnapshot or its compilation changes; part of the source hash, so older snapshots are recompiled
+CONFIG_SNAPSHOT_VERSION = 1
+
+DB_TABLE_CONFIG_FILE = DB_CONFIG_DIR / 'db_table_data.csv'
+PROCESSING_CONFIG_FILE = DB_CONFIG_DIR / 'processing_config.yaml'
+
+DB_TABLE_CONFIG_HEADER = ['database_name', 'table_name', 'header', 'header_data_type', 'foreign_key']
+DATA_ALIAS_KEYS = ['purchase_data', 'flavor_data', 'can_data']
+
+# snapshots already loaded by this process, by source hash
+_loaded_snapshots:dict[str, ConfigSnapshot] = {}
+
+
+def load_config_snapshot(
+        db_config_path:str=str(DB_TABLE_CONFIG_FILE),
+        processing_config_path:str=str(PROCESSING_CONFIG_FILE),
+        *,
+        snapshot_dir:str=str(CONFIG_SNAPSHOT_DIR)
+    ) -> ConfigSnapshot:
+    """ Returns the compiled database table and processing config, compiling it only when its source files changed
+
+        Snapshots are saved as ```config_<source hash>.pkl``` in snapshot_dir, so an unchanged config is
+        only hashed and unpickled (and only hashed again within the same process).
+
+        Args:
+            db_config_path (str) : Path to the database table config CSV file
+            processing_config_path (str) : Path to the processing config YAML file
+            snapshot_dir (str) : Directory holding the compiled snapshots
+
+    """
+    source_hash = config_source_hash(db_config_path, processing_config_path)
+
+    snapshot = _loaded_snapshots.get(source_hash)
+    if snapshot is not None:
+        return snapshot
+
+    fp = os.path.join(snapshot_dir, f'config_{source_hash}.pkl')
+    if os.path.isfile(fp):
+        with open(fp, 'rb') as fn:
+            snapshot = pickle.load(fn)
+        assert isinstance(snapshot, ConfigSnapshot) and snapshot.source_hash == source_hash, f'Invalid config snapshot: {fp}'
+    else:
+        snapshot = compile_config_snapshot(db_config_path, processing_config_path, source_hash=source_hash)
+        save_config_snapshot(snapshot, snapshot_dir)
+
+    _loaded_snapshots[source_hash] = snapshot
+    return snapshot
+
+
+def config_source_hash(*paths:str) -> str:
+    """ Hashes the contents of config source files (and the snapshot version) """
+    hasher = hashlib.sha1(str(CONFIG_SNAPSHOT_VERSION).encode())
+    for path in paths:
+        with open(path, 'rb') as fn:
+            hasher.update(fn.read())
+    return hasher.hexdigest()[:16]
+
+
+def compile_config_snapshot(db_config_path:str, processing_config_path:str, *, source_hash:str|None=None) -> ConfigSnapshot:
+    """ Parses and validates the config source files into a snapshot """
+    snapshot = ConfigSnapshot(
+        version=CONFIG_SNAPSHOT_VERSION,
+        source_hash=source_hash if source_hash else config_source_hash(db_config_path, processing_config_path),
+        databases=_compile_db_config(db_config_path),
+        processing=_compile_processing_config(processing_config_path)
+    )
+    logger.info('Compiled config snapshot %s from %s and %s', snapshot.source_hash, db_config_path, processing_config_path)
+    return snapshot
+
+
+def save_config_snapshot(snapshot:ConfigSnapshot, snapshot_dir:str=str(CONFIG_SNAPSHOT_DIR)) -> str:
+    """ Saves a snapshot, removing the snapshots of previous versions of the config
+
+        Returns:
+            Path to the saved snapshot
+
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    fp = os.path.join(snapshot_dir, f'config_{snapshot.source_hash}.pkl')
+
+    # written to a temporary file first so a concurrent load never reads a partial snapshot
+    tmp_fp = f'{fp}.tmp'
+    with open(tmp_fp, 'wb') as fn:
+        pickle.dump(snapshot, fn, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_fp, fp)
+
+    for fn in os.listdir(snapshot_dir):
+        if fn.startswith('config_') and fn.endswith('.pkl') and fn != os.path.basename(fp):
+            os.remove(os.path.join(snapshot_dir, fn))
+
+    logger.info('Saved config snapshot to %s', fp)
+    return fp
+
+
+def _compile_db_config(path_to_config_file:str) -> dict[str, TableData]:
+    """ Restructures the database table config CSV, preserving the order of databases, tables and headers
+
+        Output hierarchy: ```{<database name>: {<table name>: (ColumnSpec, ...)}}```, where the first column
+        of each table is its primary key and foreign keys are specified as ```<table>;<column>``` (or FALSE).
+
+    """
+    assert str(path_to_config_file).endswith('.csv'), f'Must supply a path to a CSV file, not: {path_to_config_file}'
+
+    databases:dict[str, dict[str, list[ColumnSpec]]] = {}
+
+    with open(path_to_config_file, 'r', newline='') as fn:
+        reader = csv.reader(fn)
+        header = next(reader, None)
+        assert header == DB_TABLE_CONFIG_HEADER, f'{path_to_config_file} must have the header {DB_TABLE_CONFIG_HEADER}, not: {header}'
+
+        for line_number, row in enumerate(reader, start=2):
+            if not row:
+                continue
+
+            assert len(row) == len(DB_TABLE_CONFIG_HEADER), f'{path_to_config_file}:{line_number} has {len(row)} fields, expected {len(DB_TABLE_CONFIG_HEADER)}'
+            database_name, table_name, column, data_type, foreign_key = (field.strip() for field in row)
+            assert all((database_name, table_name, column, data_type)), f'{path_to_config_file}:{line_number} is missing a database name, table name, header or data type'
+
+            if foreign_key.upper() == 'FALSE':
+                reference = None
+            else:
+                reference = tuple(foreign_key.split(';'))
+                assert len(reference) == 2 and all(reference), f'{path_to_config_file}:{line_number} foreign key must be <table>;<column> or FALSE, not: {foreign_key}'
+
+            columns = databases.setdefault(database_name, {}).setdefault(table_name, [])
+            assert column not in [col.header for col in columns], f'{path_to_config_file}:{line_number} duplicates header {column} of {database_name}.{table_name}'
+            columns.append(ColumnSpec(header=column, data_type=data_type.upper(), foreign_key=reference))
+
+    assert databases, f'{path_to_config_file} does not define any tables'
+    return {database_name:{table_name:tuple(columns) for table_name, columns in tables.items()} for database_name, tables in databases.items()}
+
+
+def _compile_processing_config(path_to_config_file:str) -> ProccessingConfig:
+    """ Reads and validates the (single document) processing config YAML file """
+    with open(path_to_config_file, 'r') as fn:
+        documents = list(yaml.load_all(fn, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)))
+
+    assert len(documents) == 1, f'{path_to_config_file} must contain one YAML document, not {len(documents)}'
+    config = documents[0]
+
+    missing = [key for key in ProccessingConfig.__annotations__ if key not in (config or {})]
+    assert not missing, f'{path_to_config_file} is missing: {missing}'
+
+    aliases = config['data_aliases']
+    assert list(aliases) == DATA_ALIAS_KEYS, f'data_aliases keys must be {DATA_ALIAS_KEYS} (in that order), not: {list(aliases)}'
+    assert set(config['default_output_directory_names']) == set(aliases.values()), f'default_output_directory_names keys must match the data_aliases values: {list(aliases.values())}'
+
+    headers = config['headers_to_extract']
+    for collection in ('flavor', 'can'):
+        assert isinstance(headers.get(collection), list) and all(isinstance(col, str) for col in headers[collection]), f'headers_to_extract.{collection} must be a list of header names'
+
+    return ProccessingConfig(
+        data_aliases=dict(aliases),
+        default_output_directory_names=dict(config['default_output_directory_names']),
+        headers_to_extract={collection:list(headers[collection]) for collection in ('flavor', 'can')}
+    )
@@ -0,0 +1,177 @@
+from ... import logging, pd
+
+from .registry import DatabaseRegistry
+
+import threading
+from typing import Literal
+
+
+logger = logging.getLogger('standard.pipeline')
+db_reg = DatabaseRegistry()
+
+# format pandas.to_sql uses when storing datetimes in SQLite
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class DataContext:
+    """ Pipeline-scoped store of whole table frames shared between stages in memory
+
+        Stages read tables through ```get``` and write them through ```sink```. A sink writes to
+        SQLite and keeps the written frame (converted to the dtypes SQLite returns), so downstream
+        stages get that same frame object back instead of re-reading the table. Tables that are not
+        held yet are read from SQLite once and then held.
+
+        Frames returned by the context are shared and must be treated as read-only.
+
+    """
+    def __init__(self):
+        self._frames:dict[str, pd.DataFrame] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f'DataContext({list(self._frames)})'
+
+    def __contains__(self, resource:str):
+        return resource in self._frames
+
+    def get(self, db_name:str, table:str, columns:list[str]|None=None) -> pd.DataFrame:
+        """ Returns a table (optionally only some of its columns), reading it from SQLite only if not held
+
+            Args:
+                db_name (str) : Name of the database in the registry
+                table (str) : Name of the table
+                columns (list[str]) : Columns to return. Default is None, which returns the held frame itself
+
+        """
+        resource = f'{db_name}.{table}'
+
+        with self._lock:
+            frame = self._frames.get(resource)
+            if frame is None:
+                self.misses += 1
+                frame = db_reg.get_instance(db_name).get_data(['*'], table)
+                self._frames[resource] = frame
+            else:
+                self.hits += 1
+
+        if columns is None:
+            return frame
+
+        assert all(col in frame.columns for col in columns), f'Invalid column(s) for {resource}: {[col for col in columns if col not in frame.columns]}'
+        return frame[columns]
+
+    def sink(
+            self,
+            db_name:str,
+            table:str,
+            data:pd.DataFrame,
+            *,
+            if_exists:Literal['fail', 'replace', 'append']='append'
+        ) -> pd.DataFrame:
+        """ Writes a frame to its SQLite table and holds the table's new contents
+
+            Args:
+                db_name (str) : Name of the database in the registry
+                table (str) : Name of the table
+                data (pd.DataFrame) : Rows being written
+                if_exists (str) : Passed to pandas.to_sql. Default is append
+
+            Returns:
+                The held frame of the whole table
+
+        """
+        resource = f'{db_name}.{table}'
+        db = db_reg.get_instance(db_name)
+        stored = self._as_stored(data)
+
+        with self._lock:
+            # appending onto a table that isn't held requires its current rows once
+            existing = self.get(db_name, table) if if_exists == 'append' else None
+
+            conn, _ = db.create_connection()
+            data.to_sql(table, conn, if_exists=if_exists, index=False)
+            db.close_commit(conn)
+
+            if existing is not None and not existing.empty:
+                stored = pd.concat([existing, stored], ignore_index=True)
+
+            self._frames[resource] = stored
+
+        logger.info('Sank %s rows into %s (%s)', len(data), resource, if_exists)
+        return stored
+
+    def sink_partitions(
+            self,
+            db_name:str,
+            table:str,
+            partitions:dict[str, pd.DataFrame],
+            *,
+            column:str='profile_id'
+        ) -> pd.DataFrame:
+        """ Replaces the rows of some partitions of a table (i.e. of re-processed profiles), leaving every other row untouched
+
+            The old rows of every given partition are deleted and the new rows inserted in one transaction.
+
+            Args:
+                db_name (str) : Name of the database in the registry
+                table (str) : Name of the table
+                partitions (dict[str, pd.DataFrame]) : Maps each partition value to its new rows. An empty frame
+                                                       only deletes the partition.
+                column (str) : Column holding the partition value. Default is profile_id
+
+            Returns:
+                The held frame of the whole table
+
+        """
+        resource = f'{db_name}.{table}'
+        db = db_reg.get_instance(db_name)
+        frames = [df for df in partitions.values() if not df.empty]
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        with self._lock:
+            existing = self.get(db_name, table)
+
+            conn, curs = db.create_connection()
+            curs.executemany(f'DELETE FROM {table} WHERE {column}=?', [(value,) for value in partitions])
+            if not data.empty:
+                data.to_sql(table, conn, if_exists='append', index=False)
+            db.close_commit(conn)
+
+            kept = existing[~existing[column].isin(list(partitions))]
+            frames = [df for df in (kept, self._as_stored(data)) if not df.empty]
+            stored = pd.concat(frames, ignore_index=True) if frames else kept.reset_index(drop=True)
+
+            self._frames[resource] = stored
+
+        logger.info('Sank %s rows of partitions %s into %s', len(data), list(partitions), resource)
+        return stored
+
+    def discard(self, resources:tuple[str]):
+        """ Stops holding tables (i.e. before they are written outside of the context) """
+        with self._lock:
+            for resource in resources:
+                self._frames.pop(resource, None)
+        return
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+        return
+
+    @staticmethod
+    def _as_stored(data:pd.DataFrame) -> pd.DataFrame:
+        """ Converts a frame to the dtypes pandas.read_sql returns for it after a pandas.to_sql round trip """
+        stored = data.reset_index(drop=True)
+        for col in stored.columns:
+            series = stored[col]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                stored[col] = series.dt.strftime(SQLITE_DATETIME_FORMAT).astype(object).where(series.notna(), None)
+            elif pd.api.types.is_bool_dtype(series):
+                stored[col] = series.astype('int64')
+            elif pd.api.types.is_float_dtype(series):
+                stored[col] = series.astype('float64')
+            elif pd.api.types.is_string_dtype(series) or series.dtype == object:
+                stored[col] = series.astype(object).where(series.notna(), None)
+        return stored
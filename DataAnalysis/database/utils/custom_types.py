@@ -1,4 +1,4 @@
-from ... import Literal, pd, TypeAlias, TypedDict
+from ... import Literal, NamedTuple, TypeAlias, TypedDict
 
 
 
@@ -6,9 +6,12 @@ from ... import Literal, pd, TypeAlias, TypedDict
 
 
 
-TableData:TypeAlias = dict[str, pd.DataFrame]
-TableMap:TypeAlias = dict[Literal['table_order_map'], TableData]
-DatabaseConfigMap:TypeAlias = dict[str, TableMap]
+class ColumnSpec(NamedTuple):
+    header: str
+    data_type: str
+    foreign_key: tuple[str, str]|None # referenced (table, column)
+
+TableData:TypeAlias = dict[str, tuple[ColumnSpec, ...]] # NOTE key is table name, columns in config order (the first is the primary key)
 
 
 class ProccessingConfig(TypedDict):
@@ -16,6 +19,13 @@ class ProccessingConfig(TypedDict):
     default_output_directory_names: dict[str, str]
     headers_to_extract: dict[Literal['flavor', 'can'], list[str]]
 
+
+class ConfigSnapshot(NamedTuple):
+    version: int
+    source_hash: str
+    databases: dict[str, TableData] # NOTE key is database name, in config order
+    processing: ProccessingConfig
+
 TablesMicroInfo:TypeAlias = dict[Literal['header'], list[str]]
 TablesMacroInfo:TypeAlias = dict[str, TablesMicroInfo] # NOTE key is table name    
 
@@ -0,0 +1,61 @@
+from .base import Database, logging, sl
+
+
+logger = logging.getLogger('standard.pipeline')
+
+LEDGER_TABLE = 'processed_items'
+
+
+class ProcessedLedger:
+    """ Tracks which items (box/can ids) a consumer has already folded into an incrementally maintained table
+
+        Entries are stored in the ```processed_items``` table of the provided database, keyed by
+        ```<consumer>:<item id>```, so several consumers can share one table.
+
+        Args:
+            database (Database) : Database containing the processed_items table
+            consumer (str) : Name of the incremental process using this ledger
+
+    """
+    def __init__(self, database:Database, consumer:str):
+        # the table is created when the database is registered (see Database.migrate_tables) if it's configured
+        if not database.has_table(LEDGER_TABLE):
+            raise sl.OperationalError(f'{database.database_name} has no {LEDGER_TABLE} table. Add it to the database config and register the database to create it.')
+        self.database = database
+        self.consumer = consumer
+
+    def __repr__(self):
+        return f'{self.consumer} Ledger ({self.database.database_name})'
+
+    def filter_unprocessed(self, item_ids:list[str]) -> list[str]:
+        """ Returns the item ids (in their original order) that have not been recorded yet """
+        processed = set(self.database.get_data(['item_id'], LEDGER_TABLE, where_info=[('consumer', self.consumer)])['item_id'])
+        return [iid for iid in item_ids if iid not in processed]
+
+    def record(self, item_ids:list[str], *, connection:sl.Connection|None=None):
+        """ Marks item ids as processed
+
+            Args:
+                item_ids (list[str]) : Item ids to record. Already recorded ids are ignored
+                connection (sl.Connection) : Optionally execute on an open connection so the ledger
+                                             is committed together with the incremental update
+
+        """
+        rows = [(f'{self.consumer}:{iid}', self.consumer, iid) for iid in item_ids]
+
+        conn = connection if connection else self.database.create_connection()[0]
+        conn.executemany(f'INSERT OR IGNORE INTO {LEDGER_TABLE}(id, consumer, item_id) VALUES (?, ?, ?)', rows)
+
+        if not connection:
+            self.database.close_commit(conn)
+
+        logger.info('Recorded %s processed items for %s', len(rows), self.consumer)
+        return
+
+    def reset(self):
+        """ Forgets every item recorded by this consumer """
+        conn, curs = self.database.create_connection()
+        curs.execute(f'DELETE FROM {LEDGER_TABLE} WHERE consumer=?', (self.consumer,))
+        self.database.close_commit(conn)
+        logger.info('Reset ledger for %s', self.consumer)
+        return
@@ -0,0 +1,153 @@
+from ... import logging, os, pd
+from ...utils import get_current_time
+from ...config import DEFAULT_PROFILE_ID, PROFILE_DATA_DIR_NAME, PROFILE_WORKERS
+from ...log_queue import WORKER_CONTEXT, init_worker_logging, worker_log_queue
+
+from .registry import DatabaseRegistry
+
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+
+logger = logging.getLogger('standard.pipeline')
+db_reg = DatabaseRegistry()
+
+# column marking the profile each partitioned row belongs to
+PARTITION_COLUMN = 'profile_id'
+
+STATE_DATABASE = 'master'
+STATE_TABLE = 'partition_state'
+
+
+def profile_data_dirs(base_data_dir:str) -> dict[str, str]:
+    """ Maps each profile id to the directory containing its raw CSV and MD data
+
+        Profiles are the sub-directories of ```<base_data_dir>/profiles```. Without that directory,
+        the base data directory holds the data of the default profile.
+
+    """
+    profiles_dir = os.path.join(base_data_dir, PROFILE_DATA_DIR_NAME)
+    if not os.path.isdir(profiles_dir):
+        return {DEFAULT_PROFILE_ID: base_data_dir}
+
+    return {fn:os.path.join(profiles_dir, fn) for fn in sorted(os.listdir(profiles_dir)) if os.path.isdir(os.path.join(profiles_dir, fn))}
+
+
+def partition_values(*frames:pd.DataFrame) -> list[str]:
+    """ Sorted profile ids found in frames (rows without a profile belong to the default profile) """
+    values = set()
+    for df in frames:
+        if PARTITION_COLUMN in df.columns:
+            values |= set(df[PARTITION_COLUMN].fillna(DEFAULT_PROFILE_ID))
+    return sorted(values)
+
+
+def split_partitions(df:pd.DataFrame, profiles:list[str]) -> dict[str, pd.DataFrame]:
+    """ Splits a frame into the rows of each profile (rows without a profile belong to the default profile) """
+    keys = df[PARTITION_COLUMN].fillna(DEFAULT_PROFILE_ID) if PARTITION_COLUMN in df.columns else pd.Series(DEFAULT_PROFILE_ID, index=df.index)
+    groups = {profile:df.loc[idx] for profile, idx in df.groupby(keys).groups.items()}
+    return {profile:groups.get(profile, df.iloc[0:0]) for profile in profiles}
+
+
+def frame_fingerprint(*frames:pd.DataFrame) -> str:
+    """ Hashes the columns and contents of frames (row order included)
+
+        Columns are hashed by name, so a frame held by the pipeline context and the same table read
+        back from SQLite (with the table's column order) have the same fingerprint.
+    """
+    hasher = hashlib.sha1()
+    for df in frames:
+        columns = sorted(df.columns)
+        hasher.update(repr(columns).encode())
+        hasher.update(pd.util.hash_pandas_object(df[columns], index=False).values.tobytes())
+    return hasher.hexdigest()
+
+
+def map_partitions(func:Callable, partition_args:dict[str, tuple], *, max_workers:int=PROFILE_WORKERS) -> dict[str, object]:
+    """ Calls func with each partition's arguments, in parallel worker processes
+
+        Args:
+            func (Callable) : Module-level function (so it can be sent to the workers)
+            partition_args (dict[str, tuple]) : Maps each partition (profile id) to the positional arguments of its call
+            max_workers (int) : Maximum number of worker processes. With one worker, or only one partition,
+                                everything runs in this process. Workers log through this process's handlers.
+
+        Returns:
+            Each partition mapped to func's return value
+
+    """
+    workers = min(max_workers, len(partition_args))
+    if workers <= 1:
+        return {key:func(*args) for key, args in partition_args.items()}
+
+    # stages run on scheduler threads, so workers are spawned (see log_queue.WORKER_CONTEXT)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT, initializer=init_worker_logging, initargs=(worker_log_queue(),)) as executor:
+        futures = {key:executor.submit(func, *args) for key, args in partition_args.items()}
+        return {key:future.result() for key, future in futures.items()}
+
+
+class PartitionState:
+    """ Tracks the input fingerprint each profile was last processed with by a stage
+
+        Entries are stored in the ```partition_state``` table of the master database, keyed by
+        ```<stage>:<profile id>```, so a stage only re-processes the profiles whose inputs changed.
+
+        Args:
+            stage (str) : Name of the stage processing the partitions
+
+    """
+    def __init__(self, stage:str):
+        self.stage = stage
+        self.database = db_reg.get_instance(STATE_DATABASE)
+
+        if not self.available:
+            logger.warning('%s has no %s table; every profile will be processed. Add it to the database config to track partitions.', STATE_DATABASE, STATE_TABLE)
+
+    def __repr__(self):
+        return f'{self.stage} Partition State'
+
+    @property
+    def available(self) -> bool:
+        """ True if the state table exists in the database file (see Database.migrate_tables) """
+        return self.database.has_table(STATE_TABLE)
+
+    def changed(self, fingerprints:dict[str, str]) -> list[str]:
+        """ Returns the profiles (in their original order) whose fingerprint differs from the recorded one """
+        if not self.available:
+            return list(fingerprints)
+
+        recorded = self.recorded()
+        return [profile for profile, fingerprint in fingerprints.items() if recorded.get(profile) != fingerprint]
+
+    def recorded(self) -> dict[str, str]:
+        """ Returns the fingerprint each profile was last processed with """
+        if not self.available:
+            return {}
+
+        recorded = self.database.get_data(['profile_id', 'fingerprint'], STATE_TABLE, where_info=[('stage', self.stage)])
+        return dict(zip(recorded['profile_id'], recorded['fingerprint']))
+
+    def stale(self, profiles:list[str]) -> list[str]:
+        """ Returns the (sorted) previously processed profiles missing from profiles, i.e. whose data was removed """
+        return sorted(set(self.recorded()) - set(profiles))
+
+    def record(self, fingerprints:dict[str, str]):
+        """ Stores the fingerprints of newly processed profiles """
+        if not self.available or not fingerprints:
+            return
+
+        ct = get_current_time('PRIM_DATETIME')
+        rows = [{'id':f'{self.stage}:{profile}', 'stage':self.stage, 'profile_id':profile, 'fingerprint':fingerprint, 'last_run':ct} for profile, fingerprint in fingerprints.items()]
+        self.database.upsert_values(STATE_TABLE, pd.DataFrame(rows))
+        return
+
+    def forget(self, profiles:list[str]):
+        """ Removes the fingerprints of profiles whose outputs were deleted """
+        if not self.available or not profiles:
+            return
+
+        conn, curs = self.database.create_connection()
+        curs.executemany(f'DELETE FROM {STATE_TABLE} WHERE id=?', [(f'{self.stage}:{profile}',) for profile in profiles])
+        self.database.close_commit(conn)
+        return
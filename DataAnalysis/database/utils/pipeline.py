@@ -0,0 +1,424 @@
+from ... import logging, os, pd, Literal
+from ...utils import get_current_time, bump_data_version
+
+from .registry import DatabaseRegistry
+from .checkpoint import CheckpointStore
+from .profiling import StageProfiler
+from .context import DataContext
+
+import hashlib
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable
+
+
+logger = logging.getLogger('standard.pipeline')
+db_reg = DatabaseRegistry()
+
+STATE_DATABASE = 'master'
+STATE_TABLE = 'pipeline_stages'
+FILE_RESOURCE_PREFIX = 'file:'
+
+# callbacks receiving the resources written by each finished stage (i.e. to drop caches)
+_write_listeners:list[Callable[[tuple[str]], None]] = []
+
+
+def register_write_listener(callback:Callable[[tuple[str]], None]):
+    """ Registers a callback called with a stage's written resources whenever it completes or is restored """
+    _write_listeners.append(callback)
+    return
+
+
+def _notify_write(stage:'PipelineStage'):
+    for callback in _write_listeners:
+        try:
+            callback(stage.writes)
+        except Exception as e:
+            logger.error('Write listener %s failed after %s: %r', callback, stage.name, e)
+    return
+
+
+class PipelineStage:
+    """ A single pipeline step and the resources it reads and writes
+
+        Resources are either database tables, written as ```<database name>.<table name>```, or files/
+        directories outside the databases, written as ```file:<path>```.
+
+        If func accepts a ```context``` argument, it is passed the run's DataContext so tables are
+        shared in memory between stages. If func accepts a ```profiles``` argument, it processes data
+        per profile, and runs limited to some profiles pass them on.
+
+        Args:
+            name (str) : Unique stage name (usually the name of the function it runs)
+            func (Callable) : Function executed by the stage
+            reads (tuple[str]) : Resources the stage reads from
+            writes (tuple[str]) : Resources the stage writes to
+            kwargs (dict) : Keyword arguments passed to func
+            partitions (dict[str, tuple[str, tuple]]) : For written tables shared with other stages, maps the
+                                                        table to a column and the values marking the rows this
+                                                        stage owns (used by checkpoints)
+
+    """
+    def __init__(
+            self,
+            name:str,
+            func:Callable,
+            *,
+            reads:tuple[str]=(),
+            writes:tuple[str]=(),
+            kwargs:dict|None=None,
+            partitions:dict[str, tuple[str, tuple]]|None=None
+        ):
+        self.name = name
+        self.func = func
+        self.reads = tuple(reads)
+        self.writes = tuple(writes)
+        self.kwargs = kwargs if kwargs else {}
+        self.partitions = partitions if partitions else {}
+        self.accepts_context = 'context' in inspect.signature(func).parameters
+        self.accepts_profiles = 'profiles' in inspect.signature(func).parameters
+
+        assert all(res in self.writes for res in self.partitions), f'{name} partitions tables it does not write: {[res for res in self.partitions if res not in self.writes]}'
+
+    def __repr__(self):
+        return f'{self.name} Stage'
+
+    @property
+    def write_databases(self) -> set[str]:
+        """ Names of the databases this stage writes to """
+        return {res.split('.')[0] for res in self.writes if not res.startswith(FILE_RESOURCE_PREFIX)}
+
+    def run(self, context:DataContext|None=None, profiles:tuple[str]|None=None):
+        kwargs = dict(self.kwargs)
+        if context is not None and self.accepts_context:
+            kwargs['context'] = context
+        if profiles and self.accepts_profiles:
+            kwargs['profiles'] = profiles
+        return self.func(**kwargs)
+
+
+class PipelineScheduler:
+    """ Runs pipeline stages as a dependency graph derived from the resources each stage reads and writes
+
+        A stage depends on every stage registered before it that writes a resource it reads or writes,
+        so registration order only matters between stages touching the same resources. Independent
+        stages run concurrently, except that two stages never write the same database at once.
+
+        Stages are skipped when their input fingerprint (kwargs, file resource stats and the fingerprints
+        of the stages they depend on) matches their last successful run and none of their dependencies
+        ran during this run. Stage state and timings are stored in the master database.
+
+        If a checkpoint directory is provided, runs with checkpointing enabled (or resumed runs) save the
+        output tables of every completed stage there, and resumed runs restore matching checkpoints
+        instead of re-running their stages.
+
+        Args:
+            stages (list[PipelineStage]) : Stages in registration order
+            max_workers (int) : Maximum number of stages run at once
+            checkpoint_dir (str) : Optionally save stage checkpoints to this directory
+
+    """
+    def __init__(self, stages:list[PipelineStage], *, max_workers:int=4, checkpoint_dir:str|None=None):
+        names = [stage.name for stage in stages]
+        assert len(names) == len(set(names)), f'Duplicate stage names: {[nm for nm in names if names.count(nm) > 1]}'
+
+        self.stages:dict[str, PipelineStage] = {stage.name:stage for stage in stages}
+        self.max_workers = max_workers
+
+        self.dependencies:dict[str, set[str]] = self._resolve_dependencies(stages)
+        self.timings:dict[str, float] = {}
+        self.checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+
+    def __repr__(self):
+        return f'PipelineScheduler({list(self.stages)})'
+
+    @staticmethod
+    def _resolve_dependencies(stages:list[PipelineStage]) -> dict[str, set[str]]:
+        dependencies = {}
+        for idx, stage in enumerate(stages):
+            touched = set(stage.reads) | set(stage.writes)
+            dependencies[stage.name] = {prior.name for prior in stages[:idx] if touched & set(prior.writes)}
+        return dependencies
+
+    def resolve_targets(self, targets:tuple[str]|None=None) -> list[str]:
+        """ Returns the target stages and everything they depend on, in registration order """
+        if not targets:
+            return list(self.stages)
+
+        assert all(tgt in self.stages for tgt in targets), f'Invalid target stage(s): {[tgt for tgt in targets if tgt not in self.stages]}'
+
+        required = set()
+        queue = list(targets)
+        while queue:
+            name = queue.pop()
+            if name not in required:
+                required.add(name)
+                queue.extend(self.dependencies[name])
+
+        return [name for name in self.stages if name in required]
+
+    # @@@@@@@@@@@@@@@@@@@ RUNNING @@@@@@@@@@@@@@@@@@@
+
+    def run(
+            self,
+            targets:tuple[str]|None=None,
+            *,
+            force:bool=False,
+            checkpoint:bool=False,
+            resume:bool=False,
+            profiler:StageProfiler|None=None,
+            profiles:tuple[str]|None=None
+        ) -> dict[str, Literal['complete', 'skipped', 'restored']]:
+        """ Runs the target stages (and their dependencies), concurrently where possible
+
+            Args:
+                targets (tuple[str]) : Stage names to bring up to date. Default is None, which runs all stages
+                force (bool) : If true, runs every stage even if its inputs are unchanged. Default is False.
+                checkpoint (bool) : If true, saves a checkpoint of every stage that completes, so a later run can
+                                    resume from it. Default is False, since saving copies every output table.
+                resume (bool) : If true, stages with a checkpoint matching their inputs and upstream data are
+                                restored from it instead of re-run (i.e. after a failed run or a reset), and
+                                completed stages are checkpointed. Default is False.
+                profiler (StageProfiler) : Optionally profile every stage that runs. Stages are then run one
+                                           at a time, since profilers are process-wide.
+                profiles (tuple[str]) : Optionally re-process only these profiles. Stages that process data per
+                                        profile then (re-)write only these profiles' rows; every other stage
+                                        runs as usual.
+
+            Returns:
+                The outcome of each stage. If a stage fails, stages already running are finished, nothing
+                new is started, and the stage's exception is raised.
+
+        """
+        order = self.resolve_targets(targets)
+        state = self._load_state()
+        save_checkpoints = checkpoint or resume
+
+        fingerprints:dict[str, str] = {}
+        tokens:dict[str, str|None] = {} # checkpoint token of each stage's current output
+        outcomes:dict[str, str] = {}
+        executed:set[str] = set()
+        running = {}
+        failure = None
+
+        # tables shared in memory between the stages of this run
+        context = DataContext()
+
+        logger.info('Running pipeline stages: %s', order)
+
+        with ThreadPoolExecutor(max_workers=1 if profiler else self.max_workers) as executor:
+            while len(outcomes) < len(order) and failure is None:
+                busy_databases = set().union(*(self.stages[name].write_databases for name in running.values()))
+
+                for name in order:
+                    if name in outcomes or name in running.values():
+                        continue
+                    if not all(dep in outcomes for dep in self.dependencies[name]):
+                        continue
+
+                    stage = self.stages[name]
+                    fingerprints[name] = self._fingerprint(stage, fingerprints, profiles)
+
+                    previous = state.get(name)
+                    unchanged = previous and previous['status'] == 'complete' and previous['fingerprint'] == fingerprints[name]
+                    if not force and unchanged and not (self.dependencies[name] & executed):
+                        outcomes[name] = 'skipped'
+                        tokens[name] = previous['checkpoint']
+                        logger.info('Skipped %s stage; inputs unchanged since %s', name, previous["last_run"])
+                        continue
+
+                    if stage.write_databases & busy_databases:
+                        continue
+
+                    # drop held copies of anything the stage may rewrite outside of the context
+                    context.discard(stage.writes)
+
+                    # checkpoints hold whole tables, not the rows of the requested profiles
+                    if resume and not (profiles and stage.accepts_profiles) and self._restore_checkpoint(stage, fingerprints[name], tokens):
+                        executed.add(name)
+                        outcomes[name] = 'restored'
+                        continue
+
+                    busy_databases |= stage.write_databases
+                    running[executor.submit(self._timed_run, stage, context, profiler, profiles)] = name
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error, duration = future.result()
+                    self.timings[name] = duration
+
+                    if error:
+                        self._record_state(name, fingerprints[name], 'failed', duration)
+                        logger.error('%s stage failed after %.2fs: %r', name, duration, error)
+                        failure = failure if failure else error
+                        continue
+
+                    executed.add(name)
+                    outcomes[name] = 'complete'
+                    _notify_write(self.stages[name])
+                    tokens[name] = self._save_checkpoint(self.stages[name], fingerprints[name], tokens) if save_checkpoints else None
+                    self._record_state(name, fingerprints[name], 'complete', duration, tokens[name])
+                    logger.info('Completed %s stage in %.2fs', name, duration)
+
+            # finish anything still running after a failure
+            for future in list(running):
+                name = running.pop(future)
+                error, duration = future.result()
+                self.timings[name] = duration
+
+                if error:
+                    self._record_state(name, fingerprints[name], 'failed', duration)
+                else:
+                    executed.add(name)
+                    _notify_write(self.stages[name])
+                    token = self._save_checkpoint(self.stages[name], fingerprints[name], tokens) if save_checkpoints else None
+                    self._record_state(name, fingerprints[name], 'complete', duration, token)
+
+        logger.info('Data context served %s table reads from memory and %s from SQLite', context.hits, context.misses)
+
+        # expire the website's cached pages if any data changed (including before a failure)
+        if executed:
+            bump_data_version()
+
+        if failure:
+            raise failure
+
+        return outcomes
+
+    @staticmethod
+    def _timed_run(
+            stage:PipelineStage,
+            context:DataContext,
+            profiler:StageProfiler|None=None,
+            profiles:tuple[str]|None=None
+        ) -> tuple[Exception|None, float]:
+        start = time.perf_counter()
+        try:
+            if profiler:
+                profiler.profile(stage.name, stage.run, context=context, profiles=profiles)
+            else:
+                stage.run(context, profiles)
+            error = None
+        except Exception as e:
+            error = e
+        return error, time.perf_counter() - start
+
+    # @@@@@@@@@@@@@@@@@@@ CHECKPOINTS @@@@@@@@@@@@@@@@@@@
+
+    def _save_checkpoint(self, stage:PipelineStage, fingerprint:str, tokens:dict[str, str|None]) -> str|None:
+        if not self.checkpoints:
+            return None
+
+        tables = tuple(res for res in stage.writes if not res.startswith(FILE_RESOURCE_PREFIX))
+        upstream = {dep:tokens.get(dep) for dep in self.dependencies[stage.name]}
+        return self.checkpoints.save(stage.name, fingerprint, upstream, tables, partitions=stage.partitions)
+
+    def _restore_checkpoint(self, stage:PipelineStage, fingerprint:str, tokens:dict[str, str|None]) -> bool:
+        """ Restores the stage's checkpoint if it was computed from the same inputs and upstream data
+
+            Returns:
+                True if the checkpoint was restored
+        
+        """
+        if not self.checkpoints:
+            return False
+
+        checkpoint = self.checkpoints.load(stage.name)
+        if not checkpoint or checkpoint['fingerprint'] != fingerprint:
+            return False
+
+        upstream_matches = all(tokens.get(dep) is not None and checkpoint['upstream'].get(dep) == tokens[dep] for dep in self.dependencies[stage.name])
+        if not upstream_matches:
+            return False
+
+        start = time.perf_counter()
+        self.checkpoints.restore(checkpoint)
+        duration = time.perf_counter() - start
+
+        _notify_write(stage)
+        tokens[stage.name] = checkpoint['token']
+        self.timings[stage.name] = duration
+        self._record_state(stage.name, fingerprint, 'complete', duration, checkpoint['token'])
+        logger.info('Restored %s stage from checkpoint in %.2fs', stage.name, duration)
+        return True
+
+    def display_timings(self):
+        """ Prints the duration of every stage run by this scheduler, slowest first """
+        header = 'Stage Timings:'
+        print(f'\n{header}')
+        for name, duration in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+            print(f'\t- {name:32s} {duration:8.2f}s')
+        print(f'\t  {"total (sequential)":32s} {sum(self.timings.values()):8.2f}s', end='\n\n')
+        return
+
+    # @@@@@@@@@@@@@@@@@@@ FINGERPRINTS AND STATE @@@@@@@@@@@@@@@@@@@
+
+    def _fingerprint(self, stage:PipelineStage, upstream:dict[str, str], profiles:tuple[str]|None=None) -> str:
+        """ Hashes everything that determines a stage's output, except the contents of its input tables,
+            which are represented by the fingerprints of the stages that write them
+        """
+        hasher = hashlib.sha1(stage.name.encode())
+        hasher.update(repr(sorted(stage.kwargs.items())).encode())
+
+        # a run limited to some profiles never matches a complete run
+        if profiles and stage.accepts_profiles:
+            hasher.update(repr(sorted(profiles)).encode())
+
+        for resource in stage.reads:
+            if resource.startswith(FILE_RESOURCE_PREFIX):
+                hasher.update(file_resource_signature(resource[len(FILE_RESOURCE_PREFIX):]).encode())
+
+        for dep in sorted(self.dependencies[stage.name]):
+            hasher.update(upstream.get(dep, dep).encode())
+
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _load_state() -> dict[str, dict]:
+        state_db = db_reg.get_instance(STATE_DATABASE)
+        if not state_db.has_table(STATE_TABLE):
+            logger.warning('%s has no %s table; every stage will run. Add it to the database config to track stage state.', STATE_DATABASE, STATE_TABLE)
+            return {}
+
+        state = state_db.get_data(['*'], STATE_TABLE)
+        return {row['stage']:row for row in state.to_dict(orient='records')}
+
+    @staticmethod
+    def _record_state(name:str, fingerprint:str, status:str, duration:float, checkpoint:str|None=None):
+        state_db = db_reg.get_instance(STATE_DATABASE)
+        if not state_db.has_table(STATE_TABLE):
+            return
+
+        row = {
+            'stage': name,
+            'fingerprint': fingerprint,
+            'status': status,
+            'last_run': get_current_time('PRIM_DATETIME'),
+            'duration': round(duration, 3),
+            'checkpoint': checkpoint
+        }
+        state_db.upsert_values(STATE_TABLE, pd.DataFrame([row]))
+        return
+
+
+def file_resource_signature(path:str) -> str:
+    """ Path, size and modification time of a file, or of every file below a directory """
+    if not os.path.exists(path):
+        return f'{path}:missing'
+
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    signature = []
+    for dirpath, _, filenames in sorted(os.walk(path)):
+        for fn in sorted(filenames):
+            fp = os.path.join(dirpath, fn)
+            stat = os.stat(fp)
+            signature.append(f'{fp}:{stat.st_size}:{stat.st_mtime_ns}')
+    return '|'.join(signature)
@@ -1,17 +1,24 @@
 
-from ... import (logging, os, pd, re, io, datetime, np, generate, Literal)
-from ...utils import read_yaml_data, get_current_time
+from ... import (logging, os, pd, re, io, datetime, np, Literal)
+from ...utils import get_current_time
 from ...config import (
-    DB_CONFIG_DIR, DEFAULT_PROCESSING_OUTPUT_DIR, ALL_DATETIME_FORMATS
+    DEFAULT_PROCESSING_OUTPUT_DIR, ALL_DATETIME_FORMATS, DEFAULT_PROFILE_ID
 )
 
 from .base import Database
+from .context import DataContext
 from .custom_types import ProccessingConfig
+from .config_snapshot import load_config_snapshot
 
-logger = logging.getLogger('standard')
+import hashlib
 
+logger = logging.getLogger('standard.processing')
 
-CONFIG_DATA:ProccessingConfig = read_yaml_data(DB_CONFIG_DIR / 'processing_config.yaml')[0]
+
+CONFIG_DATA:ProccessingConfig = load_config_snapshot().processing
+
+# nanoid's default alphabet; box ids are derived from the profile and original box id with it
+ID_ALPHABET = '_-0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
 
 class DataProcessor:
@@ -19,6 +26,9 @@ class DataProcessor:
     
         Attributes
         ----------
+            profile_id (str) : Profile the processed data belongs to. Stored with every row, and part of
+                               every generated id, so re-processing a profile reproduces its ids and never
+                               collides with other profiles.
 
             Helper Attrs:
                 id_map (dict[str, dict[str,str]]) : Maps the original box id to the generated box ids (for purchase and flavors).
@@ -36,7 +46,8 @@ class DataProcessor:
             run_pre_processing(csv_data_dir:str, md_data_dir:str)
     
     """
-    def __init__(self):
+    def __init__(self, profile_id:str=DEFAULT_PROFILE_ID):
+        self.profile_id = profile_id
         self.id_map:dict[str, dict[Literal['purchase id', 'flavor id'], str]] = {} # maps og_id to purchase and flavor ids
 
         # transient tracking attributes
@@ -148,7 +159,7 @@ class DataProcessor:
         for md_file in os.listdir(all_data):
             og_id = md_file.split(' ')[0] 
             props, table_data = self._read_markdown_data(os.path.join(all_data, md_file))
-            logger.debug(f'\nExtracted property data: {props}')
+            logger.debug('\nExtracted property data: %s', props)
 
             # extract/collect box data
             formatted_box_properties = self._box_header_format_converter(props)
@@ -165,7 +176,7 @@ class DataProcessor:
                 norm_can_df = self._normalize_can_df(table_data, 'md')
             else:
                 norm_can_df = table_data
-                logger.warning(f'No can data for {og_id}')
+                logger.warning('No can data for %s', og_id)
 
             can_data_dict[og_id] = norm_can_df
 
@@ -179,10 +190,11 @@ class DataProcessor:
         all_badf = []
         
         for base_og_id, df in box_data_df.groupby('base_og_id'):   
-            box_id = generate(size=7)     
+            box_id = self._derive_id('purchase', base_og_id)
             intermediate_ba_df = df[['purchase_date', 'price', 'location']].drop_duplicates() # TODO add column extraction to dedicated CONSTANT file
             intermediate_ba_df.insert(0, 'base_og_id', base_og_id)
             intermediate_ba_df.insert(0, 'id', box_id)
+            intermediate_ba_df.insert(len(intermediate_ba_df.columns), 'profile_id', self.profile_id)
             all_badf.append(intermediate_ba_df)
 
             
@@ -196,8 +208,9 @@ class DataProcessor:
 
         # get box id from ba df based on poi, inserted at beginning
         bf_df.insert(0, 'box_id', bf_df['base_og_id'].apply(lambda x:self._get_box_id(df= box_all_df, base_original_box_id=x)))
-        bf_df.insert(0, 'id', [generate(size=7) for _ in range(len(bf_df))])
+        bf_df.insert(0, 'id', [self._derive_id('flavor', og_id) for og_id in bf_df['og_id']])
         bf_df.insert(len(bf_df.columns), 'has_cans', False)
+        bf_df.insert(len(bf_df.columns), 'profile_id', self.profile_id)
 
         # create id map before dropping unnecessary cols for box flavor DF
         ids_to_delete = ['og_id', 'base_og_id']
@@ -207,7 +220,7 @@ class DataProcessor:
 
         self.box_flavors_df = self.resolve_dtypes(box_flavor_df)
 
-        logger.info(f'Successfully created and saved box dataframes')
+        logger.info('Successfully created and saved box dataframes')
         self.validate_ba_to_bf_difference() # NOTE still deciding if I want to call this here
 
         return
@@ -241,6 +254,7 @@ class DataProcessor:
             
             df.insert(0, 'box_id', flavor_id)
             df.insert(0, 'id', id_col)
+            df.insert(2, 'profile_id', self.profile_id)
             df = df.drop(columns=['Can'])
             final_df = self.resolve_dtypes(df)
             processed_data.append(final_df)
@@ -328,12 +342,17 @@ class DataProcessor:
         except Exception as e:
             print(f'ERROR GETTING BASE OGID: {full_og_id = }')
 
+    def _derive_id(self, *parts:str, size:int=7) -> str:
+        """ Generates an id from the profile id and the given parts (the same parts always give the same id) """
+        digest = hashlib.sha1(':'.join((self.profile_id, *parts)).encode()).digest()
+        return ''.join(ID_ALPHABET[byte % len(ID_ALPHABET)] for byte in digest[:size])
+
     def _get_box_id(self, df:pd.DataFrame, base_original_box_id: str) -> str | None:
         """Gets the generated box ID from the collection."""
         try:
             return df.loc[df['base_og_id'] == base_original_box_id, 'id'].values[0]
         except IndexError:
-            logger.error(f"{base_original_box_id} does not exist in the box_all collection")
+            logger.error("%s does not exist in the box_all collection", base_original_box_id)
             return None
 
 
@@ -417,7 +436,7 @@ class DataProcessor:
         all_collections:list[str] = [k for k in self.__dict__ if k.endswith('_df')]
         alias_map = dict(zip(aliases, all_collections))
 
-        logger.info(f'Created alias map for data collections from aliases in config file') # TODO add some kind of sanity check to ensure aliases map to the correct dataframe
+        logger.info('Created alias map for data collections from aliases in config file') # TODO add some kind of sanity check to ensure aliases map to the correct dataframe
 
         return alias_map
 
@@ -475,7 +494,7 @@ class DataProcessor:
             self._export(type=type, path=fp, final_df=self.__dict__[self.alias_map[collection]])
             self.metadata['Export']['Successful Exports'] += 1
 
-            logger.info(f"Exported {collection} data to {fp}")
+            logger.info("Exported %s data to %s", collection, fp)
 
         return
     
@@ -494,9 +513,9 @@ class DataProcessor:
                 if data:
                     valid_collections.append((alias, data))
                 else:
-                    logger.warning(f'Valid alias ({alias}) does not contain data')
+                    logger.warning('Valid alias (%s) does not contain data', alias)
             else:
-                logger.warning(f'Invalid alias: {alias}')
+                logger.warning('Invalid alias: %s', alias)
         return valid_collections
             
 
@@ -507,7 +526,10 @@ class DataProcessor:
         default_output_dirs = CONFIG_DATA['default_output_directory_names']
         assert all(collection_alias in default_output_dirs for collection_alias in self.alias_map.keys()), f'Invalid config setup -> collection alias values specified in data_aliases does not match the keys in default_output_directory_names. Collection aliases: {self.alias_map.keys()} | default output dirname keys: {default_output_dirs.keys()}'
 
+        # files of different profiles are told apart by a profile prefix
         def_filename = get_current_time('FILE_DATE')
+        if self.profile_id != DEFAULT_PROFILE_ID:
+            def_filename = f'{self.profile_id}_{def_filename}'
 
         export_package = {}
         for collection_alias, df_key in self.alias_map.items():
@@ -578,7 +600,14 @@ class DataProcessor:
         return
         
 
-    def db_export(self, database_object:Database, collection_aliases:tuple[str]=('*',), override:bool='False'):
+    def db_export(
+            self,
+            database_object:Database,
+            collection_aliases:tuple[str]=('*',),
+            override:bool='False',
+            *,
+            context:DataContext|None=None
+        ):
         """ Exports data collections to databases, unless specific collections are specified
 
             Args:
@@ -586,30 +615,39 @@ class DataProcessor:
                 collections (tuple[str]) : Specifies the collections to export, according to 
                                            the alias map. If none is provided, will export 
                                            all collections
+                context (DataContext) : Optionally export through a pipeline context, which keeps
+                                        the exported tables in memory for later stages
         
         """
-        queue = self.get_filtered_collections(collection_aliases)
-
-        db_table_alias_map:dict[str,str] = CONFIG_DATA['default_output_directory_names']
-
-
         if_exists = 'replace' if override else 'append'
 
         conn, _ = database_object.create_connection()
 
-        for alias, df in queue:
-            table_name = db_table_alias_map[alias]
-            table_headers = database_object.tables[table_name]['header']
-            # drop columns that aren't in the database table 
-            df = df.drop(columns=[col for col in df.columns if col not in table_headers])
-            
-            df.to_sql(name=table_name, con=conn, if_exists=if_exists, index=False)
+        for table_name, df in self.get_table_frames(database_object, collection_aliases).items():
+            if context:
+                context.sink(database_object.database_name, table_name, df, if_exists=if_exists)
+            else:
+                df.to_sql(name=table_name, con=conn, if_exists=if_exists, index=False)
 
-            logger.info(f'Added {alias} data to database')
+            logger.info('Added %s data to database', table_name)
         
         database_object.close_commit(conn)
         return
 
+    def get_table_frames(self, database_object:Database, collection_aliases:tuple[str]=('*',)) -> dict[str, pd.DataFrame]:
+        """ Maps the table name of each collection (see get_filtered_collections) to its data, without any
+            columns the table doesn't have
+        """
+        db_table_alias_map:dict[str,str] = CONFIG_DATA['default_output_directory_names']
+
+        frames = {}
+        for alias, df in self.get_filtered_collections(collection_aliases):
+            table_name = db_table_alias_map[alias]
+            table_headers = database_object.tables[table_name]['header']
+            # drop columns that aren't in the database table 
+            frames[table_name] = df.drop(columns=[col for col in df.columns if col not in table_headers])
+        return frames
+
 
 
 
@@ -642,6 +680,7 @@ class DataProcessor:
         
         print(
             f'\n{header:10s}',
+            f'Profile: {self.profile_id} | ',
             f'Total Processed Purchases: {len(self.box_purchases_df)} | ',
             f'Total Processed Flavors: {len(self.box_flavors_df)} | ',
             f'Total Processed Cans: {len(self.can_data_df)}', end='\n\n'
@@ -0,0 +1,173 @@
+from ... import logging, os
+from ...utils import get_current_time
+
+import cProfile
+import pstats
+import time
+import tracemalloc
+from typing import Callable
+
+
+logger = logging.getLogger('standard.pipeline')
+
+# key of a pstats entry: (file name, line number, function name)
+FunctionKey = tuple[str, int, str]
+
+# call paths cheaper than this are dropped from collapsed stacks (keeps the path walk bounded)
+MIN_FRAME_SECONDS = 1e-5
+
+
+class StageProfiler:
+    """ Profiles pipeline stages one at a time, writing a pstats dump per stage
+
+        After the run, ```write_reports``` writes a collapsed-stack file (one ```frame;frame;... <microseconds>```
+        line per call path, readable by flamegraph.pl/speedscope/inferno) and a summary of the slowest
+        functions by cumulative time. cProfile and tracemalloc are process-wide, so the scheduler runs
+        stages serially while a profiler is attached.
+
+        Args:
+            output_dir (str) : Directory receiving the ```<stage>.prof``` dumps and reports
+            trace_memory (bool) : If true, also records the peak traced memory of each stage and
+                                  its largest allocation sites. Default is False.
+            top (int) : Number of functions listed in the summary. Default is 25.
+
+    """
+    def __init__(self, output_dir:str, *, trace_memory:bool=False, top:int=25):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.top = top
+
+        self.stats:dict[str, pstats.Stats] = {}
+        self.memory:dict[str, dict] = {}
+        self.wall_times:dict[str, float] = {}
+
+    def __repr__(self):
+        return f'StageProfiler({self.output_dir})'
+
+    def profile(self, name:str, func:Callable, **kwargs):
+        """ Runs func(**kwargs) under cProfile (and tracemalloc), dumping its stats to ```<name>.prof``` """
+        profiler = cProfile.Profile()
+
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(func, **kwargs)
+        finally:
+            self.wall_times[name] = time.perf_counter() - start
+
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                top_sites = tracemalloc.take_snapshot().statistics('lineno')[:5]
+                tracemalloc.stop()
+                self.memory[name] = {
+                    'peak_mb': peak / 1024**2,
+                    'sites': [(str(stat.traceback), stat.size / 1024**2) for stat in top_sites]
+                }
+
+            profiler.create_stats()
+            profiler.dump_stats(os.path.join(self.output_dir, f'{name}.prof'))
+            self.stats[name] = pstats.Stats(profiler)
+
+    # @@@@@@@@@@@@@@@@@@@ REPORTS @@@@@@@@@@@@@@@@@@@
+
+    def write_reports(self) -> dict[str, str]:
+        """ Writes the collapsed-stack and summary files for every profiled stage
+
+            Returns:
+                Map of report name to file path
+
+        """
+        if not self.stats:
+            logger.warning('No stages were profiled; nothing to report')
+            return {}
+
+        collapsed_path = os.path.join(self.output_dir, 'stacks.collapsed')
+        with open(collapsed_path, 'w') as file:
+            for name, stats in self.stats.items():
+                for stack, micros in collapse_stacks(stats).items():
+                    file.write(f'{name};{stack} {micros}\n')
+
+        summary_path = os.path.join(self.output_dir, 'summary.txt')
+        summary = self.summary()
+        with open(summary_path, 'w') as file:
+            file.write(summary)
+
+        print(summary)
+        logger.info('Wrote profiling reports to %s', self.output_dir)
+        return {'collapsed': collapsed_path, 'summary': summary_path}
+
+    def summary(self) -> str:
+        """ Stage wall times (and memory peaks) followed by the top functions of all stages by cumulative time """
+        lines = [f'Profile Summary ({get_current_time("PRIM_DATETIME")})', '']
+
+        lines.append(f'{"stage":<32}{"wall (s)":>10}' + (f'{"peak (MB)":>12}' if self.trace_memory else ''))
+        for name, seconds in sorted(self.wall_times.items(), key=lambda item: item[1], reverse=True):
+            peak = f'{self.memory[name]["peak_mb"]:>12.1f}' if name in self.memory else ''
+            lines.append(f'{name:<32}{seconds:>10.2f}{peak}')
+
+        rows = []
+        for name, stats in self.stats.items():
+            for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+                rows.append((cumtime, tottime, ncalls, name, format_function(func)))
+        rows.sort(reverse=True)
+
+        lines += ['', f'Top {self.top} functions by cumulative time', f'{"cumtime":>10}{"tottime":>10}{"ncalls":>10}  {"stage":<32}function']
+        for cumtime, tottime, ncalls, name, func in rows[:self.top]:
+            lines.append(f'{cumtime:>10.3f}{tottime:>10.3f}{ncalls:>10}  {name:<32}{func}')
+
+        for name, memory in self.memory.items():
+            lines += ['', f'Largest allocation sites still held at the end of {name}']
+            lines += [f'{size:>10.2f} MB  {site}' for site, size in memory['sites']]
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_function(func:FunctionKey) -> str:
+    """ Readable ```module:line(function)``` name of a pstats function key """
+    file_name, line, func_name = func
+    if file_name == '~':
+        return func_name # builtins
+    return f'{os.path.basename(file_name)}:{line}({func_name})'
+
+
+def collapse_stacks(stats:pstats.Stats) -> dict[str, int]:
+    """ Rebuilds call paths from a pstats caller graph as collapsed stacks
+
+        cProfile only records caller -> callee edges, so the time of a function reached along several
+        paths is split between them in proportion to the time spent on each edge.
+
+        Returns:
+            Map of ```frame;frame;...``` to self time in microseconds
+
+    """
+    callees:dict[FunctionKey, dict[FunctionKey, float]] = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, edge_cumtime) in callers.items():
+            callees.setdefault(caller, {})[func] = edge_cumtime
+
+    roots = [func for func, (*_, callers) in stats.stats.items() if not callers]
+    collapsed:dict[str, int] = {}
+
+    def walk(func:FunctionKey, cumtime:float, path:tuple[FunctionKey], names:str):
+        if cumtime < MIN_FRAME_SECONDS:
+            return
+
+        _, _, tottime, total_cumtime, _ = stats.stats[func]
+        scale = cumtime / total_cumtime if total_cumtime else 0
+
+        micros = int(tottime * scale * 1e6)
+        if micros:
+            collapsed[names] = collapsed.get(names, 0) + micros
+
+        for callee, edge_cumtime in callees.get(func, {}).items():
+            if callee in path: # recursion is already accounted for in the caller's frame
+                continue
+            walk(callee, edge_cumtime * scale, path + (callee,), f'{names};{format_function(callee)}')
+
+    for root in roots:
+        walk(root, stats.stats[root][3], (root,), format_function(root))
+
+    return collapsed
@@ -1,63 +1,11 @@
 
-from ...utils import PickleHandler
-from ...config import SAVED_TABLE_DATA_DIR, DB_DIR
+from ...config import CONFIG_SNAPSHOT_DIR, DB_DIR
 
-from .base import Database, logging, os, Literal
-from .custom_types import TableData
+from .base import Database, logging, os
+from .config_snapshot import load_config_snapshot
 
 
-logger = logging.getLogger('standard')
-pickler = PickleHandler()
-
-
-def _check_for_saved_table_data(output_dir_path:str, decision_behavior:Literal['recent', 'choose']='recent') -> None|str:
-    """ Checks for any pickled table data from previous extractions in the provided directory.
-    
-        Args:
-            output_dir_path (str) : Path to the directory being search for saved table data
-            decision_behavior (str) : Determines handling of multiple detected saves. Default is most recent.
-                - *recent*: Choose the most recently created save
-                - *choose*: Allows the user to manually choose the save to use
-
-        Returns:
-            A path to the saved data, if found
-    
-    """
-
-    assert os.path.isdir(output_dir_path), f'Must supply a path to a directory, not: {output_dir_path}'
-
-    found_saves = [fn for fn in os.listdir(output_dir_path) if fn.endswith('_table_data.pkl')]
-    total_saves = len(found_saves)
-
-    if total_saves == 0:
-        logger.warning(f'No pickle saves identified in the provided directory: {output_dir_path}')
-        return None
-
-    elif total_saves == 1:
-        logger.info(f'Loading save from {found_saves[0]}')
-        fp = os.path.join(output_dir_path, found_saves[0])
-        return fp
-    
-    logger.info(f'Multiple saves detected: {found_saves}')
-    
-    if decision_behavior == 'recent':
-        fps = [os.path.join(output_dir_path, fn) for fn in found_saves]
-        mrf = max(fps, key=os.path.getctime)
-        logger.info(f'Loading most recent save from {mrf}')
-        return mrf 
-
-    # assumes behavior to be manual user decision 
-    print(f'Multiple saves detected. Choose from one below:')
-    
-    for idx, save in enumerate(found_saves, start=1):
-        print(f'- ({idx}) {save}')
-    
-    option = input('Option: > ')
-    assert option in found_saves, f'Invalid option: {option}. Must choose from below:'
-
-    fp = os.path.join(output_dir_path, found_saves[found_saves.index(option)])
-    return fp
-
+logger = logging.getLogger('standard.database')
 
 
 class DatabaseRegistry:
@@ -65,6 +13,7 @@ class DatabaseRegistry:
     
         Args:
             base_database_dir (str) : Override the default base database directory 
+            config_snapshot_directory (str) : Override the directory holding the compiled config snapshots
             search_for_existing (bool) : If true, will search the base database directory 
                                          for existing databases to register
     
@@ -72,15 +21,15 @@ class DatabaseRegistry:
     """
     _instances:dict[str,Database] = {}
     _database_home_directory:str = str(DB_DIR)
-    _saved_table_data_directory:str = str(SAVED_TABLE_DATA_DIR)
+    _config_snapshot_directory:str = str(CONFIG_SNAPSHOT_DIR)
 
 
-    def __init__(self, *, base_database_directory:str|None=None, saved_table_data_directory:str|None=None, search_for_existing:bool=False):
+    def __init__(self, *, base_database_directory:str|None=None, config_snapshot_directory:str|None=None, search_for_existing:bool=False):
         if isinstance(base_database_directory, str):
             self._assign_database_home_directory(base_database_directory)
 
-        if isinstance(saved_table_data_directory, str):
-            self._assign_table_save_directory(saved_table_data_directory)
+        if isinstance(config_snapshot_directory, str):
+            self._assign_config_snapshot_directory(config_snapshot_directory)
 
         if search_for_existing:
             self.search_and_register_dbs()
@@ -94,9 +43,9 @@ class DatabaseRegistry:
         return
     
     @classmethod
-    def _assign_table_save_directory(cls, path:str):
+    def _assign_config_snapshot_directory(cls, path:str):
         assert os.path.isdir(path), f'Expected a path to a directory, not: {path}'
-        cls._saved_table_data_directory = path
+        cls._config_snapshot_directory = path
         return
 
 
@@ -104,13 +53,9 @@ class DatabaseRegistry:
     def search_and_register_dbs(cls):
         """ Searches directory for .db files and registers them if not already. 
             
-            Of note, databases registered in this way will not have any table_data 
-            registered unless it is adding manually later.
-
-            Args:
-                db_dir (str) : Path to a directory potentially containing databases
-                saved_table_data_dir (str) : Path to a directory potentially containing 
-                                             previously saved table data
+            Table data of each database is assigned from the compiled config snapshot (see
+            config_snapshot.py), which is only recompiled when the config files changed. Existing
+            database files are migrated to the configured tables (see Database.migrate_tables).
         
         """
         db_dir = cls._database_home_directory
@@ -118,27 +63,25 @@ class DatabaseRegistry:
         valid_files = [i for i in os.listdir(db_dir) if i.endswith('.db')]
         
         if len(valid_files) == 0:
-            logger.warning(f'No databases found in this directory: {db_dir}')
+            logger.warning('No databases found in this directory: %s', db_dir)
             return
         
-        logger.info(f'Identified {len(valid_files)} databases to register in {db_dir}')
+        logger.info('Identified %s databases to register in %s', len(valid_files), db_dir)
 
-        # check for previous saves to apply semi automatically
-        save_path = _check_for_saved_table_data(cls._saved_table_data_directory)
+        snapshot = load_config_snapshot(snapshot_dir=cls._config_snapshot_directory)
 
         # iterate through valid database files and create a new object
-        # automatically unpacks and assigns table data from a previous save if available
+        # automatically assigns table data from the config snapshot if the database is configured
         for db in valid_files:
             dbn = db[:-3]
             new_db = Database(database_name=dbn)
+            new_db.db_loc = os.path.join(db_dir, db)
             
-            if save_path:
-                td:dict[str, TableData] = pickler.load_pickle(save_path)
-
-                if dbn in td:                
-                    new_db.add_table_data(td[dbn], if_exist='ignore')
-                else:
-                    logger.warning(f'This database ({dbn}) does not have previously saved table data in the current save: {save_path} ')
+            if dbn in snapshot.databases:
+                new_db.add_table_data(snapshot.databases[dbn], if_exist='ignore')
+                new_db.migrate_tables()
+            else:
+                logger.warning('This database (%s) is not in the config snapshot %s', dbn, snapshot.source_hash)
 
         
             cls.add_instance(new_db)
@@ -153,10 +96,10 @@ class DatabaseRegistry:
 
         if dbi.database_name not in cls._instances:
             cls._instances[dbi.database_name] = dbi
-            logger.info(f'Added new database ({dbi.database_name}) to global registry')
+            logger.info('Added new database (%s) to global registry', dbi.database_name)
             return
         
-        logger.warning(f'Database ({dbi.database_name}) instance already exists in the global registry')
+        logger.warning('Database (%s) instance already exists in the global registry', dbi.database_name)
 
         return
     
@@ -195,10 +138,10 @@ class DatabaseRegistry:
         """ Updates existing instance with new instance at the database name, or adds new instance to registry """
         if dbi.database_name in cls._instances:
             cls._instances[dbi.database_name] = dbi
-            logger.info(f'Updated database {dbi.database_name} instance in the global registry')
+            logger.info('Updated database %s instance in the global registry', dbi.database_name)
         else:
             cls._instances[dbi.database_name] = dbi
-            logger.info(f'Database Name ({dbi.database_name}) was not found in the global registry, but was added')
+            logger.info('Database Name (%s) was not found in the global registry, but was added', dbi.database_name)
         return
     
     @classmethod
@@ -206,7 +149,7 @@ class DatabaseRegistry:
         """ Removes a database instance from the global registry by database name """
         assert db_name in cls._instances, f'Database Name ({db_name}) doesnt exist in the registry'
         cls._instances.pop(db_name)
-        logger.info(f'Removed database {db_name} from the global registry')
+        logger.info('Removed database %s from the global registry', db_name)
         return
     
     @classmethod
@@ -242,7 +185,7 @@ class DatabaseRegistry:
         queue = cls.drop_db_tables(database_names=database_names)
         for dbn, _ in queue:
             cls._instances.pop(dbn)
-            logger.info(f'Removed database ({dbn}) from the registry')
+            logger.info('Removed database (%s) from the registry', dbn)
 
         return
 
@@ -0,0 +1,157 @@
+from ... import np
+
+
+# default t-digest compression; higher is more accurate but keeps more centroids
+DEFAULT_COMPRESSION = 100
+
+
+class TDigest:
+    """ Mergeable quantile sketch (merging t-digest) for streaming distribution summaries
+
+        Values are kept as weighted centroids whose size is bounded by the k1 scale function, so the
+        tails of the distribution keep more resolution than the middle. Two digests built from
+        different data can be merged into a digest of the combined data, which allows incremental
+        updates from serialized state.
+
+        Args:
+            compression (float) : Bounds the number of centroids kept (roughly 2 x compression at most)
+
+    """
+    def __init__(self, compression:float=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __repr__(self):
+        return f'TDigest(count={self.count:g}, centroids={len(self.means)})'
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    # @@@@@@@@@@@@@@@@@@@ UPDATING @@@@@@@@@@@@@@@@@@@
+
+    def update(self, values) -> 'TDigest':
+        """ Adds values (any array-like); non-finite values are ignored """
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+
+        if len(values) == 0:
+            return self
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other:'TDigest') -> 'TDigest':
+        """ Merges another digest into this one """
+        if other.count == 0:
+            return self
+
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means:np.ndarray, weights:np.ndarray):
+        """ Greedily merges sorted centroids while each centroid stays within one unit of the scale function """
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        new_means, new_weights = [], []
+        cur_mean, cur_weight = means[0], weights[0]
+        q_left = 0.0
+        q_limit = self._q_limit(q_left)
+
+        for mean, weight in zip(means[1:], weights[1:]):
+            if q_left + (cur_weight + weight) / total <= q_limit:
+                cur_mean += (mean - cur_mean) * weight / (cur_weight + weight)
+                cur_weight += weight
+            else:
+                new_means.append(cur_mean)
+                new_weights.append(cur_weight)
+                q_left += cur_weight / total
+                q_limit = self._q_limit(q_left)
+                cur_mean, cur_weight = mean, weight
+
+        new_means.append(cur_mean)
+        new_weights.append(cur_weight)
+
+        self.means = np.array(new_means)
+        self.weights = np.array(new_weights)
+        return
+
+    def _q_limit(self, q_left:float) -> float:
+        """ Largest quantile a centroid starting at q_left may reach (k1 scale function) """
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (np.sin(2 * np.pi * k / self.compression) + 1) / 2
+
+    # @@@@@@@@@@@@@@@@@@@ QUERYING @@@@@@@@@@@@@@@@@@@
+
+    def _interpolation_points(self) -> tuple[np.ndarray, np.ndarray]:
+        """ Cumulative weight at each centroid center, bracketed by the observed min and max """
+        centers = np.cumsum(self.weights) - self.weights / 2
+        ranks = np.concatenate([[0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return ranks, values
+
+    def quantile(self, q):
+        """ Estimated value at quantile(s) q (0 to 1) """
+        assert self.count > 0, 'Cannot estimate quantiles of an empty digest'
+        ranks, values = self._interpolation_points()
+        return np.interp(np.asarray(q, dtype=float) * self.count, ranks, values)
+
+    def cdf(self, x):
+        """ Estimated fraction of values at or below x """
+        assert self.count > 0, 'Cannot estimate the cdf of an empty digest'
+        ranks, values = self._interpolation_points()
+
+        # centroids sharing a mean (i.e. many values at exactly 0) collapse onto their highest rank
+        unique_values, last_idx = np.unique(values[::-1], return_index=True)
+        unique_ranks = ranks[::-1][last_idx]
+        return np.interp(x, unique_values, unique_ranks) / self.count
+
+    def histogram(self, bins:int|list[float]=10) -> tuple[np.ndarray, np.ndarray]:
+        """ Estimated counts per bin
+
+            Args:
+                bins (int|list[float]) : Number of equal width bins between min and max, or the bin edges
+
+            Returns:
+                A tuple of counts and bin edges, in that order (like np.histogram)
+
+        """
+        edges = np.linspace(self.min, self.max, bins + 1) if isinstance(bins, int) else np.asarray(bins, dtype=float)
+
+        # the first bin is closed on the left, so it includes any values at the lowest edge
+        cumulative = self.cdf(edges)
+        if edges[0] <= self.min:
+            cumulative[0] = 0
+
+        counts = np.diff(cumulative) * self.count
+        return counts, edges
+
+    # @@@@@@@@@@@@@@@@@@@ SERIALIZATION @@@@@@@@@@@@@@@@@@@
+
+    def to_bytes(self) -> bytes:
+        """ Serializes as float64s: compression, min, max, centroid means, centroid weights """
+        header = np.array([self.compression, self.min, self.max])
+        return np.concatenate([header, self.means, self.weights]).astype('<f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data:bytes) -> 'TDigest':
+        values = np.frombuffer(data, dtype='<f8')
+        digest = cls(compression=values[0])
+        digest.min, digest.max = values[1], values[2]
+
+        centroids = values[3:]
+        half = len(centroids) // 2
+        digest.means = centroids[:half].copy()
+        digest.weights = centroids[half:].copy()
+        return digest
@@ -0,0 +1,100 @@
+from . import logging
+
+import atexit
+import copy
+import multiprocessing
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+# all functions pertaining to non-blocking (queue based) logging
+#
+# The handlers of a logger are moved behind a queue, so a log call only puts the record on the
+# queue while a background thread (QueueListener) formats it and does the file/console I/O.
+# Worker processes (see partitions.map_partitions) send their records to the parent's handlers
+# through a multiprocessing queue.
+
+# worker processes are spawned rather than forked (forking while other threads hold locks can deadlock
+# the child), and their queues must come from the same context
+WORKER_CONTEXT = multiprocessing.get_context('spawn')
+
+_listeners:dict[str, QueueListener] = {}
+_worker_queues:dict[str, multiprocessing.Queue] = {}
+
+
+class LazyQueueHandler(QueueHandler):
+    """ QueueHandler that leaves formatting to the listener thread
+
+        QueueHandler.prepare merges the arguments into the message (and copies the record) in the
+        logging thread. Here only tracebacks are rendered up front (their frames change once the
+        exception is handled), so %-style arguments are formatted on the background thread, and only
+        if a handler accepts the record. Logged arguments must therefore not be mutated after the call.
+
+        Records are only copied when they carry a traceback, since this is the only handler of its logger.
+    """
+    _traceback_formatter = logging.Formatter()
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record = copy.copy(record)
+            record.exc_text = record.exc_text or self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def start_queue_logging(logger_name:str) -> QueueListener:
+    """ Moves a logger's handlers onto a background thread (once per logger)
+
+        Args:
+            logger_name (str) : Name of a logger configured with its handlers (see config.LOGGING_CONFIG)
+
+        Returns:
+            The started listener, which is stopped (flushing every queued record) at exit
+
+    """
+    if logger_name in _listeners:
+        return _listeners[logger_name]
+
+    logger = logging.getLogger(logger_name)
+    handlers = list(logger.handlers)
+    log_queue = queue.SimpleQueue()
+
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(LazyQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    _listeners[logger_name] = listener
+    return listener
+
+
+def worker_log_queue(logger_name:str='standard') -> multiprocessing.Queue:
+    """ Queue through which worker processes log to this process's handlers of a logger (see init_worker_logging) """
+    if logger_name in _worker_queues:
+        return _worker_queues[logger_name]
+
+    # the logger's current handlers; with queue logging, the worker records join its queue
+    log_queue = WORKER_CONTEXT.Queue()
+    listener = QueueListener(log_queue, *logging.getLogger(logger_name).handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    _worker_queues[logger_name] = log_queue
+    return log_queue
+
+
+def init_worker_logging(log_queue:multiprocessing.Queue, logger_name:str='standard'):
+    """ Process pool initializer replacing a worker's handlers of a logger with log_queue
+
+        Handlers copied into forked workers would write to the parent's files (or to a queue no
+        thread reads), and handlers of spawned workers would re-open them. Records are formatted in
+        the worker, since they have to be pickled.
+    """
+    logger = logging.getLogger(logger_name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+    return
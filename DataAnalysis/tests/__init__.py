@@ -0,0 +1,5 @@
+# Tests of the pipeline's scheduling, partitioning and incremental analyses, run from the repository root with
+#
+#     python -m unittest discover -s DataAnalysis/tests -t .
+#
+# Databases are created in temporary directories (see databases.py); the ones in DataAnalysis/databases are never touched.
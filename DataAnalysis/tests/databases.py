@@ -0,0 +1,46 @@
+from .. import os, pd
+from ..database.utils.base import Database
+from ..database.utils.registry import DatabaseRegistry
+from ..database.utils.config_snapshot import DB_TABLE_CONFIG_FILE, PROCESSING_CONFIG_FILE, compile_config_snapshot
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+# all functions pertaining to temporary databases for tests
+
+def register_temporary_databases(test_case:unittest.TestCase, *db_names:str) -> dict[str, Database]:
+    """ Registers empty databases (with their configured tables) from a temporary directory for one test
+
+        The registry's instances are restored and the directory removed when the test ends.
+
+        Returns:
+            The registered databases by name
+
+    """
+    db_dir = tempfile.mkdtemp(prefix='da-test-')
+    test_case.addCleanup(shutil.rmtree, db_dir, ignore_errors=True)
+
+    snapshot = compile_config_snapshot(str(DB_TABLE_CONFIG_FILE), str(PROCESSING_CONFIG_FILE))
+    databases = {}
+    for db_name in db_names:
+        database = Database(db_name, table_data=snapshot.databases[db_name])
+        database.db_loc = os.path.join(db_dir, f'{db_name}.db')
+        database.create_tables()
+        databases[db_name] = database
+
+    patcher = mock.patch.dict(DatabaseRegistry._instances, databases)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return databases
+
+
+def replace_rows(database:Database, table:str, data:pd.DataFrame):
+    """ Replaces every row of a table """
+    conn, curs = database.create_connection()
+    curs.execute(f'DELETE FROM {table}')
+    data.to_sql(table, conn, if_exists='append', index=False)
+    database.close_commit(conn)
+    return
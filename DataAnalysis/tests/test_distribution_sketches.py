@@ -0,0 +1,45 @@
+from .. import np, pd
+from ..database.tools.dynamic_analysis import get_distribution_summary, update_distribution_sketches
+from .databases import register_temporary_databases, replace_rows
+
+import unittest
+
+
+PURCHASES = pd.DataFrame({'id': ['A1', 'B1'], 'location': ['TGT', 'WMT']})
+FLAVORS = pd.DataFrame({'id': ['A1.PSF', 'B1.LM'], 'box_id': ['A1', 'B1'], 'flavor': ['PSF', 'LM']})
+CANS = pd.DataFrame({'id': ['1.CD', '2.CD', '3.CD'], 'box_id': ['A1.PSF', 'A1.PSF', 'B1.LM']})
+
+
+class DistributionSketchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.databases = register_temporary_databases(self, 'raw_data', 'static_analyses', 'dynamic_analyses')
+        replace_rows(self.databases['raw_data'], 'box_purchases', PURCHASES)
+        replace_rows(self.databases['raw_data'], 'box_flavors', FLAVORS)
+        replace_rows(self.databases['raw_data'], 'can_data', CANS)
+
+    def analyse(self, pmr:list, pvr:list):
+        analyses = pd.DataFrame({'can_id': CANS['id'], 'percentage_mass_remaining': pmr, 'percentage_volume_remaining': pvr})
+        replace_rows(self.databases['static_analyses'], 'can_analysis', analyses)
+        update_distribution_sketches()
+
+    def count(self, metric:str, scope:str='flavor', key:str|None=None) -> int:
+        summary = get_distribution_summary(metric, scope, key)
+        return summary['count'] if summary else 0
+
+    def test_cans_are_merged_once(self):
+        self.analyse([0.1, 0.2, 0.3], [0.1, 0.2, 0.3])
+        self.analyse([0.1, 0.2, 0.3], [0.1, 0.2, 0.3])
+
+        self.assertEqual(self.count('pmr'), 3)
+        self.assertEqual(self.count('pmr', 'flavor', 'PSF'), 2)
+        self.assertEqual(self.count('pvr', 'location', 'WMT'), 1)
+
+    def test_cans_analysed_later_are_merged(self):
+        # the second can has no PMR yet, and the third has neither metric
+        self.analyse([0.1, np.nan, np.nan], [0.1, 0.2, np.nan])
+        self.assertEqual((self.count('pmr'), self.count('pvr')), (1, 2))
+
+        self.analyse([0.1, 0.5, 0.3], [0.1, 0.2, 0.3])
+        self.assertEqual((self.count('pmr'), self.count('pvr')), (3, 3))
+        self.assertEqual(self.count('pmr', 'flavor', 'PSF'), 2)
@@ -0,0 +1,30 @@
+from ..database.utils.ledger import ProcessedLedger
+from .databases import register_temporary_databases
+
+import sqlite3 as sl
+import unittest
+
+
+class ProcessedLedgerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.database = register_temporary_databases(self, 'dynamic_analyses')['dynamic_analyses']
+
+    def test_recorded_items_are_filtered_per_consumer(self):
+        ledger = ProcessedLedger(self.database, 'rollup_cube.purchases')
+        ledger.record(['1.PSF', '2.LM'])
+        ledger.record(['2.LM'])
+
+        self.assertEqual(ledger.filter_unprocessed(['3.KL', '2.LM', '1.PSF', '4.PSF']), ['3.KL', '4.PSF'])
+        self.assertEqual(ProcessedLedger(self.database, 'rollup_cube.consumption').filter_unprocessed(['1.PSF']), ['1.PSF'])
+
+        ledger.reset()
+        self.assertEqual(ledger.filter_unprocessed(['1.PSF']), ['1.PSF'])
+
+    def test_missing_table_raises(self):
+        conn, curs = self.database.create_connection()
+        curs.execute('DROP TABLE processed_items')
+        self.database.close_commit(conn)
+
+        with self.assertRaisesRegex(sl.OperationalError, 'processed_items'):
+            ProcessedLedger(self.database, 'rollup_cube.purchases')
@@ -0,0 +1,105 @@
+from .. import pd
+from ..config import DEFAULT_PROFILE_ID
+from ..database.utils.partitions import PartitionState, frame_fingerprint, partition_values, split_partitions
+from .databases import register_temporary_databases
+
+import unittest
+
+
+BOXES = pd.DataFrame({
+    'id': ['1.PSF', '2.LM', '3.KL', '4.PSF'],
+    'price': [5.99, 6.49, None, 5.99],
+    'profile_id': ['alice', 'bob', None, 'alice'],
+})
+
+
+class FrameFingerprintTests(unittest.TestCase):
+
+    def test_column_order_is_ignored(self):
+        self.assertEqual(frame_fingerprint(BOXES), frame_fingerprint(BOXES[['profile_id', 'price', 'id']]))
+
+    def test_contents_change_the_fingerprint(self):
+        changed = BOXES.copy()
+        changed.loc[1, 'price'] = 6.5
+        self.assertNotEqual(frame_fingerprint(BOXES), frame_fingerprint(changed))
+        self.assertNotEqual(frame_fingerprint(BOXES), frame_fingerprint(BOXES.iloc[:3]))
+        self.assertNotEqual(frame_fingerprint(BOXES), frame_fingerprint(BOXES.rename(columns={'price': 'cost'})))
+
+    def test_row_order_changes_the_fingerprint(self):
+        self.assertNotEqual(frame_fingerprint(BOXES), frame_fingerprint(BOXES.iloc[::-1]))
+
+    def test_index_is_ignored(self):
+        self.assertEqual(frame_fingerprint(BOXES), frame_fingerprint(BOXES.set_axis([10, 11, 12, 13])))
+
+    def test_every_frame_is_hashed(self):
+        self.assertNotEqual(frame_fingerprint(BOXES, BOXES.iloc[:1]), frame_fingerprint(BOXES, BOXES.iloc[:2]))
+        self.assertNotEqual(frame_fingerprint(BOXES.iloc[:2], BOXES.iloc[2:]), frame_fingerprint(BOXES))
+
+
+class SplitPartitionTests(unittest.TestCase):
+
+    def test_rows_without_a_profile_belong_to_the_default_profile(self):
+        self.assertEqual(partition_values(BOXES), sorted(['alice', 'bob', DEFAULT_PROFILE_ID]))
+        partitions = split_partitions(BOXES, ['alice', DEFAULT_PROFILE_ID])
+        self.assertEqual(list(partitions['alice']['id']), ['1.PSF', '4.PSF'])
+        self.assertEqual(list(partitions[DEFAULT_PROFILE_ID]['id']), ['3.KL'])
+
+    def test_missing_profiles_get_empty_frames(self):
+        partitions = split_partitions(BOXES, ['carol'])
+        self.assertTrue(partitions['carol'].empty)
+        self.assertEqual(list(partitions['carol'].columns), list(BOXES.columns))
+
+    def test_frames_without_profiles_belong_to_the_default_profile(self):
+        frame = BOXES.drop(columns='profile_id')
+        self.assertEqual(partition_values(frame), [])
+        self.assertEqual(len(split_partitions(frame, [DEFAULT_PROFILE_ID])[DEFAULT_PROFILE_ID]), len(frame))
+
+    def test_partition_fingerprints_only_change_with_their_rows(self):
+        before = {profile:frame_fingerprint(rows) for profile, rows in split_partitions(BOXES, ['alice', 'bob']).items()}
+        changed = BOXES.copy()
+        changed.loc[1, 'price'] = 7.0
+        after = {profile:frame_fingerprint(rows) for profile, rows in split_partitions(changed, ['alice', 'bob']).items()}
+
+        self.assertEqual(before['alice'], after['alice'])
+        self.assertNotEqual(before['bob'], after['bob'])
+
+
+class PartitionStateTests(unittest.TestCase):
+
+    def setUp(self):
+        self.master = register_temporary_databases(self, 'master')['master']
+
+    def test_only_changed_profiles_are_returned(self):
+        state = PartitionState('update_box_analysis')
+        self.assertEqual(state.changed({'alice': 'a1', 'bob': 'b1'}), ['alice', 'bob'])
+
+        state.record({'alice': 'a1', 'bob': 'b1'})
+        self.assertEqual(state.changed({'alice': 'a1', 'bob': 'b2', 'carol': 'c1'}), ['bob', 'carol'])
+        self.assertEqual(state.recorded(), {'alice': 'a1', 'bob': 'b1'})
+
+        state.record({'bob': 'b2'})
+        self.assertEqual(state.changed({'alice': 'a1', 'bob': 'b2'}), [])
+
+    def test_stages_are_tracked_separately(self):
+        PartitionState('update_box_analysis').record({'alice': 'a1'})
+        self.assertEqual(PartitionState('update_profile_summaries').changed({'alice': 'a1'}), ['alice'])
+
+    def test_removed_profiles_are_stale_until_forgotten(self):
+        state = PartitionState('update_box_analysis')
+        state.record({'alice': 'a1', 'bob': 'b1', 'carol': 'c1'})
+        self.assertEqual(state.stale(['alice']), ['bob', 'carol'])
+
+        state.forget(['bob', 'carol'])
+        self.assertEqual(state.stale(['alice']), [])
+        self.assertEqual(state.changed({'bob': 'b1'}), ['bob'])
+
+    def test_every_profile_is_processed_without_the_state_table(self):
+        conn, curs = self.master.create_connection()
+        curs.execute('DROP TABLE partition_state')
+        self.master.close_commit(conn)
+
+        state = PartitionState('update_box_analysis')
+        state.record({'alice': 'a1'})
+        state.forget(['alice'])
+        self.assertEqual(state.changed({'alice': 'a1', 'bob': 'b1'}), ['alice', 'bob'])
+        self.assertEqual(state.recorded(), {})
@@ -0,0 +1,141 @@
+from ..database.utils import pipeline
+from ..database.utils.pipeline import PipelineScheduler, PipelineStage
+from .databases import register_temporary_databases
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+
+class StageRecorder:
+    """ Stage functions recording the order in which stages start and finish """
+    def __init__(self):
+        self.events:list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def func(self, name:str, *, duration:float=0.02, error:Exception|None=None, barrier:threading.Barrier|None=None):
+        def run():
+            with self._lock:
+                self.events.append(('start', name))
+            if barrier:
+                barrier.wait()
+            time.sleep(duration)
+            with self._lock:
+                self.events.append(('end', name))
+            if error:
+                raise error
+        return run
+
+    def ran(self, name:str) -> bool:
+        return ('start', name) in self.events
+
+    def interval(self, name:str) -> tuple[int, int]:
+        return self.events.index(('start', name)), self.events.index(('end', name))
+
+    def assert_before(self, first:str, second:str):
+        assert self.interval(first)[1] < self.interval(second)[0], f'{second} started before {first} finished: {self.events}'
+
+    def overlap(self, first:str, second:str) -> bool:
+        (start_a, end_a), (start_b, end_b) = self.interval(first), self.interval(second)
+        return start_a < end_b and start_b < end_a
+
+
+class PipelineSchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        register_temporary_databases(self, 'master')
+        patcher = mock.patch.object(pipeline, 'bump_data_version')
+        self.bump_data_version = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recorder = StageRecorder()
+
+    def stage(self, name:str, reads:tuple=(), writes:tuple=(), **func_kwargs) -> PipelineStage:
+        return PipelineStage(name, self.recorder.func(name, **func_kwargs), reads=reads, writes=writes)
+
+    def test_dependencies_follow_resources(self):
+        scheduler = PipelineScheduler([
+            self.stage('extract', writes=('raw_data.boxes',)),
+            self.stage('analyze', reads=('raw_data.boxes',), writes=('static_analyses.boxes',)),
+            self.stage('summarize', reads=('static_analyses.boxes',), writes=('master.profile',)),
+            self.stage('rewrite', writes=('raw_data.boxes',)),
+            self.stage('reference', writes=('reference.packs',)),
+        ])
+
+        self.assertEqual(scheduler.dependencies, {
+            'extract': set(),
+            'analyze': {'extract'},
+            'summarize': {'analyze'},
+            # later writers of a resource depend on its earlier writers
+            'rewrite': {'extract'},
+            'reference': set(),
+        })
+        self.assertEqual(scheduler.resolve_targets(('summarize',)), ['extract', 'analyze', 'summarize'])
+        self.assertEqual(scheduler.resolve_targets(), ['extract', 'analyze', 'summarize', 'rewrite', 'reference'])
+
+    def test_stages_wait_for_their_inputs(self):
+        scheduler = PipelineScheduler([
+            self.stage('extract', writes=('raw_data.boxes',)),
+            self.stage('analyze', reads=('raw_data.boxes',), writes=('static_analyses.boxes',)),
+            self.stage('summarize', reads=('static_analyses.boxes', 'raw_data.boxes'), writes=('master.profile',)),
+        ])
+
+        self.assertEqual(scheduler.run(), {'extract': 'complete', 'analyze': 'complete', 'summarize': 'complete'})
+        self.recorder.assert_before('extract', 'analyze')
+        self.recorder.assert_before('analyze', 'summarize')
+        self.bump_data_version.assert_called_once()
+
+    def test_writers_of_a_database_never_overlap(self):
+        # no shared resources, but both write raw_data
+        scheduler = PipelineScheduler([
+            self.stage('boxes', writes=('raw_data.boxes',), duration=0.05),
+            self.stage('cans', writes=('raw_data.cans',), duration=0.05),
+            self.stage('packs', writes=('raw_data.packs',), duration=0.05),
+        ], max_workers=3)
+
+        scheduler.run()
+        for first, second in [('boxes', 'cans'), ('boxes', 'packs'), ('cans', 'packs')]:
+            self.assertFalse(self.recorder.overlap(first, second), f'{first} and {second} wrote raw_data at once: {self.recorder.events}')
+
+    def test_independent_stages_run_concurrently(self):
+        # each stage waits for the other to start, so the run fails unless they run at once
+        barrier = threading.Barrier(2, timeout=5)
+        scheduler = PipelineScheduler([
+            self.stage('flavors', writes=('dynamic_analyses.flavors',), barrier=barrier),
+            self.stage('boxes', writes=('static_analyses.boxes',), barrier=barrier),
+        ], max_workers=2)
+
+        self.assertEqual(scheduler.run(), {'flavors': 'complete', 'boxes': 'complete'})
+
+    def test_failed_stage_stops_its_dependents(self):
+        scheduler = PipelineScheduler([
+            self.stage('extract', writes=('raw_data.boxes',)),
+            self.stage('analyze', reads=('raw_data.boxes',), writes=('static_analyses.boxes',), error=ValueError('bad box')),
+            self.stage('summarize', reads=('static_analyses.boxes',), writes=('master.profile',)),
+        ])
+
+        with self.assertRaisesRegex(ValueError, 'bad box'):
+            scheduler.run()
+        self.assertTrue(self.recorder.ran('extract'))
+        self.assertFalse(self.recorder.ran('summarize'))
+
+        # the failed stage and its dependents run again, the completed one is skipped
+        scheduler.stages['analyze'].func = self.recorder.func('analyze')
+        self.assertEqual(scheduler.run(), {'extract': 'skipped', 'analyze': 'complete', 'summarize': 'complete'})
+
+    def test_unchanged_stages_are_skipped(self):
+        stages = [
+            self.stage('extract', writes=('raw_data.boxes',)),
+            self.stage('analyze', reads=('raw_data.boxes',), writes=('static_analyses.boxes',)),
+        ]
+        scheduler = PipelineScheduler(stages)
+
+        scheduler.run()
+        self.assertEqual(scheduler.run(), {'extract': 'skipped', 'analyze': 'skipped'})
+        self.assertEqual(scheduler.run(force=True), {'extract': 'complete', 'analyze': 'complete'})
+
+        # new arguments re-run a stage and everything downstream of it
+        stages[0].kwargs = {'base_data_dir': 'elsewhere'}
+        stages[0].func = lambda base_data_dir: None
+        self.assertEqual(scheduler.run(), {'extract': 'complete', 'analyze': 'complete'})
+
@@ -0,0 +1,138 @@
+from .. import np, pd
+from ..database.tools.profile_summaries import get_profile_summary, update_profile_summaries
+from ..database.utils.partitions import PartitionState
+from .databases import register_temporary_databases, replace_rows
+
+import unittest
+
+
+PURCHASES = pd.DataFrame({
+    'id': ['A1', 'A2', 'A3', 'B1', 'B2'],
+    'purchase_date': '2024-01-01',
+    'price': [6.0, 15.0, None, 5.0, 7.0],
+    'location': 'TGT',
+    'profile_id': ['alice', 'alice', 'alice', 'bob', 'bob'],
+})
+# A2 is a three flavor pack, so its price is split between its flavors
+FLAVORS = pd.DataFrame({
+    'id': ['A1.PSF', 'A2.BP', 'A2.BRB', 'A2.GSP', 'A3.LM', 'B1.KL', 'B2.PSF'],
+    'box_id': ['A1', 'A2', 'A2', 'A2', 'A3', 'B1', 'B2'],
+    'flavor': ['PSF', 'BP', 'BRB', 'GSP', 'LM', 'KL', 'PSF'],
+    'profile_id': ['alice'] * 5 + ['bob'] * 2,
+})
+ANALYSES = pd.DataFrame({
+    'box_id': ['A1.PSF', 'A2.BP', 'A2.BRB', 'A3.LM', 'B1.KL', 'B2.PSF'],
+    'time_to_start': [2, 5, None, 1, 3, 4],
+    'drink_velocity': [4, 6, 8, None, 2, 3],
+    'completion_percentage': [100.0, 87.5, 75.0, 100.0, 50.0, None],
+    'average_pmr': [4.1, 3.2, None, 2.5, 6.0, 1.0],
+    'average_pvr': [4.0, 3.0, 2.0, 2.0, 5.5, 0.5],
+    'profile_id': ['alice'] * 4 + ['bob'] * 2,
+})
+
+# summary column -> (box column, aggregation) of the summaries recomputed from scratch
+SUMMARY_AGGREGATES = {
+    'total_boxes': ('id', 'size'),
+    'total_price_spent': ('price', 'sum'),
+    'average_price': ('price', 'mean'),
+    'average_dv': ('drink_velocity', 'mean'),
+    'average_tts': ('time_to_start', 'mean'),
+    'average_finish_rate': ('completion_percentage', 'mean'),
+    'average_pmr': ('average_pmr', 'mean'),
+    'average_pvr': ('average_pvr', 'mean'),
+}
+
+
+class ProfileSummaryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.databases = register_temporary_databases(self, 'master', 'raw_data', 'static_analyses')
+        self.purchases, self.flavors, self.analyses = PURCHASES.copy(), FLAVORS.copy(), ANALYSES.copy()
+        self.write()
+
+    def write(self):
+        replace_rows(self.databases['raw_data'], 'box_purchases', self.purchases)
+        replace_rows(self.databases['raw_data'], 'box_flavors', self.flavors)
+        replace_rows(self.databases['static_analyses'], 'box_analysis', self.analyses)
+
+    def contributions(self, profile:str) -> pd.DataFrame:
+        return self.databases['master'].get_data(['*'], 'profile_contributions', where_info=[('profile_id', profile)]).sort_values('id', ignore_index=True)
+
+    def assert_summaries_match_recompute(self):
+        """ Incrementally maintained summaries equal summaries computed from scratch """
+        boxes = self.flavors.merge(self.purchases[['id', 'price']].rename(columns={'id': 'box_id'}), on='box_id', how='left')
+        boxes['price'] = boxes['price'] / boxes.groupby('box_id')['id'].transform('size')
+        boxes = boxes.merge(self.analyses.drop(columns='profile_id').rename(columns={'box_id': 'id'}), on='id', how='left')
+
+        for profile, group in boxes.groupby('profile_id'):
+            summary = get_profile_summary(profile)
+            self.assertIsNotNone(summary, f'{profile} has no summary')
+            for column, (source, aggregation) in SUMMARY_AGGREGATES.items():
+                expected = group[source].agg(aggregation)
+                with self.subTest(profile=profile, column=column):
+                    if pd.isna(expected):
+                        self.assertIsNone(summary[column])
+                    else:
+                        self.assertTrue(np.isclose(summary[column], expected), f'{summary[column]} != {expected}')
+
+    def test_first_update_matches_recompute(self):
+        update_profile_summaries()
+        self.assertAlmostEqual(get_profile_summary('alice')['total_price_spent'], 21.0)
+        self.assertEqual(get_profile_summary('alice')['total_boxes'], 5)
+        self.assertIsNone(get_profile_summary('carol'))
+        self.assert_summaries_match_recompute()
+
+    def test_changes_are_applied_as_deltas(self):
+        update_profile_summaries()
+        bob_contributions = self.contributions('bob')
+
+        # a changed price, a new box and a removed box of alice
+        self.purchases.loc[self.purchases['id'] == 'A1', 'price'] = 8.0
+        self.purchases = pd.concat([self.purchases, pd.DataFrame({'id': ['A4'], 'purchase_date': '2024-02-01', 'price': [4.0], 'location': 'WMT', 'profile_id': ['alice']})], ignore_index=True)
+        self.flavors = pd.concat([self.flavors[self.flavors['id'] != 'A3.LM'], pd.DataFrame({'id': ['A4.KL'], 'box_id': ['A4'], 'flavor': ['KL'], 'profile_id': ['alice']})], ignore_index=True)
+        self.analyses = self.analyses[self.analyses['box_id'] != 'A3.LM']
+        self.write()
+
+        update_profile_summaries()
+        self.assert_summaries_match_recompute()
+        self.assertEqual(sorted(self.contributions('alice')['id']), sorted(self.flavors.loc[self.flavors['profile_id'] == 'alice', 'id']))
+        pd.testing.assert_frame_equal(self.contributions('bob'), bob_contributions)
+
+    def test_unchanged_data_is_not_reapplied(self):
+        update_profile_summaries()
+        summary = get_profile_summary('alice')
+
+        update_profile_summaries()
+        self.assertEqual(get_profile_summary('alice'), summary)
+
+        # requested profiles are re-applied even if unchanged, without counting their boxes twice
+        update_profile_summaries(('alice',))
+        self.assertEqual(get_profile_summary('alice'), summary)
+
+    def test_only_requested_profiles_are_updated(self):
+        update_profile_summaries()
+        bob = get_profile_summary('bob')
+
+        self.analyses.loc[self.analyses['box_id'] == 'B1.KL', 'drink_velocity'] = 10
+        self.analyses.loc[self.analyses['box_id'] == 'A1.PSF', 'drink_velocity'] = 10
+        self.write()
+
+        update_profile_summaries(('alice',))
+        self.assertEqual(get_profile_summary('bob'), bob)
+
+        update_profile_summaries()
+        self.assert_summaries_match_recompute()
+
+    def test_profiles_without_boxes_are_removed(self):
+        update_profile_summaries()
+
+        self.purchases = self.purchases[self.purchases['profile_id'] != 'bob']
+        self.flavors = self.flavors[self.flavors['profile_id'] != 'bob']
+        self.analyses = self.analyses[self.analyses['profile_id'] != 'bob']
+        self.write()
+
+        update_profile_summaries()
+        self.assertIsNone(get_profile_summary('bob'))
+        self.assertTrue(self.contributions('bob').empty)
+        self.assertNotIn('bob', PartitionState('update_profile_summaries').recorded())
+        self.assert_summaries_match_recompute()
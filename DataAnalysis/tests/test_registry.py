@@ -0,0 +1,57 @@
+from ..database.utils import pipeline
+from ..database.utils.pipeline import PipelineScheduler, PipelineStage
+from ..database.utils.registry import DatabaseRegistry
+
+import os
+import shutil
+import sqlite3 as sl
+import tempfile
+import unittest
+from unittest import mock
+
+
+class RegistrationMigrationTests(unittest.TestCase):
+    """ Databases created before tables/columns were added to the config are migrated when registered """
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp(prefix='da-test-')
+        self.addCleanup(shutil.rmtree, self.db_dir, ignore_errors=True)
+
+        # master.db as committed before the stage state and profile summary columns existed
+        conn = sl.connect(os.path.join(self.db_dir, 'master.db'))
+        conn.execute('CREATE TABLE reference(id VARCHAR(7), abbreviation TEXT, description TEXT, type TEXT, PRIMARY KEY (id))')
+        conn.execute('CREATE TABLE profile(id VARCHAR(10), name TEXT, total_boxes INT, PRIMARY KEY (id))')
+        conn.execute("INSERT INTO reference VALUES ('1.PSF.1', 'PSF', 'Pamplemousse', 'flavor')")
+        conn.execute("INSERT INTO profile VALUES ('alice', 'Alice', 3)")
+        conn.commit()
+        conn.close()
+
+        for patcher in [
+            mock.patch.dict(DatabaseRegistry._instances, clear=True),
+            mock.patch.object(DatabaseRegistry, '_database_home_directory', self.db_dir),
+            mock.patch.object(DatabaseRegistry, '_config_snapshot_directory', self.db_dir),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        DatabaseRegistry.search_and_register_dbs()
+        self.master = DatabaseRegistry.get_instance('master')
+
+    def test_missing_tables_and_columns_are_added(self):
+        self.assertEqual(self.master.db_loc, os.path.join(self.db_dir, 'master.db'))
+        self.assertTrue({'pipeline_stages', 'partition_state', 'profile_contributions'} <= self.master.existing_tables())
+
+        profile = self.master.get_data(['*'], 'profile')
+        self.assertEqual(list(profile.columns), self.master.tables['profile']['header'])
+        self.assertEqual(profile.loc[0, 'total_boxes'], 3)
+        self.assertTrue(profile.loc[0, ['price_count', 'dv_sum']].isna().all())
+        self.assertEqual(len(self.master.get_data(['*'], 'reference')), 1)
+
+        # registering again changes nothing
+        self.assertEqual(self.master.migrate_tables(), {})
+
+    def test_stage_state_is_recorded_on_a_migrated_database(self):
+        scheduler = PipelineScheduler([PipelineStage('noop', lambda: None, writes=('master.reference',))])
+        with mock.patch.object(pipeline, 'bump_data_version'):
+            self.assertEqual(scheduler.run(), {'noop': 'complete'})
+            self.assertEqual(scheduler.run(), {'noop': 'skipped'})
@@ -1,5 +1,6 @@
-from . import Literal, csv, json, datetime, yaml, pickle
-from .config import ALL_DATETIME_FORMATS, logging
+from . import Literal, csv, json, datetime, yaml, pickle, os
+from .config import ALL_DATETIME_FORMATS, DATA_VERSION_FILE, logging
+from .data_version import bump_version_file
 
 logger = logging.getLogger('standard')
 
@@ -22,10 +23,20 @@ def read_csv_data(path_to_data:str, output_type:Literal['dict','list']) -> list[
         return [row for row in data]
     
 
-def get_current_time(format:Literal['PRIM_DATE', 'FILE_DATE', 'PRIM_DATETIME']):
+def get_current_time(format:Literal['PRIM_DATE', 'FILE_DATE', 'FILE_DATETIME', 'PRIM_DATETIME']):
     return datetime.datetime.now().strftime(ALL_DATETIME_FORMATS[format])
 
 
+def bump_data_version(version_file:str=DATA_VERSION_FILE) -> int:
+    """ Increments the shared data version counter (see data_version.bump_version_file) and returns the new version
+
+        The website includes this version in its cache keys, so bumping it expires every cached page.
+    """
+    version = bump_version_file(version_file)
+    logger.info('Bumped data version to %s', version)
+    return version
+
+
 def read_yaml_data(config_file_path:str) -> list[dict]:
     """ Reads contents of all documents in a .yaml config file and returns as a dict"""
 
@@ -33,9 +44,9 @@ def read_yaml_data(config_file_path:str) -> list[dict]:
         data = [i for i in yaml.load_all(fn, Loader=yaml.Loader)]
 
     if len(data) == 1:
-        logger.info(f'Only one YAML document found in {config_file_path}')
+        logger.info('Only one YAML document found in %s', config_file_path)
     else:
-        logger.info(f'{len(data)} YAML documents found in {config_file_path}')
+        logger.info('%s YAML documents found in %s', len(data), config_file_path)
 
     return data
     
@@ -51,7 +62,7 @@ class PickleHandler:
         assert file_path.endswith('.pkl'), f'Unsupported file type: {file_path}'
         with open(file_path, 'rb') as fn:
             data = pickle.load(fn)
-            logger.info(f'Successfully loaded data from {file_path}')
+            logger.info('Successfully loaded data from %s', file_path)
             return data
         
     def save_pickle(self, data, file_path:str):
@@ -59,5 +70,5 @@ class PickleHandler:
 
         with open(file_path, 'wb') as fn:
             pickle.dump(data, fn)
-            logger.info(f'Successfully saved data to {file_path}')
+            logger.info('Successfully saved data to %s', file_path)
         return
\ No newline at end of file
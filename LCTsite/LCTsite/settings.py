@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,17 +76,95 @@ WSGI_APPLICATION = 'LCTSite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Databases and outputs of the DataAnalysis pipeline (in the repository next to this site)
+ANALYSIS_DIR = BASE_DIR.parent / 'DataAnalysis'
+ANALYSIS_DB_DIR = ANALYSIS_DIR / 'databases'
+
+# DataAnalysis databases exposed read-only to the site (see app/routers.py and app/data/analysis/models.py)
+ANALYSIS_DATABASES = ['master', 'raw_data', 'static_analyses', 'dynamic_analyses']
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    **{
+        db_name: {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # opened as a read-only URI; the pipeline is the only writer
+            'NAME': f'{(ANALYSIS_DB_DIR / f"{db_name}.db").as_uri()}?mode=ro',
+        }
+        for db_name in ANALYSIS_DATABASES
+    },
+}
+
+DATABASE_ROUTERS = ['app.routers.AnalysisRouter']
+
+# Charts pre-rendered by the pipeline's render_charts stage, served as static/charts/<file>
+CHART_DIR = ANALYSIS_DIR / 'charts'
+CHART_STATIC_PREFIX = 'charts'
+
+# Shared data version counter, bumped by insert_data and the DataAnalysis pipeline
+DATA_VERSION_FILE = ANALYSIS_DB_DIR / 'data_version.txt'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Page/fragment keys include the data version, so entries never need to be invalidated by hand.
+# Use 'django.core.cache.backends.filebased.FileBasedCache' (with a directory LOCATION) to share
+# the cache between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lct-pages',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
     }
 }
 
+# Combo packs (pack code -> flavor codes), reloaded whenever the file changes
+# With COMBO_PACKS_FROM_REFERENCE, packs in master.reference (type costco_pack) are recognized too, and
+# box rows of those missing from the file are rejected
+COMBO_PACKS_FILE = BASE_DIR / 'app' / 'data' / 'combos.json'
+COMBO_PACKS_FROM_REFERENCE = True
+
+# Uploads
+# Box/can CSVs are stored (under MEDIA_ROOT/uploads) and processed by background worker threads,
+# in batches of UPLOAD_BATCH_SIZE rows. Set UPLOAD_IN_BACKGROUND to False to process them in the request.
+
+UPLOAD_IN_BACKGROUND = True
+UPLOAD_WORKERS = 2
+UPLOAD_BATCH_SIZE = 500
+
+# Command run from the repository root once an upload job completes, e.g. [sys.executable, 'da_main.py', '--preset', '2'].
+# Disabled (None) by default: the DataAnalysis pipeline reads its raw data from config.EXTERNAL_DATA_DIR, not the
+# rows uploaded to the site's database, so only enable it where uploads also reach that directory.
+UPLOAD_PIPELINE_COMMAND = None
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# Request metrics
+# With REQUEST_METRICS, every request's queries and latency are recorded (see app/middleware.py):
+# responses get a Server-Timing header, /metrics/requests summarizes the latest
+# REQUEST_METRICS_WINDOW requests of each view, and requests over their view's REQUEST_BUDGETS
+# (by URL name, falling back to 'default') are logged as warnings.
+
+REQUEST_METRICS = False
+REQUEST_METRICS_WINDOW = 200
+REQUEST_METRICS_SLOWEST = 3
+REQUEST_BUDGETS = {
+    'default': {'queries': 10, 'ms': 250},
+    'insert_data': {'queries': 150, 'ms': 2000},
+    'export_stats': {'queries': 5, 'ms': 2000},
+    'view_profile': {'queries': 1, 'ms': 50},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -122,6 +201,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+STATICFILES_DIRS = [
+    (CHART_STATIC_PREFIX, CHART_DIR),
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
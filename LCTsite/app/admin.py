@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import BasicAverages, BoxAverages, BoxTracker, CanData, AbbreviationReferences, RawTracker
+from .models import BasicAverages, BoxAverages, BoxTracker, CanData, AbbreviationReferences, RawTracker, UploadJob
 
 
 admin.site.register(BasicAverages)
@@ -7,4 +7,5 @@ admin.site.register(BoxAverages)
 admin.site.register(BoxTracker)
 admin.site.register(CanData)
 admin.site.register(AbbreviationReferences)
-admin.site.register(RawTracker)
\ No newline at end of file
+admin.site.register(RawTracker)
+admin.site.register(UploadJob)
\ No newline at end of file
@@ -0,0 +1,375 @@
+import datetime
+import gzip
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+
+from .models import BoxTracker, CanData, UploadJob
+from .data import charts
+from .data.combos import combo_packs
+
+
+# Performance suite for the site's views
+#
+# Every view is driven through the test client at each seeding scale and measured for latency
+# percentiles, database queries and peak Python memory. A test fails when a measurement is over
+# its budget in BENCHMARK_BUDGETS. It is not part of the default test run (which only discovers
+# test*.py modules), run it with
+#
+#     python manage.py test app.benchmarks
+#
+# It is configured with environment variables:
+#
+#     LCT_BENCH_SCALES          boxes seeded per run, comma separated (default 100,1000)
+#     LCT_BENCH_REPEAT          requests timed per view (default 20)
+#     LCT_BENCH_UPLOAD_ROWS     rows of the uploaded box CSVs (default 1000)
+#     LCT_BENCH_LATENCY_FACTOR  multiplies every latency budget, i.e. 3 on a slow CI machine (default 1)
+#     LCT_BENCH_REPORT          writes every measurement to this JSON file
+#     LCT_BENCH_BASELINE        a report from an earlier run; fails if any p95 latency grew by more
+#     LCT_BENCH_MAX_REGRESSION  than this factor (default 1.5)
+
+BENCH_SCALES = [int(scale) for scale in os.environ.get('LCT_BENCH_SCALES', '100,1000').split(',')]
+BENCH_REPEAT = int(os.environ.get('LCT_BENCH_REPEAT', 20))
+BENCH_UPLOAD_ROWS = int(os.environ.get('LCT_BENCH_UPLOAD_ROWS', 1000))
+LATENCY_FACTOR = float(os.environ.get('LCT_BENCH_LATENCY_FACTOR', 1))
+BENCH_REPORT = os.environ.get('LCT_BENCH_REPORT')
+BENCH_BASELINE = os.environ.get('LCT_BENCH_BASELINE')
+MAX_REGRESSION = float(os.environ.get('LCT_BENCH_MAX_REGRESSION', 1.5))
+
+CANS_PER_BOX = 8
+FLAVORS = ['PSF', 'LM', 'BBG', 'CMC', 'PMG', 'KL']
+LOCATIONS = ['TGT', 'CSTCO', 'WMT', 'SFWY']
+
+
+def upload_query_budget(rows:int, batch_size:int) -> int:
+    """ Queries of an in-request upload of box_csv(rows), read in batches of batch_size rows
+
+        Every batch reserves the total and each flavor's box counter (a savepoint with its release, an
+        update and a select each, in two more savepoints, see counters.reserve_many) and bulk inserts
+        its boxes, where a combo pack row adds a box per flavor. The first upload also creates the
+        counters (a savepoint, insert and release each).
+    """
+    counters = len(FLAVORS) + 1
+    fields = [field for field in BoxTracker._meta.concrete_fields if not field.primary_key]
+    insert_rows = connection.ops.bulk_batch_size(fields, [])
+    row_boxes = [len(combo_packs.flavors(FLAVORS[number % len(FLAVORS)]) or (None,)) for number in range(rows)]
+
+    queries = 2 + 3 * counters
+    for start in range(0, rows, batch_size):
+        queries += 4 + 4 * counters + math.ceil(sum(row_boxes[start:start + batch_size]) / insert_rows)
+    return queries
+
+
+# p95 latency (ms), database queries and peak traced memory (KiB) allowed per request
+# Query budgets don't depend on the scale: a view whose query count grows with the data fails. Upload
+# budgets follow LCT_BENCH_UPLOAD_ROWS and UPLOAD_BATCH_SIZE.
+BENCHMARK_BUDGETS = {
+    'view_stats': {'p95_ms': 150, 'queries': 3, 'peak_kib': 2048},
+    'view_stats_filtered': {'p95_ms': 150, 'queries': 3, 'peak_kib': 2048},
+    'view_stats_cached': {'p95_ms': 15, 'queries': 0, 'peak_kib': 512},
+    'export_stats': {'p95_ms': 1000, 'queries': 2, 'peak_kib': 8192},
+    'add_data': {'p95_ms': 100, 'queries': 2, 'peak_kib': 4096},
+    'upload_job_status': {'p95_ms': 15, 'queries': 1, 'peak_kib': 256},
+    'chart_data': {'p95_ms': 100, 'queries': 0, 'peak_kib': 4096},
+    'insert_data_boxes': {'p95_ms': 1000, 'queries': upload_query_budget(BENCH_UPLOAD_ROWS, settings.UPLOAD_BATCH_SIZE), 'peak_kib': 4096},
+    'insert_data_boxes_gzip': {'p95_ms': 1000, 'queries': upload_query_budget(BENCH_UPLOAD_ROWS, settings.UPLOAD_BATCH_SIZE), 'peak_kib': 4096},
+    'insert_data_queued': {'p95_ms': 100, 'queries': 4, 'peak_kib': 2048},
+}
+
+# measurements of this run, by benchmark name then scale
+_results:dict[str, dict[str, dict]] = {}
+
+# all functions pertaining to seeding and measuring
+
+def seed_boxes(total_boxes:int, cans_per_box:int=CANS_PER_BOX) -> list[BoxTracker]:
+    """ Synthetic boxes (half of them filled, with cans) spread over flavors, locations and two years """
+    first_day = datetime.date(2022, 1, 1)
+    boxes = []
+    flavor_counts = dict.fromkeys(FLAVORS, 0)
+    for number in range(1, total_boxes + 1):
+        flavor = FLAVORS[number % len(FLAVORS)]
+        flavor_counts[flavor] += 1
+        purchased = first_day + datetime.timedelta(days=number % 730)
+        boxes.append(BoxTracker(
+            bid=f'{number}.{flavor}.{flavor_counts[flavor]}',
+            flavor=flavor,
+            purchase_date=purchased,
+            # every 10th box has no recorded price or dates
+            price=Decimal(f'{4 + number % 5}.99') if number % 10 else None,
+            location=LOCATIONS[number % len(LOCATIONS)],
+            started=purchased + datetime.timedelta(days=3) if number % 10 else None,
+            finished=purchased + datetime.timedelta(days=10) if number % 10 else None,
+            contributing=False,
+            filled=number % 2 == 0,
+        ))
+    boxes = BoxTracker.objects.bulk_create(boxes, batch_size=500)
+
+    cans = [
+        CanData(
+            cid=f'{index * cans_per_box + can}.CD.{can}',
+            bid=box,
+            initial_grams=370.0,
+            initial_floz=12.0,
+            final_grams=15.0 + can,
+            final_floz=0.5,
+            finished='Y',
+            percent_remaining_g=round((15.0 + can) / 370 * 100, 3),
+            percent_remaining_floz=round(0.5 / 12 * 100, 3),
+        )
+        for index, box in enumerate(box for box in boxes if box.filled)
+        for can in range(1, cans_per_box + 1)
+    ]
+    CanData.objects.bulk_create(cans, batch_size=500)
+    return boxes
+
+
+def box_csv(total_rows:int) -> bytes:
+    """ Box data upload CSV with total_rows rows """
+    lines = ['Flavor,Purchased,Price,Location,Started,Finished']
+    for number in range(total_rows):
+        lines.append(f'{FLAVORS[number % len(FLAVORS)]},{number % 12 + 1:02d}/{number % 28 + 1:02d}/2023,5.99,{LOCATIONS[number % len(LOCATIONS)]},NA,NA')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def percentile(samples:list[float], pct:int) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def measure(request, repeat:int=BENCH_REPEAT, before=None) -> dict:
+    """ Latency percentiles, query count and peak memory of a request
+
+        Args:
+            request (Callable) : Makes the request and returns the response
+            repeat (int) : Number of timed requests
+            before (Callable) : Called before every request, outside of the measurements
+
+        Returns:
+            p50/p95/p99/max latency (ms), the most queries of a single request, and the peak
+            memory (KiB) traced over one more request
+    """
+    latencies = []
+    queries = 0
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request()
+            # streamed responses are timed until their last chunk
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code < 400, f'Benchmark request failed with {response.status_code}: {response.content[:200]}'
+        queries = max(queries, len(captured))
+
+    # tracing slows every allocation down, so memory is measured on a separate request
+    if before is not None:
+        before()
+    tracemalloc.start()
+    try:
+        response = request()
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': repeat,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def _write_report():
+    """ Prints this run's measurements and writes them to LCT_BENCH_REPORT """
+    if not _results:
+        return
+    print(f"\n{'benchmark':<26}{'scale':>16}    p50 ms    p95 ms    p99 ms  queries  peak KiB", file=sys.stderr)
+    for name, scales in sorted(_results.items()):
+        for scale, result in scales.items():
+            print(f"{name:<26}{scale:>16}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['queries']:>9}{result['peak_kib']:>10}", file=sys.stderr)
+
+    if BENCH_REPORT:
+        with open(BENCH_REPORT, 'w') as fn:
+            json.dump({'scales': BENCH_SCALES, 'repeat': BENCH_REPEAT, 'results': _results}, fn, indent=2)
+
+
+def _baseline() -> dict:
+    if not BENCH_BASELINE:
+        return {}
+    with open(BENCH_BASELINE, 'r') as fn:
+        return json.load(fn)['results']
+
+
+def _chart_models() -> list:
+    """ Analysis models read by the chart datasets """
+    models = [spec['model'] for spec in charts.CHART_DATASETS.values()]
+    models += [spec['related']['model'] for spec in charts.CHART_DATASETS.values() if 'related' in spec]
+    return list(dict.fromkeys(models))
+
+
+def _copy_analysis_table(model):
+    """ Creates a model's table in its test database and copies the rows of the DataAnalysis database into it
+
+        Only the columns the database already has are copied (older databases lack some of them).
+    """
+    alias, table = model.analysis_database, model._meta.db_table
+    with connections[alias].schema_editor() as editor:
+        editor.create_model(model)
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute('ATTACH DATABASE %s AS source', [f'{(settings.ANALYSIS_DB_DIR / f"{alias}.db").as_uri()}?mode=ro'])
+        try:
+            cursor.execute(f'PRAGMA source.table_info({table})')
+            existing = {row[1] for row in cursor.fetchall()}
+            if not existing:
+                raise OperationalError(f'no such table: {table}')
+            columns = ', '.join(field.column for field in model._meta.concrete_fields if field.column in existing)
+            cursor.execute(f'INSERT INTO {table}({columns}) SELECT {columns} FROM source.{table}')
+        finally:
+            cursor.execute('DETACH DATABASE source')
+
+
+@tag('benchmark')
+@override_settings(UPLOAD_IN_BACKGROUND=False)
+class ViewBenchmarks(TestCase):
+    """ Latency, query and memory budgets of the site's views at every seeding scale """
+    databases = {'default', *settings.ANALYSIS_DATABASES}
+
+    @classmethod
+    def setUpClass(cls):
+        # chart data is served from copies of the DataAnalysis tables, made outside of the test transactions
+        cls.unavailable_charts = {}
+        for model in _chart_models():
+            try:
+                _copy_analysis_table(model)
+            except OperationalError as e:
+                cls.unavailable_charts[model._meta.db_table] = str(e)
+
+        super().setUpClass()
+        # uploads and data version bumps must not touch the real media and DataAnalysis directories
+        cls.scratch_dir = tempfile.mkdtemp(prefix='lct-bench-')
+        cls.scratch_settings = override_settings(
+            MEDIA_ROOT=cls.scratch_dir,
+            DATA_VERSION_FILE=os.path.join(cls.scratch_dir, 'data_version.txt'),
+            UPLOAD_PIPELINE_COMMAND=None,
+        )
+        cls.scratch_settings.enable()
+        cls.baseline = _baseline()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.scratch_settings.disable()
+        shutil.rmtree(cls.scratch_dir, ignore_errors=True)
+        super().tearDownClass()
+
+        for model in _chart_models():
+            with connections[model.analysis_database].schema_editor() as editor:
+                editor.delete_model(model)
+
+    def setUp(self):
+        cache.clear()
+
+    def check_budget(self, name:str, scale:int, result:dict):
+        """ Records a measurement and fails if it is over its budget or regressed from the baseline """
+        _results.setdefault(name, {})[str(scale)] = result
+        budget = BENCHMARK_BUDGETS[name]
+
+        self.assertLessEqual(result['queries'], budget['queries'], f'{name} at {scale} boxes: {result["queries"]} queries (budget {budget["queries"]})')
+        self.assertLessEqual(result['p95_ms'], budget['p95_ms'] * LATENCY_FACTOR, f'{name} at {scale} boxes: p95 {result["p95_ms"]} ms (budget {budget["p95_ms"] * LATENCY_FACTOR} ms)')
+        self.assertLessEqual(result['peak_kib'], budget['peak_kib'], f'{name} at {scale} boxes: peak {result["peak_kib"]} KiB (budget {budget["peak_kib"]} KiB)')
+
+        previous = self.baseline.get(name, {}).get(str(scale))
+        if previous:
+            self.assertLessEqual(result['p95_ms'], previous['p95_ms'] * MAX_REGRESSION, f'{name} at {scale} boxes: p95 {result["p95_ms"]} ms regressed from {previous["p95_ms"]} ms')
+
+    def run_at_scales(self, name:str, request, before=None, repeat:int=BENCH_REPEAT):
+        """ Measures a request against freshly seeded data at every scale """
+        for scale in BENCH_SCALES:
+            with self.subTest(benchmark=name, scale=scale):
+                BoxTracker.objects.all().delete()
+                seed_boxes(scale)
+                self.check_budget(name, scale, measure(request, repeat, before or cache.clear))
+
+    def test_view_stats(self):
+        self.run_at_scales('view_stats', lambda: self.client.get('/view_stats'))
+
+    def test_view_stats_filtered(self):
+        self.run_at_scales('view_stats_filtered', lambda: self.client.get('/view_stats', {'flavor': 'PSF', 'sort': '-price', 'purchased_from': '2022-06-01', 'page_size': 200}))
+
+    def test_view_stats_cached(self):
+        # the page cache is warmed by the first request and kept for the timed ones
+        for scale in BENCH_SCALES:
+            with self.subTest(benchmark='view_stats_cached', scale=scale):
+                BoxTracker.objects.all().delete()
+                seed_boxes(scale)
+                cache.clear()
+                self.client.get('/view_stats')
+                self.check_budget('view_stats_cached', scale, measure(lambda: self.client.get('/view_stats'), before=lambda: None))
+
+    def test_export_stats(self):
+        self.run_at_scales('export_stats', lambda: self.client.get('/view_stats/export'), repeat=max(BENCH_REPEAT // 4, 2))
+
+    def test_add_data(self):
+        self.run_at_scales('add_data', lambda: self.client.get('/add_data'))
+
+    def test_upload_job_status(self):
+        job = UploadJob.objects.create(kind='boxes', file='uploads/benchmark.csv', status='complete', total_rows=10, processed_rows=10)
+        self.run_at_scales('upload_job_status', lambda: self.client.get(f'/upload_jobs/{job.pk}'))
+
+    def test_chart_data(self):
+        # chart data is read from the DataAnalysis tables copied in setUpClass, so it doesn't depend on the seeded boxes
+        unavailable = {}
+        for dataset in charts.CHART_DATASETS:
+            try:
+                charts.chart_payload(dataset, {})
+            except charts.ChartDataError as e:
+                unavailable[dataset] = e.message
+        if len(unavailable) == len(charts.CHART_DATASETS):
+            self.skipTest(f'DataAnalysis databases are missing or out of date: {self.unavailable_charts or unavailable}')
+
+        for dataset in charts.CHART_DATASETS.keys() - unavailable.keys():
+            with self.subTest(benchmark='chart_data', dataset=dataset):
+                self.check_budget('chart_data', dataset, measure(lambda: self.client.get(f'/api/charts/{dataset}'), before=cache.clear))
+
+    def test_insert_data(self):
+        upload = box_csv(BENCH_UPLOAD_ROWS)
+        repeat = max(BENCH_REPEAT // 4, 2)
+        self.run_at_scales('insert_data_boxes', lambda: self.client.post('/insert_data', {'bdqu': SimpleUploadedFile('boxes.csv', upload)}), repeat=repeat)
+
+    def test_insert_data_gzip(self):
+        upload = gzip.compress(box_csv(BENCH_UPLOAD_ROWS))
+        repeat = max(BENCH_REPEAT // 4, 2)
+        self.run_at_scales('insert_data_boxes_gzip', lambda: self.client.post('/insert_data', {'bdqu': SimpleUploadedFile('boxes.csv.gz', upload)}), repeat=repeat)
+
+    @override_settings(UPLOAD_IN_BACKGROUND=True)
+    def test_insert_data_queued(self):
+        # only the request is measured; queued jobs start on commit, which never happens inside a TestCase
+        upload = box_csv(BENCH_UPLOAD_ROWS)
+        self.run_at_scales('insert_data_queued', lambda: self.client.post('/insert_data', {'bdqu': SimpleUploadedFile('boxes.csv', upload)}, HTTP_ACCEPT='application/json'))
+
+
+def tearDownModule():
+    _write_report()
@@ -0,0 +1,219 @@
+from django.db import models
+
+
+# Read-only models over the DataAnalysis databases (see settings.ANALYSIS_DATABASES and routers.py)
+# The tables and their indexes are created by the DataAnalysis pipeline, so none of these models are
+# managed by Django migrations. ```analysis_database``` is the database alias each model is read from.
+# DATE columns hold 'YYYY-MM-DD HH:MM:SS' text written by pandas, which the sqlite backend's date converter
+# reads back as None, so their values are selected as text, i.e. Substr(field, 1, 10) (see data/charts.py).
+# Chart data (data/charts.py) is read through these models. The box table and export (data/browse.py) still read
+# BoxTracker: uploads are written to the site's database, and the pipeline only reads config.EXTERNAL_DATA_DIR,
+# so raw_data does not hold uploaded boxes.
+
+class AnalysisModel(models.Model):
+    analysis_database:str = ''
+
+    class Meta:
+        abstract = True
+        managed = False
+
+
+# @@@@@@@@@@@@@@@@@@@ MASTER @@@@@@@@@@@@@@@@@@@
+
+# totals and averages of each profile's boxes, kept current by the pipeline's update_profile_summaries stage
+class Profile(AnalysisModel):
+    analysis_database = 'master'
+
+    id = models.CharField(max_length=10, primary_key=True)
+    name = models.TextField(null=True)
+    total_boxes = models.IntegerField(null=True)
+    total_price_spent = models.FloatField(null=True)
+    average_price = models.FloatField(null=True)
+    average_dv = models.FloatField(null=True)
+    average_tts = models.FloatField(null=True)
+    average_finish_rate = models.FloatField(null=True)
+    average_pmr = models.FloatField(null=True)
+    average_pvr = models.FloatField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'profile'
+
+
+# @@@@@@@@@@@@@@@@@@@ RAW DATA @@@@@@@@@@@@@@@@@@@
+
+class BoxPurchase(AnalysisModel):
+    analysis_database = 'raw_data'
+
+    id = models.CharField(max_length=7, primary_key=True)
+    purchase_date = models.DateField(null=True)
+    price = models.FloatField(null=True)
+    location = models.CharField(max_length=5, null=True)
+    profile_id = models.TextField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'box_purchases'
+
+
+class BoxFlavor(AnalysisModel):
+    analysis_database = 'raw_data'
+
+    id = models.CharField(max_length=7, primary_key=True)
+    box = models.ForeignKey(BoxPurchase, on_delete=models.DO_NOTHING, db_constraint=False, related_name='flavors')
+    flavor = models.CharField(max_length=5, null=True)
+    start_date = models.DateField(null=True)
+    finish_date = models.DateField(null=True)
+    has_cans = models.BooleanField(null=True)
+    profile_id = models.TextField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'box_flavors'
+
+
+class RawCan(AnalysisModel):
+    analysis_database = 'raw_data'
+
+    id = models.TextField(primary_key=True)
+    box = models.ForeignKey(BoxFlavor, on_delete=models.DO_NOTHING, db_constraint=False, related_name='cans')
+    profile_id = models.CharField(max_length=7, null=True)
+    initial_mass = models.IntegerField(null=True)
+    initial_volume = models.FloatField(null=True)
+    final_mass = models.IntegerField(null=True)
+    final_volume = models.FloatField(null=True)
+    empty_can_mass = models.FloatField(null=True)
+    finish_status = models.CharField(max_length=3, null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'can_data'
+
+
+# @@@@@@@@@@@@@@@@@@@ STATIC ANALYSES @@@@@@@@@@@@@@@@@@@
+# box/can ids refer to raw_data rows, which Django can't join across databases
+
+class BoxAnalysis(AnalysisModel):
+    analysis_database = 'static_analyses'
+
+    box_id = models.CharField(max_length=7, primary_key=True)
+    time_to_start = models.IntegerField(null=True)
+    drink_velocity = models.IntegerField(null=True)
+    completion_percentage = models.FloatField(null=True)
+    average_pmr = models.FloatField(null=True)
+    average_pvr = models.FloatField(null=True)
+    profile_id = models.TextField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'box_analysis'
+
+
+class CanAnalysis(AnalysisModel):
+    analysis_database = 'static_analyses'
+
+    can_id = models.CharField(max_length=7, primary_key=True)
+    objective_finish_status = models.BooleanField(null=True)
+    mass_difference = models.FloatField(null=True)
+    true_mass_difference = models.FloatField(null=True)
+    true_volume_difference = models.FloatField(null=True)
+    volume_difference = models.FloatField(null=True)
+    percentage_mass_remaining = models.FloatField(null=True)
+    percentage_volume_remaining = models.FloatField(null=True)
+    profile_id = models.TextField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'can_analysis'
+
+
+# @@@@@@@@@@@@@@@@@@@ DYNAMIC ANALYSES @@@@@@@@@@@@@@@@@@@
+
+class FlavorAnalysis(AnalysisModel):
+    analysis_database = 'dynamic_analyses'
+
+    flavor = models.CharField(max_length=5, primary_key=True)
+    total_purchased = models.IntegerField(null=True)
+    average_drink_velocity = models.FloatField(null=True)
+    average_time_to_start = models.FloatField(null=True)
+    average_finish_rate = models.FloatField(null=True)
+    average_pmr = models.FloatField(null=True)
+    average_pvr = models.FloatField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'flavor_analysis'
+
+
+class ProfileFlavorAnalysis(AnalysisModel):
+    analysis_database = 'dynamic_analyses'
+
+    id = models.TextField(primary_key=True) # <profile id>.<flavor>
+    profile_id = models.TextField()
+    flavor = models.CharField(max_length=5)
+    total_purchased = models.IntegerField(null=True)
+    average_drink_velocity = models.FloatField(null=True)
+    average_time_to_start = models.FloatField(null=True)
+    average_finish_rate = models.FloatField(null=True)
+    average_pmr = models.FloatField(null=True)
+    average_pvr = models.FloatField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'profile_flavor_analysis'
+
+
+class CanMeasurement(AnalysisModel):
+    analysis_database = 'dynamic_analyses'
+
+    parameters = models.TextField(primary_key=True)
+    value = models.FloatField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'can_measurements'
+
+
+class RollupCube(AnalysisModel):
+    analysis_database = 'dynamic_analyses'
+
+    id = models.TextField(primary_key=True)
+    period_type = models.CharField(max_length=7)
+    period = models.CharField(max_length=7)
+    flavor = models.CharField(max_length=5)
+    location = models.CharField(max_length=5)
+    box_count = models.IntegerField(null=True)
+    price_count = models.IntegerField(null=True)
+    total_spend = models.FloatField(null=True)
+    dv_sum = models.FloatField(null=True)
+    dv_count = models.IntegerField(null=True)
+    tts_sum = models.FloatField(null=True)
+    tts_count = models.IntegerField(null=True)
+    finish_sum = models.FloatField(null=True)
+    finish_count = models.IntegerField(null=True)
+    pmr_sum = models.FloatField(null=True)
+    pmr_count = models.IntegerField(null=True)
+    pvr_sum = models.FloatField(null=True)
+    pvr_count = models.IntegerField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'rollup_cube'
+
+
+class ConsumptionSeries(AnalysisModel):
+    analysis_database = 'dynamic_analyses'
+
+    date = models.DateField(primary_key=True)
+    cans = models.FloatField(null=True)
+    cumulative_cans = models.FloatField(null=True)
+    rolling_7 = models.FloatField(null=True)
+    rolling_30 = models.FloatField(null=True)
+    rolling_90 = models.FloatField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'consumption_series'
+
+
+class DistributionSketch(AnalysisModel):
+    analysis_database = 'dynamic_analyses'
+
+    id = models.TextField(primary_key=True)
+    scope = models.CharField(max_length=8)
+    key = models.CharField(max_length=5)
+    metric = models.CharField(max_length=3)
+    count = models.IntegerField(null=True)
+    sketch = models.BinaryField(null=True)
+
+    class Meta(AnalysisModel.Meta):
+        db_table = 'distribution_sketches'
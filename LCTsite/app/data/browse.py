@@ -0,0 +1,206 @@
+import base64
+import csv
+import datetime
+import json
+from decimal import Decimal
+
+from django.db.models import DateField, DecimalField, Q, QuerySet, Value
+from django.db.models.functions import Coalesce
+
+from ..models import BoxTracker
+from .upload import UPLOAD_DATE_FORMAT
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+# (field, header) of the box table, in display/export order
+BOX_COLUMNS = [
+    ('bid', 'Box ID'),
+    ('flavor', 'Flavor'),
+    ('purchase_date', 'Purchase Date'),
+    ('price', 'Price'),
+    ('location', 'Purchase Location'),
+    ('started', 'Start Date'),
+    ('finished', 'Finish Date'),
+]
+SORT_FIELDS = [field for field, _ in BOX_COLUMNS]
+
+# nullable fields are sorted through a non-null key so keyset comparisons also cover missing values
+# (missing dates sort after every date, missing prices before every price)
+NULL_SORT_VALUES = {
+    'purchase_date': Value(datetime.date.max, output_field=DateField()),
+    'started': Value(datetime.date.max, output_field=DateField()),
+    'finished': Value(datetime.date.max, output_field=DateField()),
+    'price': Value(Decimal('-1'), output_field=DecimalField(max_digits=7, decimal_places=2)),
+}
+
+# cursor values of the non-text sort keys, parsed back from the strings they are carried as
+CURSOR_VALUE_PARSERS = {
+    'purchase_date': datetime.date.fromisoformat,
+    'started': datetime.date.fromisoformat,
+    'finished': datetime.date.fromisoformat,
+    'price': Decimal,
+}
+
+# all functions pertaining to browsing/exporting box data
+
+def _sort_key(field:str) -> str:
+    return f'{field}_key' if field in NULL_SORT_VALUES else field
+
+
+def _parse_iso_date(value:str) -> str:
+    """ YYYY-MM-DD filter value, or empty if invalid """
+    try:
+        return datetime.date.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        return ''
+
+
+def _display(value) -> str:
+    """ Box values as they are uploaded (MM/DD/YYYY dates, NA when missing) """
+    if value is None:
+        return 'NA'
+    if isinstance(value, datetime.date):
+        return value.strftime(UPLOAD_DATE_FORMAT)
+    return str(value)
+
+
+def parse_box_params(params) -> dict:
+    """ Validated browsing options from request GET parameters
+
+        Parameters: page_size, sort (a box field, prefixed with - for descending), flavor, location,
+        purchased_from and purchased_to (YYYY-MM-DD), and after/before page cursors
+    """
+    try:
+        page_size = int(params.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+
+    sort = params.get('sort', 'bid')
+    if sort.lstrip('-') not in SORT_FIELDS:
+        sort = 'bid'
+
+    return {
+        'page_size': min(max(page_size, 1), MAX_PAGE_SIZE),
+        'sort': sort,
+        'flavor': params.get('flavor', '').strip(),
+        'location': params.get('location', '').strip(),
+        'purchased_from': _parse_iso_date(params.get('purchased_from', '')),
+        'purchased_to': _parse_iso_date(params.get('purchased_to', '')),
+        'after': params.get('after', ''),
+        'before': params.get('before', ''),
+    }
+
+
+def filtered_boxes(options:dict) -> QuerySet:
+    """ Boxes matching the flavor/location/purchase date filters, ordered by the sort field then pk """
+    boxes = BoxTracker.objects.annotate(**{_sort_key(field): Coalesce(field, null_value) for field, null_value in NULL_SORT_VALUES.items()})
+
+    if options['flavor']:
+        boxes = boxes.filter(flavor=options['flavor'])
+    if options['location']:
+        boxes = boxes.filter(location=options['location'])
+    if options['purchased_from']:
+        boxes = boxes.filter(purchase_date__gte=options['purchased_from'])
+    if options['purchased_to']:
+        boxes = boxes.filter(purchase_date__lte=options['purchased_to'])
+
+    field = options['sort'].lstrip('-')
+    prefix = '-' if options['sort'].startswith('-') else ''
+    return boxes.order_by(f'{prefix}{_sort_key(field)}', f'{prefix}pk')
+
+
+def encode_cursor(box:dict, sort:str) -> str:
+    field = sort.lstrip('-')
+    key = _sort_key(field)
+    # dates and prices are carried as their ISO/decimal strings
+    value = box[key] if isinstance(box[key], str) else str(box[key])
+    return base64.urlsafe_b64encode(json.dumps([field, value, box['pk']]).encode()).decode()
+
+
+def decode_cursor(cursor:str, sort:str) -> tuple[object, int]|None:
+    """ (sort value, pk) position of a cursor made by encode_cursor for the same sort field
+
+        Returns:
+            None (i.e. the first page) if the cursor is malformed, was made for another sort field, or
+            its value isn't valid for the field
+    """
+    try:
+        field, value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+
+    if field != sort.lstrip('-') or not isinstance(value, str) or type(pk) is not int:
+        return None
+
+    parser = CURSOR_VALUE_PARSERS.get(field)
+    if parser is None:
+        return value, pk
+    try:
+        value = parser(value)
+    except (ValueError, ArithmeticError):
+        return None
+    if isinstance(value, Decimal) and not value.is_finite():
+        return None
+    return value, pk
+
+
+def _keyset(field:str, value:str, pk:int, forward:bool) -> Q:
+    """ Rows strictly after (forward) or before the (value, pk) position in ascending order """
+    op = 'gt' if forward else 'lt'
+    return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'pk__{op}': pk})
+
+
+def box_page(options:dict) -> dict:
+    """ One keyset page of boxes
+
+        Pages are located by the (sort value, pk) of the last/first row shown instead of an OFFSET, so
+        every page costs the same no matter how deep it is.
+
+        Returns:
+            Dict with the page's rows, and after/before cursors for the next/previous pages (None at the ends)
+    """
+    field = _sort_key(options['sort'].lstrip('-'))
+    descending = options['sort'].startswith('-')
+    boxes = filtered_boxes(options)
+
+    # a previous page is read backwards from its cursor, then flipped
+    backwards = bool(options['before']) and not options['after']
+    cursor = decode_cursor(options['before'] if backwards else options['after'], options['sort'])
+    if cursor:
+        value, pk = cursor
+        boxes = boxes.filter(_keyset(field, value, pk, forward=(descending == backwards)))
+    if backwards:
+        boxes = boxes.reverse()
+
+    rows = list(boxes.values(*dict.fromkeys(['pk', field, *SORT_FIELDS]))[:options['page_size'] + 1])
+    has_more = len(rows) > options['page_size']
+    rows = rows[:options['page_size']]
+    if backwards:
+        rows.reverse()
+
+    has_next = has_more if not backwards else bool(cursor)
+    has_previous = (has_more if backwards else bool(cursor)) and bool(rows)
+
+    return {
+        'rows': [[_display(row[col]) for col in SORT_FIELDS] for row in rows],
+        'after': encode_cursor(rows[-1], options['sort']) if rows and has_next else None,
+        'before': encode_cursor(rows[0], options['sort']) if rows and has_previous else None,
+    }
+
+
+class _Echo:
+    """ File-like object whose write returns the value, for streaming csv rows """
+    def write(self, value):
+        return value
+
+
+def stream_boxes_csv(options:dict):
+    """ Yields every filtered box as CSV lines, reading the table in chunks with .iterator() """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for _, header in BOX_COLUMNS])
+
+    for row in filtered_boxes(options).values_list(*SORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([_display(value) for value in row])
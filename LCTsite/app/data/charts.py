@@ -0,0 +1,183 @@
+import json
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.models.functions import Substr
+
+from .analysis.models import BoxAnalysis, BoxFlavor, CanAnalysis, CanMeasurement, FlavorAnalysis, RawCan
+
+
+# chart datasets served from the precomputed DataAnalysis tables (see analysis/models.py)
+#   model: model the rows are read from
+#   columns: payload field -> field lookup (or expression) of the model, in payload order
+#   related: columns of a model in another database, matched on key = related_key (the ORM can't join
+#            across databases, so they are read in a second query); rows without a match get None
+#   filters: GET parameter -> field lookup it must equal
+CHART_DATASETS = {
+    'flavors': {
+        'model': FlavorAnalysis,
+        'columns': {
+            'flavor': 'flavor',
+            'total_purchased': 'total_purchased',
+            'average_drink_velocity': 'average_drink_velocity',
+            'average_time_to_start': 'average_time_to_start',
+            'average_finish_rate': 'average_finish_rate',
+            'average_pmr': 'average_pmr',
+            'average_pvr': 'average_pvr',
+        },
+        'filters': {'flavor': 'flavor'},
+        'order': ['flavor'],
+    },
+    'boxes': {
+        'model': BoxFlavor,
+        'columns': {
+            'box_id': 'id',
+            'flavor': 'flavor',
+            'location': 'box__location',
+            'purchase_date': Substr('box__purchase_date', 1, 10),
+            'start_date': Substr('start_date', 1, 10),
+            'finish_date': Substr('finish_date', 1, 10),
+        },
+        'related': {
+            'model': BoxAnalysis,
+            'key': 'id',
+            'related_key': 'box_id',
+            'columns': {
+                'time_to_start': 'time_to_start',
+                'drink_velocity': 'drink_velocity',
+                'completion_percentage': 'completion_percentage',
+            },
+        },
+        'filters': {'flavor': 'flavor', 'location': 'box__location', 'box': 'id'},
+        'order': ['box__purchase_date', 'id'],
+    },
+    'cans': {
+        'model': RawCan,
+        'columns': {
+            'can_id': 'id',
+            'box_id': 'box_id',
+            'flavor': 'box__flavor',
+        },
+        'related': {
+            'model': CanAnalysis,
+            'key': 'id',
+            'related_key': 'can_id',
+            'columns': {
+                'objective_finish_status': 'objective_finish_status',
+                'mass_difference': 'mass_difference',
+                'volume_difference': 'volume_difference',
+                'percentage_mass_remaining': 'percentage_mass_remaining',
+                'percentage_volume_remaining': 'percentage_volume_remaining',
+            },
+        },
+        'filters': {'flavor': 'box__flavor', 'box': 'box_id'},
+        'order': ['id'],
+    },
+    'can_measurements': {
+        'model': CanMeasurement,
+        'columns': {'parameters': 'parameters', 'value': 'value'},
+        'filters': {},
+        'order': ['parameters'],
+    },
+}
+
+# file listing the charts pre-rendered by the pipeline (see DataAnalysis/database/tools/charts.py)
+CHART_MANIFEST_FILE = 'manifest.json'
+
+# all functions pertaining to serving chart data
+
+class ChartDataError(Exception):
+    def __init__(self, message:str, status:int=400):
+        self.message = message
+        self.status = status
+        super().__init__(self.message)
+
+
+def dataset_fields(spec:dict) -> list[str]:
+    """ Payload fields of a dataset, its related columns last """
+    return list(spec['columns']) + list(spec.get('related', {}).get('columns', {}))
+
+
+def parse_fields(spec:dict, fields:str) -> list[str]:
+    """ Requested payload fields (comma separated), defaulting to every field of the dataset """
+    if not fields:
+        return dataset_fields(spec)
+
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    invalid = [field for field in requested if field not in dataset_fields(spec)]
+    if invalid:
+        raise ChartDataError(f'Invalid field(s): {invalid}. Expected from {dataset_fields(spec)}')
+    return requested
+
+
+def _related_values(related:dict, keys:list, fields:list[str]) -> dict[object, tuple]:
+    """ Related columns (in fields order) of the rows matching keys, by key """
+    model = related['model']
+    rows = model.objects.values_list(related['related_key'], *[related['columns'][field] for field in fields])
+
+    # a few keys (i.e. a filtered dataset) are looked up, otherwise the whole table is read once
+    if len(keys) <= connections[model.analysis_database].features.max_query_params:
+        rows = rows.filter(**{f'{related["related_key"]}__in': keys})
+    return {row[0]: row[1:] for row in rows}
+
+
+def chart_payload(dataset:str, params) -> dict:
+    """ Columnar payload of a chart dataset
+
+        Args:
+            dataset (str) : Name of the dataset in CHART_DATASETS
+            params (QueryDict) : GET parameters; fields (comma separated) plus the dataset's filters
+
+        Returns:
+            Dict with the dataset name, its fields, row count and one list of values per field
+    """
+    spec = CHART_DATASETS[dataset]
+    fields = parse_fields(spec, params.get('fields', ''))
+    related = spec.get('related')
+    related_fields = [field for field in fields if related and field in related['columns']]
+    model_fields = [field for field in fields if field in spec['columns']]
+
+    filters = {lookup: params[param] for param, lookup in spec['filters'].items() if params.get(param)}
+    lookups = [spec['columns'][field] for field in model_fields]
+    if related_fields:
+        lookups.append(related['key'])
+
+    try:
+        rows = list(spec['model'].objects.filter(**filters).order_by(*spec['order']).values_list(*lookups))
+        if related_fields:
+            matches = _related_values(related, [row[-1] for row in rows], related_fields)
+            missing = (None,) * len(related_fields)
+            rows = [row[:-1] + matches.get(row[-1], missing) for row in rows]
+    except OperationalError as e:
+        # analysis databases/tables that haven't been built yet
+        raise ChartDataError(f'{dataset} data is unavailable: {e}', status=503)
+
+    columns = dict(zip(model_fields + related_fields, zip(*rows))) if rows else {}
+    return {
+        'dataset': dataset,
+        'fields': fields,
+        'rows': len(rows),
+        'data': {field: list(columns.get(field, ())) for field in fields},
+    }
+
+
+def chart_images() -> tuple[list[dict], str|None]:
+    """ Pre-rendered charts in display order, with static paths of their svg/png files
+
+        Returns:
+            The charts (title and the svg/png files rendered) and when they were generated; no charts if none were rendered yet
+    """
+    try:
+        with open(settings.CHART_DIR / CHART_MANIFEST_FILE, 'r') as fn:
+            manifest = json.load(fn)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return [], None
+
+    images = []
+    for chart in manifest['charts'].values():
+        image = {'title': chart['title']}
+        for fmt in ('svg', 'png'):
+            if fmt in chart:
+                image[fmt] = f'{settings.CHART_STATIC_PREFIX}/{chart[fmt]}'
+        images.append(image)
+    return images, manifest['generated']
@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+
+from .versioning import current_version
+
+
+logger = logging.getLogger(__name__)
+
+# type of the combo pack rows in master.reference
+REFERENCE_PACK_TYPE = 'costco_pack'
+
+# all functions pertaining to combo pack lookups
+
+def _parse_flavors(flavors) -> tuple[str, ...]:
+    """ Pack flavors from a list or a '[BP, BRB, GSP]' string """
+    if isinstance(flavors, str):
+        flavors = flavors.strip('][').split(',')
+    return tuple(flavor.strip() for flavor in flavors if flavor.strip())
+
+
+class ComboPackRegistry:
+    """ Combo pack code -> flavor codes, loaded once and reloaded only when its sources change
+
+        Flavors come from the combos JSON file. If a reference database is given, the combo packs
+        listed in its reference table (type costco_pack) are included too. A pack known to the
+        DataAnalysis reference data but missing from the file has no flavors (and is logged), so
+        box uploads reject its rows (see upload.bd_formatter) instead of storing the pack code as
+        a flavor.
+
+        Each lookup only compares the file's modification time and the data version (which the
+        DataAnalysis pipeline bumps whenever it rewrites the reference table) with the loaded ones,
+        so unrelated writes to the reference database don't reload the packs.
+
+        Args:
+            path (str) : combos.json path
+            reference_db (str) : Optionally the master.db path
+    """
+    def __init__(self, path:str, reference_db:str|None=None):
+        self.path = str(path)
+        self.reference_db = str(reference_db) if reference_db else None
+        self._packs:dict[str, tuple[str, ...]] = {}
+        self._names:dict[str, str] = {}
+        self._signature:tuple|None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'ComboPackRegistry({self.path}, packs={list(self._packs)})'
+
+    def __contains__(self, code:str):
+        return code in self.packs()
+
+    @staticmethod
+    def _mtime(path:str|None) -> int|None:
+        if not path:
+            return None
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _current_signature(self) -> tuple:
+        return (self._mtime(self.path), current_version() if self.reference_db else None)
+
+    def packs(self) -> dict[str, tuple[str, ...]]:
+        """ Map of every pack code to its flavor codes """
+        signature = self._current_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._load()
+                    self._signature = signature
+        return self._packs
+
+    def flavors(self, code:str) -> tuple[str, ...]|None:
+        """ Flavor codes of a pack, or None if the code is not a pack """
+        return self.packs().get(code)
+
+    def name(self, code:str) -> str|None:
+        self.packs()
+        return self._names.get(code)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as fn:
+                packs = {code:_parse_flavors(flavors) for code, flavors in json.load(fn).items()}
+        except FileNotFoundError:
+            logger.warning('Combo pack file %s not found', self.path)
+            packs = {}
+
+        names = {}
+        if self.reference_db:
+            for code, name in self._reference_packs():
+                names[code] = name
+                if code not in packs:
+                    logger.warning('Combo pack %s (%s) has no flavors in %s', code, name, self.path)
+                    packs[code] = ()
+
+        self._packs, self._names = packs, names
+        return
+
+    def _reference_packs(self) -> list[tuple[str, str]]:
+        """ (abbreviation, description) of the combo packs in master.reference """
+        if self._mtime(self.reference_db) is None:
+            return []
+
+        conn = sqlite3.connect(f'file:{self.reference_db}?mode=ro', uri=True)
+        try:
+            return conn.execute('SELECT abbreviation, description FROM reference WHERE type = ?', (REFERENCE_PACK_TYPE,)).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning('Could not read combo packs from %s: %s', self.reference_db, e)
+            return []
+        finally:
+            conn.close()
+
+
+combo_packs = ComboPackRegistry(
+    settings.COMBO_PACKS_FILE,
+    settings.ANALYSIS_DB_DIR / 'master.db' if settings.COMBO_PACKS_FROM_REFERENCE else None
+)
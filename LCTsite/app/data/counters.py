@@ -0,0 +1,118 @@
+from typing import Callable
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from ..models import AbbreviationReferences, CanData, RawTracker
+
+
+# counter names stored in RawTracker.value; flavor counters use the flavor (or pack) code itself
+TOTAL_BOXES = 'TotalBoxes'
+TOTAL_CANS = 'TotalCans'
+TOTAL_ABBREVIATIONS = 'TotalAbbreviations'
+ABBREVIATION_TYPE_PREFIX = 'Abbreviations.'
+
+# all functions pertaining to atomic ID allocation
+
+def reserve(key:str, amount:int=1, *, initial:Callable[[], int]|None=None) -> int:
+    """ Atomically advances a counter by amount and returns the first number of the reserved block
+
+        The block is reserved with one UPDATE ... SET amount = amount + n statement, so concurrent
+        uploads always get disjoint blocks. A missing counter is created, starting from initial()
+        (i.e. a one time count of existing rows) or 0.
+
+        Args:
+            key (str) : Counter name
+            amount (int) : Size of the block to reserve
+            initial (Callable) : Returns the starting value of a counter that doesn't exist yet
+
+        Returns:
+            The first number of the block; the block is first .. first + amount - 1
+    """
+    assert amount > 0, f'Must reserve at least one ID, not {amount}'
+
+    with transaction.atomic():
+        if not RawTracker.objects.filter(value=key).update(amount=F('amount') + amount):
+            start = initial() if initial else 0
+            try:
+                with transaction.atomic():
+                    RawTracker.objects.create(value=key, amount=start + amount)
+            except IntegrityError:
+                # another upload created the counter first
+                RawTracker.objects.filter(value=key).update(amount=F('amount') + amount)
+
+        # the row stays locked by the update until the transaction ends
+        end = RawTracker.objects.values_list('amount', flat=True).get(value=key)
+
+    return end - amount + 1
+
+
+def reserve_many(amounts:dict[str, int], *, initial:dict[str, Callable[[], int]]|None=None) -> dict[str, int]:
+    """ Reserves blocks of several counters in one transaction (one statement per counter)
+
+        Counters are always locked in sorted order so concurrent reservations can't deadlock.
+
+        Returns:
+            Map of counter name to the first number of its block
+    """
+    initial = initial if initial else {}
+    with transaction.atomic():
+        return {key:reserve(key, amounts[key], initial=initial.get(key)) for key in sorted(amounts) if amounts[key] > 0}
+
+
+def current(key:str) -> int:
+    """ Last number handed out by a counter (0 if it doesn't exist yet) """
+    return RawTracker.objects.filter(value=key).values_list('amount', flat=True).first() or 0
+
+
+def next_box_id(flavor_code:str) -> str:
+    """ Reserves the next overall and per flavor box numbers and formats the box ID """
+    starts = reserve_many({TOTAL_BOXES: 1, flavor_code: 1})
+    return f'{starts[TOTAL_BOXES]}.{flavor_code}.{starts[flavor_code]}'
+
+
+def reserve_box_ids(flavor_codes:list[str]) -> list[str]:
+    """ Box IDs for consecutive box uploads, reserving every counter block at once
+
+        Equivalent to calling next_box_id for each flavor code in order.
+    """
+    amounts:dict[str, int] = {TOTAL_BOXES: len(flavor_codes)}
+    for code in flavor_codes:
+        amounts[code] = amounts.get(code, 0) + 1
+
+    next_numbers = reserve_many(amounts) if flavor_codes else {}
+
+    ids = []
+    for code in flavor_codes:
+        ids.append(f'{next_numbers[TOTAL_BOXES]}.{code}.{next_numbers[code]}')
+        next_numbers[TOTAL_BOXES] += 1
+        next_numbers[code] += 1
+    return ids
+
+
+def reserve_can_numbers(amount:int) -> int:
+    """ First of amount consecutive can numbers; the counter starts from the existing can count in older databases """
+    return reserve(TOTAL_CANS, amount, initial=CanData.objects.count)
+
+
+def reserve_abbreviation_uids(types:list[str]) -> list[str]:
+    """ Abbreviation uids (```<overall number>.<type>.<type number>```) for consecutive uploads
+
+        Counters missing from older databases start from the existing abbreviation counts.
+    """
+    amounts:dict[str, int] = {TOTAL_ABBREVIATIONS: len(types)}
+    initial:dict[str, Callable[[], int]] = {TOTAL_ABBREVIATIONS: AbbreviationReferences.objects.count}
+    for abbr_type in types:
+        key = f'{ABBREVIATION_TYPE_PREFIX}{abbr_type}'
+        amounts[key] = amounts.get(key, 0) + 1
+        initial[key] = AbbreviationReferences.objects.filter(uid__contains=abbr_type).count
+
+    next_numbers = reserve_many(amounts, initial=initial) if types else {}
+
+    uids = []
+    for abbr_type in types:
+        key = f'{ABBREVIATION_TYPE_PREFIX}{abbr_type}'
+        uids.append(f'{next_numbers[TOTAL_ABBREVIATIONS]}.{abbr_type}.{next_numbers[key]}')
+        next_numbers[TOTAL_ABBREVIATIONS] += 1
+        next_numbers[key] += 1
+    return uids
@@ -0,0 +1,167 @@
+import logging
+import subprocess
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ..models import BoxTracker, CanData, UploadJob
+from . import upload
+from .versioning import bump_data_version
+
+
+logger = logging.getLogger(__name__)
+
+# uploads are processed by a small pool of threads inside the web process
+_executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS, thread_name_prefix='upload')
+
+# pipeline runs after completed uploads are serialized, and uploads completing while a run is queued share it
+_pipeline_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-pipeline')
+_pipeline_lock = threading.Lock()
+_pipeline_queued = False
+
+# all functions pertaining to background upload jobs
+
+def submit_upload(kind:str, uploaded_file, box_bid:str='') -> UploadJob:
+    """ Stores an uploaded CSV and queues it for processing, returning right away
+
+        The job is handed to the worker pool once the transaction creating it commits.
+
+        Args:
+            kind (str) : boxes or cans
+            uploaded_file (UploadedFile) : The CSV file from the request
+            box_bid (str) : Box the cans belong to (cans only)
+
+        Returns:
+            The queued job
+    """
+    assert kind in dict(UploadJob.KINDS), f'Invalid upload kind: {kind}. Expected one from {list(dict(UploadJob.KINDS))}'
+    assert kind != 'cans' or box_bid, 'Can uploads require the box they belong to'
+
+    job = UploadJob.objects.create(kind=kind, file=uploaded_file, box_bid=box_bid, total_bytes=uploaded_file.size)
+    transaction.on_commit(lambda: _executor.submit(run_job, job.pk))
+    return job
+
+
+def run_job(job_id:int):
+    """ Parses and bulk inserts a job's CSV in batches, recording progress after each batch
+
+        The file is streamed rather than read whole, so total_rows is only known once the job is
+        complete; until then processed_rows and processed_bytes (of total_bytes) are the progress.
+        Each batch is committed on its own (so progress is visible and the database isn't locked for
+        the whole upload), and its rows are tagged with the job, so if a later batch fails the rows
+        already written are deleted and the file can be uploaded again without duplicating them.
+
+        Once rows are written the data version is bumped so cached pages and chart data are
+        recomputed, and a completed job queues UPLOAD_PIPELINE_COMMAND if enabled (see trigger_pipeline).
+    """
+    processed = 0
+    read_bytes = 0
+    try:
+        job = UploadJob.objects.get(pk=job_id)
+        UploadJob.objects.filter(pk=job_id).update(status='running', started=timezone.now())
+
+        def counted(chunks):
+            nonlocal read_bytes
+            for chunk in chunks:
+                read_bytes += len(chunk)
+                yield chunk
+
+        def record_progress(rows:int):
+            nonlocal processed
+            processed = rows
+            UploadJob.objects.filter(pk=job_id).update(processed_rows=rows, processed_bytes=read_bytes)
+
+        # the stored file is read and inserted a batch at a time (see upload.stream_upload)
+        try:
+            with job.file.open('rb') as fn:
+                total = upload.stream_upload(job.kind, counted(fn.chunks()), job.box_bid, settings.UPLOAD_BATCH_SIZE, record_progress, job)
+        except Exception:
+            if processed:
+                remove_job_rows(job)
+            raise
+
+        UploadJob.objects.filter(pk=job_id).update(status='complete', total_rows=total, processed_bytes=read_bytes, finished=timezone.now())
+        job.file.delete(save=False)
+
+    except Exception as e:
+        logger.error('Upload job %s failed: %r', job_id, e)
+        UploadJob.objects.filter(pk=job_id).update(status='failed', error=traceback.format_exc(), finished=timezone.now())
+
+    else:
+        if total:
+            trigger_pipeline()
+
+    finally:
+        # expire cached pages if any batch was written, even if the rows were removed again
+        if processed:
+            bump_data_version()
+        # each worker thread holds its own connection
+        connection.close()
+    return
+
+
+def remove_job_rows(job:UploadJob) -> int:
+    """ Deletes the boxes/cans written by a job, i.e. the finished batches of a failed job
+
+        A can job's box is only left marked as filled if other cans of it remain.
+
+        Returns:
+            Number of deleted boxes/cans
+    """
+    with transaction.atomic():
+        if job.kind == 'boxes':
+            removed, _ = BoxTracker.objects.filter(upload_job=job).delete()
+        else:
+            removed, _ = CanData.objects.filter(upload_job=job).delete()
+            BoxTracker.objects.filter(bid=job.box_bid).update(filled=Exists(CanData.objects.filter(bid=OuterRef('pk'))))
+
+    logger.info('Removed %s rows written by failed upload job %s', removed, job.pk)
+    return removed
+
+
+def trigger_pipeline() -> bool:
+    """ Queues a run of UPLOAD_PIPELINE_COMMAND (opt-in, see settings) after uploads
+
+        Runs are serialized in a single background thread. A run that is queued but not yet started
+        covers every upload completing until it starts, so bursts of uploads only trigger one more run.
+
+        Returns:
+            True if a new run was queued, False if one already was (or the command is disabled)
+    """
+    global _pipeline_queued
+
+    command = settings.UPLOAD_PIPELINE_COMMAND
+    if not command:
+        return False
+
+    with _pipeline_lock:
+        if _pipeline_queued:
+            return False
+        _pipeline_queued = True
+
+    _pipeline_executor.submit(_run_pipeline, [str(arg) for arg in command])
+    return True
+
+
+def _run_pipeline(command:list[str]):
+    global _pipeline_queued
+
+    # uploads completing from here on need another run
+    with _pipeline_lock:
+        _pipeline_queued = False
+
+    logger.info('Running %s after uploads', command)
+    try:
+        result = subprocess.run(command, cwd=settings.BASE_DIR.parent, capture_output=True, text=True)
+    except OSError as e:
+        logger.error('Could not run %s: %r', command, e)
+        return
+
+    if result.returncode:
+        logger.error('%s failed with exit code %s:\n%s', command, result.returncode, result.stderr[-4000:])
+    return
@@ -0,0 +1,155 @@
+import codecs
+import csv
+import zlib
+from collections.abc import Iterable, Iterator
+
+
+# first bytes of a gzip stream
+GZIP_MAGIC = b'\x1f\x8b'
+
+# most text produced by decompressing one piece of a gzip upload, and the longest CSV line accepted,
+# so a small upload can't expand into one huge buffer
+GUNZIP_CHUNK_SIZE = 64 * 1024
+MAX_LINE_LENGTH = 64 * 1024
+
+# columns every uploaded CSV must have
+BOX_COLUMNS = ('Flavor', 'Purchased', 'Price', 'Location', 'Started', 'Finished')
+CAN_COLUMNS = ('Can', 'Initial Mass', 'Initial Volumne', 'Final Mass', 'Final Volume', 'Finished')
+
+# all functions pertaining to reading uploaded CSVs a chunk at a time
+
+class UploadFormatError(ValueError):
+    """ Uploaded CSV that can't be read (bad encoding, compression or header) """
+
+
+def _gunzip(chunks:Iterator[bytes]) -> Iterator[bytes]:
+    """ Decompresses gzip chunks as they arrive (concatenated gzip members are read one after another)
+
+        Each piece returned is at most GUNZIP_CHUNK_SIZE bytes; input left over once a piece is full
+        is decompressed on the next round.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while True:
+            try:
+                data = decompressor.decompress(chunk, GUNZIP_CHUNK_SIZE)
+            except zlib.error as e:
+                raise UploadFormatError(f'Invalid gzip upload: {e}')
+            if data:
+                yield data
+            # a new member starts after the end of the current one
+            if decompressor.eof:
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                if not chunk:
+                    break
+                continue
+            chunk = decompressor.unconsumed_tail
+            # a full piece may leave output behind even once the input is used up
+            if not chunk and len(data) < GUNZIP_CHUNK_SIZE:
+                break
+
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def decoded_chunks(chunks:Iterable[bytes], encoding:str='utf-8') -> Iterator[str]:
+    """ Text of a (possibly gzip compressed) upload, decoded incrementally
+
+        Only the first chunk is inspected to detect compression, so a gzip file can be uploaded
+        with any name. A leading UTF-8 BOM is dropped.
+
+        Args:
+            chunks (Iterable[bytes]) : The upload's chunks, i.e. UploadedFile.chunks()
+            encoding (str) : Text encoding of the CSV
+
+        Returns:
+            Iterator over text chunks
+    """
+    # only the first chunk(s) needed to see the gzip magic are read ahead
+    chunks = iter(chunks)
+    first = b''
+    for chunk in chunks:
+        first += chunk
+        if len(first) >= len(GZIP_MAGIC):
+            break
+    if not first:
+        return
+
+    def restored():
+        yield first
+        yield from chunks
+
+    raw = _gunzip(restored()) if first.startswith(GZIP_MAGIC) else restored()
+    decoder = codecs.getincrementaldecoder('utf-8-sig' if encoding.lower().replace('_', '-') == 'utf-8' else encoding)()
+    try:
+        for chunk in raw:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise UploadFormatError(f'Upload is not valid {encoding}: {e}')
+    if text:
+        yield text
+
+
+def iter_lines(text_chunks:Iterable[str], max_line_length:int=MAX_LINE_LENGTH) -> Iterator[str]:
+    """ Lines (with their line endings, as csv.reader expects) of chunked text
+
+        Only the line being completed is buffered, not the text seen so far, and a line longer than
+        max_line_length raises UploadFormatError instead of growing the buffer.
+    """
+    pending = ''
+    for chunk in text_chunks:
+        pending += chunk
+        start = 0
+        end = pending.find('\n')
+        while end != -1:
+            if end + 1 - start > max_line_length:
+                raise UploadFormatError(f'Upload has a line longer than {max_line_length} characters')
+            yield pending[start:end + 1]
+            start = end + 1
+            end = pending.find('\n', start)
+        pending = pending[start:]
+        if len(pending) > max_line_length:
+            raise UploadFormatError(f'Upload has a line longer than {max_line_length} characters')
+    if pending:
+        yield pending
+
+
+def iter_row_batches(chunks:Iterable[bytes], required_columns:Iterable[str], batch_size:int, encoding:str='utf-8') -> Iterator[list[dict]]:
+    """ Rows of an uploaded CSV in lists of at most batch_size, read a chunk at a time
+
+        The header is checked against the required columns before any rows are returned. Blank
+        lines are skipped. At most one batch, the line being read and one chunk are held in memory,
+        so each batch can be inserted while the rest of the file is still being read.
+
+        Args:
+            chunks (Iterable[bytes]) : The upload's chunks, i.e. UploadedFile.chunks()
+            required_columns (Iterable[str]) : Header names the CSV must have (see BOX_COLUMNS/CAN_COLUMNS)
+            batch_size (int) : Number of rows in each batch
+            encoding (str) : Text encoding of the CSV
+
+        Returns:
+            Iterator over lists of row dictionaries (header -> value)
+    """
+    assert batch_size > 0, f'Invalid batch size: {batch_size}'
+
+    reader = csv.DictReader(iter_lines(decoded_chunks(chunks, encoding)))
+    header = reader.fieldnames
+    if header is None:
+        return
+    missing = [column for column in required_columns if column not in header]
+    if missing:
+        raise UploadFormatError(f'Upload is missing the columns {missing} (found {header})')
+
+    batch:list[dict] = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
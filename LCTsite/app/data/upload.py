@@ -1,9 +1,21 @@
-import json
+import csv
+import datetime
+from collections.abc import Callable, Iterable
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from ..models import BoxTracker, CanData, UploadJob
+from . import counters, streaming
+from .combos import combo_packs
 
 
-COMBO_PACKS = r'app\data\combos.json'
 FLVR_AMT_VERIFICATION = 7 # TODO: Must increase value by 1 once >999 entries
 
+# uploaded CSVs write dates as MM/DD/YYYY and missing values as NA (or leave them empty)
+UPLOAD_DATE_FORMAT = '%m/%d/%Y'
+MISSING_VALUES = ('', 'NA')
+
 # all functions pertaining to data handling during model/DB uploads
 
 def bid_generator(current_boxes:list, flavor:str) -> str:
@@ -31,30 +43,200 @@ def percent_loss_calculator(initial, final):
         f = float(final)
         return round((f / i)*100, 3)
     
-def bd_formatter(bid, flavor_code:str) -> list:
-    """ Handles Flavor and UID processing, returns list of tuples (BID, flavor) to upload """
-    pack_list = _pack_abbreviations()
+def bd_formatter(bid, flavor_code:str, pack_list:dict[str, tuple[str, ...]]|None=None) -> list:
+    """ Handles Flavor and UID processing, returns list of tuples (BID, flavor) to upload 
+    
+        pack_list (pack code -> flavor codes) can be passed in to look the packs up once per upload.
+        Raises ValueError for a known pack without flavors (see combos.ComboPackRegistry).
+    """
+    pack_list = pack_list if pack_list is not None else _pack_abbreviations()
+
+    if flavor_code in pack_list and not pack_list[flavor_code]:
+        raise ValueError(f'Combo pack {flavor_code} has no flavors in the combo pack file')
 
-    if flavor_code in pack_list:
+    if pack_list.get(flavor_code):
         # new_bid = update_bid(bid) 
         bid += "."
-        flavor_list = pack_list[flavor_code].strip('][').split(', ')
         # updates BID with individual flavor abbreviations
-        return [(bid+flavor, flavor) for flavor in flavor_list]
+        return [(bid+flavor, flavor) for flavor in pack_list[flavor_code]]
     else:
         return [(bid, flavor_code)]
             
 
+def percent_loss_column(initial:list[str], final:list[str]) -> list[float|None]:
+    """ percent_loss_calculator over whole columns; None where either value is missing (see parse_number) or the initial value is 0 """
+    percentages = []
+    for i, f in zip(initial, final):
+        i, f = parse_number(i), parse_number(f)
+        percentages.append(round((f / i)*100, 3) if i and f is not None else None)
+    return percentages
+
+
+def parse_date(value:str) -> datetime.date|None:
+    """ Date of an uploaded MM/DD/YYYY value (None if missing) """
+    if value is None or value.strip() in MISSING_VALUES:
+        return None
+    return datetime.datetime.strptime(value.strip(), UPLOAD_DATE_FORMAT).date()
+
+
+def parse_price(value:str) -> Decimal|None:
+    """ Price of an uploaded value, i.e. 5.99 or $5.99 (None if missing) """
+    if value is None or value.strip() in MISSING_VALUES:
+        return None
+    try:
+        return Decimal(value.strip().lstrip('$')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'Invalid price: {value}')
+
+
+def parse_number(value:str) -> float|None:
+    """ Mass/volume of an uploaded value (None if missing) """
+    if value is None or value.strip() in MISSING_VALUES:
+        return None
+    return float(value)
+
+
+def bulk_upload_boxes(csv_lines:list[str]) -> list[BoxTracker]:
+    """ Uploads a box data CSV (Flavor, Purchased, Price, Location, Started, Finished) in one transaction
+
+        Returns:
+            The created boxes
+    """
+    return upload_box_rows(list(csv.DictReader(csv_lines)))
+
+
+def upload_box_rows(rows:list[dict], upload_job:UploadJob|None=None) -> list[BoxTracker]:
+    """ Uploads parsed box data rows in one transaction
+
+        Box IDs for every row are reserved up front as counter blocks (see counters.reserve_box_ids),
+        and the boxes are written with a single bulk_create. Boxes written by a background job are
+        tagged with it (upload_job), so a failed job's rows can be removed.
+
+        Returns:
+            The created boxes
+    """
+    if not rows:
+        return []
+
+    pack_list = _pack_abbreviations()
+
+    with transaction.atomic():
+        box_ids = counters.reserve_box_ids([box['Flavor'] for box in rows])
+
+        new_boxes:list[BoxTracker] = []
+        for box_id, box in zip(box_ids, rows):
+            purchased, price = parse_date(box['Purchased']), parse_price(box['Price'])
+            started, finished = parse_date(box['Started']), parse_date(box['Finished'])
+            for bid, flavor_code in bd_formatter(box_id, box['Flavor'], pack_list):
+                # eventually, start and finish dates will also be flavor specific
+                new_boxes.append(BoxTracker(bid=bid, flavor=flavor_code, purchase_date=purchased, price=price, location=box['Location'], started=started, finished=finished, contributing=False, filled=False, upload_job=upload_job))
+
+        created = BoxTracker.objects.bulk_create(new_boxes)
+
+    return created
+
+
+def bulk_upload_cans(csv_lines:list[str], box_bid:str) -> list[CanData]:
+    """ Uploads a can data CSV for one box in one transaction and marks the box as filled
+
+        Returns:
+            The created cans
+    """
+    return upload_can_rows(list(csv.DictReader(csv_lines)), box_bid)
+
+
+def upload_can_rows(rows:list[dict], box_bid:str, upload_job:UploadJob|None=None) -> list[CanData]:
+    """ Uploads parsed can data rows for one box in one transaction and marks the box as filled
+
+        Can numbers are reserved as one counter block (see counters.reserve_can_numbers), so
+        concurrent uploads never share a can ID. Cans written by a background job are tagged with it.
+
+        Returns:
+            The created cans
+    """
+    if not rows:
+        return []
+
+    columns = {header:[can[header] for can in rows] for header in rows[0]}
+    plm = percent_loss_column(columns['Initial Mass'], columns['Final Mass'])
+    plv = percent_loss_column(columns['Initial Volumne'], columns['Final Volume'])
+
+    with transaction.atomic():
+        box = BoxTracker.objects.select_for_update().get(bid=box_bid)
+        first_number = counters.reserve_can_numbers(len(rows))
+
+        new_cans = [
+            CanData(
+                cid=f'{first_number + idx}.CD.{can}',
+                bid=box,
+                initial_grams=parse_number(columns['Initial Mass'][idx]),
+                initial_floz=parse_number(columns['Initial Volumne'][idx]),
+                final_grams=parse_number(columns['Final Mass'][idx]),
+                final_floz=parse_number(columns['Final Volume'][idx]),
+                finished=columns['Finished'][idx],
+                percent_remaining_g=plm[idx],
+                percent_remaining_floz=plv[idx],
+                upload_job=upload_job
+            )
+            for idx, can in enumerate(columns['Can'])
+        ]
+        created = CanData.objects.bulk_create(new_cans)
+
+        box.filled = True
+        box.save(update_fields=['filled'])
+
+    return created
+
+
+def stream_upload(kind:str, chunks:Iterable[bytes], box_bid:str='', batch_size:int=500, on_batch:Callable[[int], None]|None=None, upload_job:UploadJob|None=None) -> int:
+    """ Uploads a box/can CSV (optionally gzip compressed) a batch at a time as it is read
+
+        Rows are read from the chunks through an incremental decoder (see streaming.iter_row_batches)
+        and validated and inserted a batch at a time, so memory does not grow with the file. Each batch
+        is written atomically, and the first bad row raises UploadFormatError and stops the upload.
+
+        Batches already written are left to the caller: insert_data runs the whole upload in one
+        transaction, so a bad row rejects the whole file, and background jobs commit each batch (so
+        progress is visible) and delete every row of a failed job (see jobs.run_job).
+
+        Args:
+            kind (str) : boxes or cans
+            chunks (Iterable[bytes]) : The upload's chunks, i.e. UploadedFile.chunks()
+            box_bid (str) : Box the cans belong to (cans only)
+            batch_size (int) : Number of CSV rows validated and inserted at a time
+            on_batch (Callable) : Called with the number of rows written so far after each batch
+            upload_job (UploadJob) : Background job the rows are written by (see jobs.run_job)
+
+        Returns:
+            Number of CSV rows uploaded
+    """
+    assert kind in ('boxes', 'cans'), f'Invalid upload kind: {kind}. Expected one from {["boxes", "cans"]}'
+
+    columns = streaming.BOX_COLUMNS if kind == 'boxes' else streaming.CAN_COLUMNS
+    processed = 0
+    for batch in streaming.iter_row_batches(chunks, columns, batch_size):
+        try:
+            if kind == 'boxes':
+                upload_box_rows(batch, upload_job)
+            else:
+                upload_can_rows(batch, box_bid, upload_job)
+        except ValueError as e:
+            raise streaming.UploadFormatError(f'Rows {processed + 1}-{processed + len(batch)}: {e}') from e
+        processed += len(batch)
+        if on_batch is not None:
+            on_batch(processed)
+    return processed
+
+
 def update_bid(id:str):
     """ Fixes flavor amount tracking to not include flavors within combo packs and formats for combo specific ID"""
     pass
 
 
     
-def _pack_abbreviations():
-    """ Grabs associated flavors for combo packs, identified by the Pack Abbreviation """
-    with open(COMBO_PACKS, 'r') as fn:
-        return json.load(fn)
+def _pack_abbreviations() -> dict[str, tuple[str, ...]]:
+    """ Grabs associated flavors for combo packs, identified by the Pack Abbreviation (see combos.ComboPackRegistry) """
+    return combo_packs.packs()
     
 def abbreviation_uid_generator(total_length, type_length, type) -> str:
     new_type = int(type_length) + 1
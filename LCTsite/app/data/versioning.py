@@ -0,0 +1,151 @@
+import datetime
+import functools
+import hashlib
+import importlib.util
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+
+PAGE_CACHE_PREFIX = 'page'
+FRAGMENT_CACHE_PREFIX = 'fragment'
+
+# (mtime_ns, version) of the last read of the version file
+_last_read:tuple[int, int]|None = None
+
+
+def _load_shared_versioning():
+    """ DataAnalysis/data_version.py, loaded by path so the DataAnalysis package (pandas, logging config) isn't imported """
+    spec = importlib.util.spec_from_file_location('lct_data_version', settings.ANALYSIS_DIR / 'data_version.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# the counter is incremented by the same implementation as the pipeline's bump_data_version
+_shared_versioning = _load_shared_versioning()
+
+# all functions pertaining to the data version and the caches keyed on it
+
+def _version_file() -> str:
+    return str(settings.DATA_VERSION_FILE)
+
+
+def _file_state() -> tuple[int, int]:
+    """ (mtime_ns, counter) of the version file, re-reading the counter only when the file changed """
+    global _last_read
+
+    try:
+        mtime_ns = os.stat(_version_file()).st_mtime_ns
+    except FileNotFoundError:
+        return 0, 0
+
+    if _last_read is None or _last_read[0] != mtime_ns:
+        try:
+            with open(_version_file(), 'r') as fn:
+                _last_read = (mtime_ns, int(fn.read().strip() or 0))
+        except (FileNotFoundError, ValueError):
+            _last_read = (mtime_ns, 0)
+    return _last_read
+
+
+def current_version() -> str:
+    """ Current data version, shared by every web process and the DataAnalysis pipeline
+
+        The counter is combined with the file's modification time, so a version file recreated
+        with a number seen before (i.e. with the databases) still produces a new version.
+    """
+    mtime_ns, counter = _file_state()
+    return f'{counter}-{mtime_ns:x}'
+
+
+def last_modified() -> datetime.datetime|None:
+    """ Time of the last data change (None before the first one) """
+    mtime_ns, _ = _file_state()
+    if not mtime_ns:
+        return None
+    return datetime.datetime.fromtimestamp(mtime_ns / 1e9, tz=datetime.timezone.utc)
+
+
+def bump_data_version() -> str:
+    """ Advances the data version after uploads, expiring every cached page and fragment
+
+        The counter is incremented under the same file lock as the DataAnalysis pipeline's bumps.
+    """
+    _shared_versioning.bump_version_file(_version_file())
+    return current_version()
+
+
+def get_or_set_versioned(name:str, builder, timeout:int|None=None):
+    """ Cached value of builder() for the current data version (i.e. for expensive page fragments)
+
+        Args:
+            name (str) : Unique name of the fragment
+            builder (Callable) : Returns the value; only called on a cache miss
+            timeout (int) : Cache timeout in seconds. Default is None, which uses the cache's default
+
+        Returns:
+            The cached or newly built value
+    """
+    key = f'{FRAGMENT_CACHE_PREFIX}:{current_version()}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+def _etag(request, *args, **kwargs) -> str:
+    return hashlib.md5(f'{current_version()}:{request.get_full_path()}'.encode()).hexdigest()
+
+
+def _last_modified(request, *args, **kwargs) -> datetime.datetime|None:
+    return last_modified()
+
+
+def _csrf_key(request) -> str:
+    secret = request.META.get('CSRF_COOKIE', '')
+    return hashlib.md5(secret.encode()).hexdigest()
+
+
+def versioned_page(view):
+    """ Caches a page's response until the data version changes, and answers revalidations with 304
+
+        Responses carry an ETag and Last-Modified derived from the data version, so a client holding
+        the current page gets a 304 without the view running. Otherwise a GET/HEAD is served from the
+        cache if the page was already rendered for this data version; neither touches the database.
+
+        Pages rendering a CSRF token are cached per CSRF cookie, since the token is tied to it, and
+        are not cached for clients that don't have the cookie yet.
+    """
+    @functools.wraps(view)
+    def cached_view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        key = f'{PAGE_CACHE_PREFIX}:{current_version()}:{request.get_full_path()}'
+        entry = cache.get(key)
+        if entry is not None and entry.get('per_csrf_cookie'):
+            entry = cache.get(f'{key}:{_csrf_key(request)}') if request.META.get('CSRF_COOKIE') else None
+
+        if entry is not None:
+            return HttpResponse(entry['content'], content_type=entry['content_type'])
+
+        had_csrf_cookie = bool(request.META.get('CSRF_COOKIE'))
+        response = view(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+
+        entry = {'content': response.content, 'content_type': response['Content-Type']}
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            # the page contains a CSRF token
+            cache.set(key, {'per_csrf_cookie': True})
+            if had_csrf_cookie:
+                cache.set(f'{key}:{_csrf_key(request)}', entry)
+        else:
+            cache.set(key, entry)
+        return response
+
+    return condition(etag_func=_etag, last_modified_func=_last_modified)(cached_view)
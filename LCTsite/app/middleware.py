@@ -0,0 +1,166 @@
+import heapq
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# longest SQL text kept for a slow statement
+MAX_SQL_LENGTH = 300
+
+# all functions pertaining to per-request query and latency metrics
+
+class QueryRecorder:
+    """ Database execute wrapper counting and timing every statement of a request
+
+        Only the SQL text of the slowest statements is kept, never their parameters.
+    """
+    def __init__(self, slowest:int):
+        self.slowest_count = slowest
+        self.count = 0
+        self.duration = 0.0
+        self.statements:set[str] = set()
+        # min-heap of (duration, sql), so the fastest of the kept statements is replaced first
+        self._slowest:list[tuple[float, str]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.statements.add(sql)
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, (duration, sql[:MAX_SQL_LENGTH]))
+            elif self._slowest and duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (duration, sql[:MAX_SQL_LENGTH]))
+
+    @property
+    def duplicates(self) -> int:
+        """ Statements that repeated an earlier statement's SQL (with any parameters), the mark of an N+1 """
+        return self.count - len(self.statements)
+
+    def slowest(self) -> list[tuple[float, str]]:
+        """ (ms, sql) of the slowest statements, slowest first """
+        return [(round(duration * 1000, 3), sql) for duration, sql in sorted(self._slowest, reverse=True)]
+
+
+class RequestMetricsStore:
+    """ Rolling in-memory window of the latest requests of each view (per process)
+
+        Args:
+            window (int) : Number of requests kept per view
+            slowest (int) : Number of slowest statements kept per view
+    """
+    def __init__(self, window:int, slowest:int):
+        self.window = window
+        self.slowest_count = slowest
+        self._lock = threading.Lock()
+        self._samples:dict[str, deque] = {}
+        self._totals:dict[str, int] = {}
+        self._over_budget:dict[str, int] = {}
+        self._slowest:dict[str, list[tuple[float, str]]] = {}
+
+    def record(self, view:str, sample:dict, slowest:list[tuple[float, str]], over_budget:bool):
+        with self._lock:
+            self._samples.setdefault(view, deque(maxlen=self.window)).append(sample)
+            self._totals[view] = self._totals.get(view, 0) + 1
+            self._over_budget[view] = self._over_budget.get(view, 0) + over_budget
+            statements = self._slowest.get(view, []) + slowest
+            self._slowest[view] = sorted(statements, reverse=True)[:self.slowest_count]
+
+    def reset(self):
+        with self._lock:
+            self._samples, self._totals, self._over_budget, self._slowest = {}, {}, {}, {}
+
+    def summary(self) -> list[dict]:
+        """ Latency and query statistics of every view over its window, slowest p95 first """
+        with self._lock:
+            views = {view:list(samples) for view, samples in self._samples.items()}
+            totals, over_budget = dict(self._totals), dict(self._over_budget)
+            slowest = {view:list(statements) for view, statements in self._slowest.items()}
+
+        summary = []
+        for view, samples in views.items():
+            latencies = sorted(sample['ms'] for sample in samples)
+            queries = [sample['queries'] for sample in samples]
+            summary.append({
+                'view': view,
+                'requests': totals[view],
+                'window': len(samples),
+                'p50_ms': round(_percentile(latencies, 50), 3),
+                'p95_ms': round(_percentile(latencies, 95), 3),
+                'max_ms': round(latencies[-1], 3),
+                'mean_db_ms': round(statistics.fmean(sample['db_ms'] for sample in samples), 3),
+                'mean_queries': round(statistics.fmean(queries), 1),
+                'max_queries': max(queries),
+                'max_duplicates': max(sample['duplicates'] for sample in samples),
+                'over_budget': over_budget[view],
+                'slowest': slowest[view],
+            })
+        return sorted(summary, key=lambda row: row['p95_ms'], reverse=True)
+
+
+def _percentile(ordered:list[float], pct:int) -> float:
+    """ Nearest-rank percentile of sorted values """
+    return ordered[max(round(pct / 100 * len(ordered)) - 1, 0)]
+
+
+request_metrics = RequestMetricsStore(settings.REQUEST_METRICS_WINDOW, settings.REQUEST_METRICS_SLOWEST)
+
+
+def view_budget(view:str) -> dict:
+    """ Query and latency budget of a view (see settings.REQUEST_BUDGETS) """
+    return {**settings.REQUEST_BUDGETS['default'], **settings.REQUEST_BUDGETS.get(view, {})}
+
+
+class RequestMetricsMiddleware:
+    """ Counts and times the SQL statements of every request (enabled by settings.REQUEST_METRICS)
+
+        Each response gets a Server-Timing header (db time and query count, view time), each
+        request is added to request_metrics (shown by the request_metrics view), and requests over
+        their view's budget are logged with their slowest statements. Statements run while a
+        streaming response is consumed are not counted.
+    """
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(settings.REQUEST_METRICS_SLOWEST)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        response['Server-Timing'] = f'db;dur={db_ms:.3f};desc="{recorder.count} queries", view;dur={elapsed:.3f}'
+
+        match = request.resolver_match
+        view = match.url_name or match.view_name if match else 'unresolved'
+        sample = {'ms': elapsed, 'db_ms': db_ms, 'queries': recorder.count, 'duplicates': recorder.duplicates}
+
+        budget = view_budget(view)
+        over_budget = recorder.count > budget['queries'] or elapsed > budget['ms']
+        if over_budget:
+            logger.warning(
+                '%s %s (%s) over budget: %.1f ms (budget %s), %d queries (budget %s, %d repeated), slowest: %s',
+                request.method, request.path, view, elapsed, budget['ms'], recorder.count, budget['queries'], recorder.duplicates, recorder.slowest()
+            )
+
+        request_metrics.record(view, sample, recorder.slowest(), over_budget)
+        return response
@@ -0,0 +1,182 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_uploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoxAnalysis',
+            fields=[
+                ('box_id', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('time_to_start', models.IntegerField(null=True)),
+                ('drink_velocity', models.IntegerField(null=True)),
+                ('completion_percentage', models.FloatField(null=True)),
+                ('average_pmr', models.FloatField(null=True)),
+                ('average_pvr', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'box_analysis',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BoxFlavor',
+            fields=[
+                ('id', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('flavor', models.CharField(max_length=5, null=True)),
+                ('start_date', models.DateField(null=True)),
+                ('finish_date', models.DateField(null=True)),
+                ('has_cans', models.BooleanField(null=True)),
+            ],
+            options={
+                'db_table': 'box_flavors',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BoxPurchase',
+            fields=[
+                ('id', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('purchase_date', models.DateField(null=True)),
+                ('price', models.FloatField(null=True)),
+                ('location', models.CharField(max_length=5, null=True)),
+                ('profile_id', models.TextField(null=True)),
+            ],
+            options={
+                'db_table': 'box_purchases',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CanAnalysis',
+            fields=[
+                ('can_id', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('objective_finish_status', models.BooleanField(null=True)),
+                ('mass_difference', models.FloatField(null=True)),
+                ('true_mass_difference', models.FloatField(null=True)),
+                ('true_volume_difference', models.FloatField(null=True)),
+                ('volume_difference', models.FloatField(null=True)),
+                ('percentage_mass_remaining', models.FloatField(null=True)),
+                ('percentage_volume_remaining', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'can_analysis',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CanMeasurement',
+            fields=[
+                ('parameters', models.TextField(primary_key=True, serialize=False)),
+                ('value', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'can_measurements',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsumptionSeries',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('cans', models.FloatField(null=True)),
+                ('cumulative_cans', models.FloatField(null=True)),
+                ('rolling_7', models.FloatField(null=True)),
+                ('rolling_30', models.FloatField(null=True)),
+                ('rolling_90', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'consumption_series',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DistributionSketch',
+            fields=[
+                ('id', models.TextField(primary_key=True, serialize=False)),
+                ('scope', models.CharField(max_length=8)),
+                ('key', models.CharField(max_length=5)),
+                ('metric', models.CharField(max_length=3)),
+                ('count', models.IntegerField(null=True)),
+                ('sketch', models.BinaryField(null=True)),
+            ],
+            options={
+                'db_table': 'distribution_sketches',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FlavorAnalysis',
+            fields=[
+                ('flavor', models.CharField(max_length=5, primary_key=True, serialize=False)),
+                ('total_purchased', models.IntegerField(null=True)),
+                ('average_drink_velocity', models.FloatField(null=True)),
+                ('average_time_to_start', models.FloatField(null=True)),
+                ('average_finish_rate', models.FloatField(null=True)),
+                ('average_pmr', models.FloatField(null=True)),
+                ('average_pvr', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'flavor_analysis',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RawCan',
+            fields=[
+                ('id', models.TextField(primary_key=True, serialize=False)),
+                ('profile_id', models.CharField(max_length=7, null=True)),
+                ('initial_mass', models.IntegerField(null=True)),
+                ('initial_volume', models.FloatField(null=True)),
+                ('final_mass', models.IntegerField(null=True)),
+                ('final_volume', models.FloatField(null=True)),
+                ('empty_can_mass', models.FloatField(null=True)),
+                ('finish_status', models.CharField(max_length=3, null=True)),
+            ],
+            options={
+                'db_table': 'can_data',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCube',
+            fields=[
+                ('id', models.TextField(primary_key=True, serialize=False)),
+                ('period_type', models.CharField(max_length=7)),
+                ('period', models.CharField(max_length=7)),
+                ('flavor', models.CharField(max_length=5)),
+                ('location', models.CharField(max_length=5)),
+                ('box_count', models.IntegerField(null=True)),
+                ('price_count', models.IntegerField(null=True)),
+                ('total_spend', models.FloatField(null=True)),
+                ('dv_sum', models.FloatField(null=True)),
+                ('dv_count', models.IntegerField(null=True)),
+                ('tts_sum', models.FloatField(null=True)),
+                ('tts_count', models.IntegerField(null=True)),
+                ('finish_sum', models.FloatField(null=True)),
+                ('finish_count', models.IntegerField(null=True)),
+                ('pmr_sum', models.FloatField(null=True)),
+                ('pmr_count', models.IntegerField(null=True)),
+                ('pvr_sum', models.FloatField(null=True)),
+                ('pvr_count', models.IntegerField(null=True)),
+            ],
+            options={
+                'db_table': 'rollup_cube',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
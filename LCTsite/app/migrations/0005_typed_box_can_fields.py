@@ -0,0 +1,130 @@
+import datetime
+import decimal
+
+from django.db import migrations, models
+
+
+# format of the dates stored as text before this migration; missing values were 'NA' or empty
+TEXT_DATE_FORMAT = '%m/%d/%Y'
+MISSING_VALUES = ('', 'NA')
+
+BOX_DATE_FIELDS = ('purchase_date', 'started', 'finished')
+CAN_NUMBER_FIELDS = ('initial_grams', 'initial_floz', 'final_grams', 'final_floz', 'percent_remaining_g', 'percent_remaining_floz')
+
+
+def _iso_date(value):
+    if value is None or value.strip() in MISSING_VALUES:
+        return None
+    try:
+        return datetime.datetime.strptime(value.strip(), TEXT_DATE_FORMAT).date().isoformat()
+    except ValueError:
+        return None
+
+
+def _decimal(value):
+    if value is None or value.strip() in MISSING_VALUES:
+        return None
+    try:
+        return str(decimal.Decimal(value.strip().lstrip('$')).quantize(decimal.Decimal('0.01')))
+    except decimal.InvalidOperation:
+        return None
+
+
+def _float(value):
+    if value is None or value.strip() in MISSING_VALUES:
+        return None
+    try:
+        return str(float(value))
+    except ValueError:
+        return None
+
+
+def text_to_typed(apps, schema_editor):
+    """ Rewrites the text values in formats the typed columns read (ISO dates, plain numbers, NULL) """
+    BoxTracker = apps.get_model('app', 'BoxTracker')
+    CanData = apps.get_model('app', 'CanData')
+
+    boxes = list(BoxTracker.objects.all())
+    for box in boxes:
+        for field in BOX_DATE_FIELDS:
+            setattr(box, field, _iso_date(getattr(box, field)))
+        box.price = _decimal(box.price)
+    BoxTracker.objects.bulk_update(boxes, [*BOX_DATE_FIELDS, 'price'], batch_size=500)
+
+    cans = list(CanData.objects.all())
+    for can in cans:
+        for field in CAN_NUMBER_FIELDS:
+            setattr(can, field, _float(getattr(can, field)))
+    CanData.objects.bulk_update(cans, list(CAN_NUMBER_FIELDS), batch_size=500)
+
+
+def typed_to_text(apps, schema_editor):
+    BoxTracker = apps.get_model('app', 'BoxTracker')
+    CanData = apps.get_model('app', 'CanData')
+
+    boxes = list(BoxTracker.objects.all())
+    for box in boxes:
+        for field in BOX_DATE_FIELDS:
+            value = getattr(box, field)
+            setattr(box, field, datetime.date.fromisoformat(value).strftime(TEXT_DATE_FORMAT) if value else 'NA')
+        box.price = box.price if box.price is not None else ''
+    BoxTracker.objects.bulk_update(boxes, [*BOX_DATE_FIELDS, 'price'], batch_size=500)
+
+    cans = list(CanData.objects.all())
+    for can in cans:
+        for field in CAN_NUMBER_FIELDS:
+            value = getattr(can, field)
+            setattr(can, field, value if value is not None else '')
+    CanData.objects.bulk_update(cans, list(CAN_NUMBER_FIELDS), batch_size=500)
+
+
+def _nullable_text(max_length:int):
+    return models.CharField(max_length=max_length, null=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_analysis_models'),
+    ]
+
+    # text columns are first made nullable and rewritten, then converted to their types
+    operations = [
+        *[migrations.AlterField(model_name='boxtracker', name=field, field=_nullable_text(15)) for field in BOX_DATE_FIELDS],
+        migrations.AlterField(model_name='boxtracker', name='price', field=_nullable_text(10)),
+        *[migrations.AlterField(model_name='candata', name=field, field=_nullable_text(24)) for field in CAN_NUMBER_FIELDS],
+
+        migrations.RunPython(text_to_typed, typed_to_text),
+
+        migrations.AlterField(
+            model_name='boxtracker',
+            name='bid',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='boxtracker',
+            name='flavor',
+            field=models.CharField(db_index=True, max_length=25),
+        ),
+        migrations.AlterField(
+            model_name='boxtracker',
+            name='purchase_date',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='boxtracker',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=7, null=True),
+        ),
+        migrations.AlterField(
+            model_name='boxtracker',
+            name='started',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='boxtracker',
+            name='finished',
+            field=models.DateField(null=True),
+        ),
+        *[migrations.AlterField(model_name='candata', name=field, field=models.FloatField(null=True)) for field in CAN_NUMBER_FIELDS],
+    ]
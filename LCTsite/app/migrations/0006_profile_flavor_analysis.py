@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_typed_box_can_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileFlavorAnalysis',
+            fields=[
+                ('id', models.TextField(primary_key=True, serialize=False)),
+                ('profile_id', models.TextField()),
+                ('flavor', models.CharField(max_length=5)),
+                ('total_purchased', models.IntegerField(null=True)),
+                ('average_drink_velocity', models.FloatField(null=True)),
+                ('average_time_to_start', models.FloatField(null=True)),
+                ('average_finish_rate', models.FloatField(null=True)),
+                ('average_pmr', models.FloatField(null=True)),
+                ('average_pvr', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'profile_flavor_analysis',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_profile_flavor_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('name', models.TextField(null=True)),
+                ('total_boxes', models.IntegerField(null=True)),
+                ('total_price_spent', models.FloatField(null=True)),
+                ('average_price', models.FloatField(null=True)),
+                ('average_dv', models.FloatField(null=True)),
+                ('average_tts', models.FloatField(null=True)),
+                ('average_finish_rate', models.FloatField(null=True)),
+                ('average_pmr', models.FloatField(null=True)),
+                ('average_pvr', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'profile',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
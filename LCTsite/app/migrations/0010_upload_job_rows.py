@@ -0,0 +1,22 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_uploadjob_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boxtracker',
+            name='upload_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='boxes', to='app.uploadjob'),
+        ),
+        migrations.AddField(
+            model_name='candata',
+            name='upload_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cans', to='app.uploadjob'),
+        ),
+    ]
@@ -1,4 +1,8 @@
 from django.db import models
+from django.db.models import Avg, Count, Max, Min, Sum
+
+# read-only models over the DataAnalysis databases
+from .data.analysis.models import Profile, BoxPurchase, BoxFlavor, RawCan, BoxAnalysis, CanAnalysis, FlavorAnalysis, ProfileFlavorAnalysis, CanMeasurement, RollupCube, ConsumptionSeries, DistributionSketch
 
 
 class AbbreviationReferences(models.Model):
@@ -7,16 +11,52 @@ class AbbreviationReferences(models.Model):
     name = models.CharField(max_length=40)
 
 
+class BoxQuerySet(models.QuerySet):
+    """ Box statistics computed by the database in one aggregate query """
+
+    def statistics(self) -> dict:
+        """ Box count, spend, price range and purchase date range of the boxes """
+        return self.aggregate(
+            total_boxes=Count('pk'),
+            total_spend=Sum('price'),
+            average_price=Avg('price'),
+            min_price=Min('price'),
+            max_price=Max('price'),
+            first_purchase=Min('purchase_date'),
+            last_purchase=Max('purchase_date'),
+        )
+
+    def by_flavor(self) -> models.QuerySet:
+        """ Box count, spend and average price of each flavor """
+        return self.values('flavor').annotate(
+            total_boxes=Count('pk'),
+            total_spend=Sum('price'),
+            average_price=Avg('price'),
+        ).order_by('flavor')
+
+    def by_location(self) -> models.QuerySet:
+        """ Box count, spend and average price of each purchase location """
+        return self.values('location').annotate(
+            total_boxes=Count('pk'),
+            total_spend=Sum('price'),
+            average_price=Avg('price'),
+        ).order_by('location')
+
+
 class BoxTracker(models.Model):
-    bid = models.CharField(max_length=20)
-    flavor = models.CharField(max_length=25)
-    purchase_date = models.CharField(max_length=15)
-    price = models.CharField(max_length=10)
+    bid = models.CharField(max_length=20, db_index=True)
+    flavor = models.CharField(max_length=25, db_index=True)
+    purchase_date = models.DateField(null=True, db_index=True)
+    price = models.DecimalField(max_digits=7, decimal_places=2, null=True)
     location = models.CharField(max_length=5)
-    started = models.CharField(max_length=15)
-    finished = models.CharField(max_length=15)
+    started = models.DateField(null=True)
+    finished = models.DateField(null=True)
     contributing = models.BooleanField()
     filled = models.BooleanField()
+    # background upload that wrote the box (see data/jobs.py)
+    upload_job = models.ForeignKey('UploadJob', null=True, blank=True, on_delete=models.SET_NULL, related_name='boxes')
+
+    objects = BoxQuerySet.as_manager()
 
     def data(self) -> dict:
         return {
@@ -57,16 +97,46 @@ class BoxAverages(models.Model):
             ]
         }
 
+class CanQuerySet(models.QuerySet):
+    """ Can statistics computed by the database in one aggregate query """
+
+    MEASURES = ('initial_grams', 'initial_floz', 'final_grams', 'final_floz', 'percent_remaining_g', 'percent_remaining_floz')
+
+    def averages(self) -> dict:
+        """ Can count and the average of every mass/volume/percentage column """
+        return self.aggregate(total_cans=Count('pk'), **{f'average_{measure}': Avg(measure) for measure in self.MEASURES})
+
+    def by_box(self) -> models.QuerySet:
+        """ Can count and average remaining percentages of each box """
+        return self.values('bid__bid').annotate(
+            total_cans=Count('pk'),
+            average_percent_remaining_g=Avg('percent_remaining_g'),
+            average_percent_remaining_floz=Avg('percent_remaining_floz'),
+        ).order_by('bid__bid')
+
+    def by_flavor(self) -> models.QuerySet:
+        """ Can count and average remaining percentages of each flavor """
+        return self.values('bid__flavor').annotate(
+            total_cans=Count('pk'),
+            average_percent_remaining_g=Avg('percent_remaining_g'),
+            average_percent_remaining_floz=Avg('percent_remaining_floz'),
+        ).order_by('bid__flavor')
+
+
 class CanData(models.Model):
     cid = models.CharField(max_length=40)
     bid = models.ForeignKey(BoxTracker, on_delete=models.CASCADE)
-    initial_grams = models.CharField(max_length=3)
-    initial_floz = models.CharField(max_length=4)
-    final_grams = models.CharField(max_length=3)
-    final_floz = models.CharField(max_length=4)
+    initial_grams = models.FloatField(null=True)
+    initial_floz = models.FloatField(null=True)
+    final_grams = models.FloatField(null=True)
+    final_floz = models.FloatField(null=True)
     finished = models.CharField(max_length=2)
-    percent_remaining_g = models.CharField(max_length=5)
-    percent_remaining_floz = models.CharField(max_length=5)
+    percent_remaining_g = models.FloatField(null=True)
+    percent_remaining_floz = models.FloatField(null=True)
+    # background upload that wrote the can (see data/jobs.py)
+    upload_job = models.ForeignKey('UploadJob', null=True, blank=True, on_delete=models.SET_NULL, related_name='cans')
+
+    objects = CanQuerySet.as_manager()
 
 
     def stats(self) -> dict:
@@ -92,7 +162,51 @@ class BasicAverages(models.Model):
 
 
 class RawTracker(models.Model):
-    """ Tracks basic raw data """
-    value = models.CharField(max_length=10)
+    """ Tracks basic raw data; also holds the ID counters (see data/counters.py) """
+    value = models.CharField(max_length=40, unique=True)
     amount = models.IntegerField()
 
+
+
+class UploadJob(models.Model):
+    """ A box/can CSV upload processed in the background (see data/jobs.py) """
+    KINDS = [('boxes', 'Box Data'), ('cans', 'Can Data')]
+    STATUSES = [('queued', 'Queued'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')]
+
+    kind = models.CharField(max_length=5, choices=KINDS)
+    file = models.FileField(upload_to='uploads/')
+    box_bid = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=8, choices=STATUSES, default='queued')
+    total_rows = models.IntegerField(null=True)
+    processed_rows = models.IntegerField(default=0)
+    # size of the stored file and how much of it has been read, the progress until total_rows is known
+    total_bytes = models.IntegerField(null=True)
+    processed_bytes = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+
+    def percent(self) -> float|None:
+        """ Percent processed, by rows once the job is complete and by bytes read before then """
+        if self.total_rows:
+            return round(self.processed_rows / self.total_rows * 100, 1)
+        if self.total_bytes:
+            return round(min(self.processed_bytes / self.total_bytes, 1) * 100, 1)
+        return None
+
+    def progress(self) -> dict:
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'total_bytes': self.total_bytes,
+            'processed_bytes': self.processed_bytes,
+            'percent': self.percent(),
+            'error': self.error,
+            'created': self.created.isoformat() if self.created else None,
+            'started': self.started.isoformat() if self.started else None,
+            'finished': self.finished.isoformat() if self.finished else None,
+        }
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import DatabaseError
+
+
+class ReadOnlyDatabaseError(DatabaseError):
+    """ Write to a model of a read-only DataAnalysis database """
+
+
+class AnalysisRouter:
+    """ Routes the read-only DataAnalysis models (data/analysis/models.py) to their databases
+
+        Every other model stays on the default database, nothing is migrated onto the analysis
+        databases, and analysis models are never written; their connections are also opened
+        read-only (see settings.ANALYSIS_DATABASES).
+    """
+    @staticmethod
+    def _analysis_database(model) -> str|None:
+        return getattr(model, 'analysis_database', None) or None
+
+    def db_for_read(self, model, **hints):
+        return self._analysis_database(model)
+
+    def db_for_write(self, model, **hints):
+        database = self._analysis_database(model)
+        if database is not None:
+            raise ReadOnlyDatabaseError(f'{model.__name__} is read-only; {database} is written by the DataAnalysis pipeline')
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # relations only within one database
+        return self._analysis_database(type(obj1)) == self._analysis_database(type(obj2))
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.ANALYSIS_DATABASES:
+            return False
+        return None
@@ -1,3 +1,408 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .models import BoxAnalysis, BoxFlavor, BoxPurchase, BoxTracker, CanAnalysis, CanData, FlavorAnalysis, RawCan, RawTracker, UploadJob
+from .data import browse, charts, counters, jobs, streaming, upload
+from .routers import ReadOnlyDatabaseError
+
+
+# Behavior of the upload, ID allocation and browsing code
+#
+#     python manage.py test app
+#
+# The performance suite is in benchmarks.py and is run separately (see there).
+
+BOX_HEADER = 'Flavor,Purchased,Price,Location,Started,Finished\n'
+CAN_HEADER = 'Can,Initial Mass,Initial Volumne,Final Mass,Final Volume,Finished\n'
+BOX_ROW = 'PSF,01/02/2024,5.99,TGT,01/05/2024,01/12/2024\n'
+CAN_ROW = '1,370,12,15,0.5,Y\n'
+
+
+class ScratchSettingsMixin:
+    """ Points stored uploads and the data version file at a temporary directory """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.scratch_dir = tempfile.mkdtemp(prefix='lct-test-')
+        cls.scratch_settings = override_settings(
+            MEDIA_ROOT=cls.scratch_dir,
+            DATA_VERSION_FILE=os.path.join(cls.scratch_dir, 'data_version.txt'),
+            UPLOAD_PIPELINE_COMMAND=None,
+        )
+        cls.scratch_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.scratch_settings.disable()
+        shutil.rmtree(cls.scratch_dir, ignore_errors=True)
+        super().tearDownClass()
+
+
+def make_box(bid:str, **fields) -> BoxTracker:
+    values = {'flavor': bid.split('.')[1], 'location': 'TGT', 'contributing': False, 'filled': False, **fields}
+    return BoxTracker.objects.create(bid=bid, **values)
+
+
+class CounterTests(TestCase):
+
+    def test_reserve_hands_out_consecutive_blocks(self):
+        self.assertEqual(counters.reserve('Test', 3), 1)
+        self.assertEqual(counters.reserve('Test', 2), 4)
+        self.assertEqual(counters.reserve('Test'), 6)
+        self.assertEqual(counters.current('Test'), 6)
+
+    def test_initial_count_is_only_used_for_a_new_counter(self):
+        initial = mock.Mock(return_value=10)
+        self.assertEqual(counters.reserve('Test', 2, initial=initial), 11)
+        self.assertEqual(counters.reserve('Test', 2, initial=initial), 13)
+        initial.assert_called_once()
+
+    def test_reserve_many_reserves_every_counter(self):
+        counters.reserve('B', 4)
+        self.assertEqual(counters.reserve_many({'A': 2, 'B': 3, 'C': 0}), {'A': 1, 'B': 5})
+        self.assertEqual(counters.current('B'), 7)
+        self.assertFalse(RawTracker.objects.filter(value='C').exists())
+
+    def test_box_ids_match_one_at_a_time_reservations(self):
+        codes = ['PSF', 'LM', 'PSF', 'KL', 'PSF']
+        ids = counters.reserve_box_ids(codes)
+        self.assertEqual(ids, ['1.PSF.1', '2.LM.1', '3.PSF.2', '4.KL.1', '5.PSF.3'])
+        self.assertEqual(counters.next_box_id('LM'), '6.LM.2')
+
+    def test_abbreviation_uids_count_per_type(self):
+        self.assertEqual(counters.reserve_abbreviation_uids(['flavor', 'location', 'flavor']), ['1.flavor.1', '2.location.1', '3.flavor.2'])
+
+    def test_can_numbers_continue_from_existing_cans(self):
+        box = make_box('1.PSF.1')
+        CanData.objects.create(cid='1.CD.1', bid=box, finished='Y')
+        CanData.objects.create(cid='2.CD.2', bid=box, finished='Y')
+        self.assertEqual(counters.reserve_can_numbers(3), 3)
+        self.assertEqual(counters.reserve_can_numbers(1), 6)
+
+
+class CursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # every third box is missing its price and dates, and prices/dates repeat, so ties are broken by pk
+        for number in range(1, 24):
+            missing = number % 3 == 0
+            make_box(
+                f'{number}.PSF.{number}',
+                price=None if missing else Decimal(f'{4 + number % 4}.99'),
+                purchase_date=None if missing else datetime.date(2024, 1, 1 + number % 5),
+                finished=None if missing else datetime.date(2024, 2, 1 + number % 7),
+            )
+
+    def options(self, **params) -> dict:
+        return browse.parse_box_params({'page_size': '4', **params})
+
+    def expected_order(self, sort:str) -> list[str]:
+        return [row[0] for row in browse.filtered_boxes(self.options(sort=sort)).values_list('bid')]
+
+    def pages(self, sort:str, direction:str='after', cursor:str='') -> list[dict]:
+        """ Every page from the cursor on, following the after (or before) cursors """
+        pages = []
+        while True:
+            pages.append(browse.box_page(self.options(sort=sort, **{direction: cursor})))
+            cursor = pages[-1][direction]
+            if not cursor:
+                return pages
+            self.assertLess(len(pages), 20, 'pagination does not end')
+
+    @staticmethod
+    def bids(pages:list[dict]) -> list[list[str]]:
+        return [[row[0] for row in page['rows']] for page in pages]
+
+    def test_pages_cover_every_box_once(self):
+        for sort in ['bid', 'price', '-price', 'purchase_date', '-finished']:
+            with self.subTest(sort=sort):
+                seen = [bid for page in self.bids(self.pages(sort)) for bid in page]
+                self.assertEqual(seen, self.expected_order(sort))
+                self.assertEqual(len(seen), BoxTracker.objects.count())
+
+    def test_previous_pages_mirror_next_pages(self):
+        for sort in ['price', '-purchase_date']:
+            with self.subTest(sort=sort):
+                forward = self.pages(sort)
+                backward = self.pages(sort, 'before', forward[-1]['before'])
+                self.assertEqual(self.bids(backward)[::-1], self.bids(forward)[:-1])
+                self.assertIsNone(backward[-1]['before'])
+
+    def test_missing_values_sort_last_and_first(self):
+        boxes = list(browse.filtered_boxes(self.options(sort='purchase_date')).values_list('purchase_date', flat=True))
+        self.assertEqual(boxes[-7:], [None] * 7)
+        prices = list(browse.filtered_boxes(self.options(sort='price')).values_list('price', flat=True))
+        self.assertEqual(prices[:7], [None] * 7)
+
+    def test_crafted_cursors_fall_back_to_the_first_page(self):
+        def encode(value) -> str:
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+        crafted = [
+            ('price', 'not a cursor'),
+            ('price', base64.urlsafe_b64encode(b'\xff\xfe').decode()),
+            ('price', encode({'field': 'price'})),
+            ('price', encode(['price', '5.99'])),
+            ('price', encode(['bid', '5.99', 1])),
+            ('price', encode(['price', 5.99, 1])),
+            ('price', encode(['price', '5.99', '1'])),
+            ('price', encode(['price', '5.99', True])),
+            ('price', encode(['price', 'abc', 1])),
+            ('price', encode(['price', 'NaN', 1])),
+            ('price', encode(['price', 'Infinity', 1])),
+            ('purchase_date', encode(['purchase_date', '2024-13-45', 1])),
+        ]
+        for sort, cursor in crafted:
+            with self.subTest(sort=sort, cursor=cursor):
+                self.assertIsNone(browse.decode_cursor(cursor, sort))
+                self.assertEqual(browse.box_page(self.options(sort=sort, after=cursor)), browse.box_page(self.options(sort=sort)))
+
+        response = self.client.get('/view_stats', {'sort': 'price', 'after': crafted[-2][1]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_round_trip(self):
+        box = browse.filtered_boxes(self.options(sort='-finished')).values('pk', 'finished_key').first()
+        value, pk = browse.decode_cursor(browse.encode_cursor(box, '-finished'), '-finished')
+        self.assertEqual((value, pk), (box['finished_key'], box['pk']))
+
+
+class StreamingTests(SimpleTestCase):
+
+    def test_lines_are_reassembled_across_chunks(self):
+        text = 'a,b\r\n1,2\n\n3,"x\ny"\nlast'
+        for size in [1, 2, 5, len(text)]:
+            with self.subTest(size=size):
+                chunks = [text[i:i + size] for i in range(0, len(text), size)]
+                self.assertEqual(list(streaming.iter_lines(chunks)), text.splitlines(keepends=True))
+
+    def test_long_lines_are_rejected(self):
+        with self.assertRaises(streaming.UploadFormatError):
+            list(streaming.iter_lines(['a' * 10 + '\n'], max_line_length=5))
+        # a line without an ending isn't buffered past the limit either
+        with self.assertRaises(streaming.UploadFormatError):
+            list(streaming.iter_lines(['abc', 'def', 'ghi'], max_line_length=5))
+        self.assertEqual(list(streaming.iter_lines(['abcd\n'], max_line_length=5)), ['abcd\n'])
+
+    def test_gzip_is_detected_and_decoded_in_pieces(self):
+        text = (BOX_HEADER + BOX_ROW * 50).encode()
+        compressed = gzip.compress(text)
+        for size in [1, 3, 100, len(compressed)]:
+            with self.subTest(size=size):
+                chunks = [compressed[i:i + size] for i in range(0, len(compressed), size)]
+                self.assertEqual(''.join(streaming.decoded_chunks(chunks)), text.decode())
+
+    def test_concatenated_gzip_members_are_read(self):
+        self.assertEqual(''.join(streaming.decoded_chunks([gzip.compress(b'a,b\n') + gzip.compress(b'1,2\n')])), 'a,b\n1,2\n')
+
+    def test_gunzip_output_is_bounded(self):
+        # a small upload expanding into a large text is returned a piece at a time
+        compressed = gzip.compress(b'0' * (4 * streaming.GUNZIP_CHUNK_SIZE + 10))
+        pieces = list(streaming._gunzip(iter([compressed])))
+        self.assertTrue(all(len(piece) <= streaming.GUNZIP_CHUNK_SIZE for piece in pieces))
+        self.assertEqual(sum(len(piece) for piece in pieces), 4 * streaming.GUNZIP_CHUNK_SIZE + 10)
+
+    def test_invalid_uploads_raise_format_errors(self):
+        with self.assertRaises(streaming.UploadFormatError):
+            list(streaming.decoded_chunks([streaming.GZIP_MAGIC + b'not gzip data']))
+        with self.assertRaises(streaming.UploadFormatError):
+            list(streaming.decoded_chunks([b'caf\xe9\n']))
+
+    def test_bom_is_dropped(self):
+        self.assertEqual(''.join(streaming.decoded_chunks([b'\xef\xbb', b'\xbfa,b\n'])), 'a,b\n')
+
+    def test_rows_are_batched(self):
+        chunks = [(BOX_HEADER + BOX_ROW * 7).encode()]
+        batches = list(streaming.iter_row_batches(chunks, streaming.BOX_COLUMNS, 3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual(batches[0][0]['Flavor'], 'PSF')
+
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaises(streaming.UploadFormatError):
+            list(streaming.iter_row_batches([b'Flavor,Price\nPSF,5.99\n'], streaming.BOX_COLUMNS, 10))
+
+
+class UploadTests(ScratchSettingsMixin, TestCase):
+
+    def test_percent_loss_column(self):
+        self.assertEqual(upload.percent_loss_column(['370', '', 'NA', '0', '370'], ['15', '15', '15', '15', '']), [4.054, None, None, None, None])
+
+    def test_box_upload(self):
+        total = upload.stream_upload('boxes', [(BOX_HEADER + BOX_ROW * 3 + 'BBG,01/03/2024,$12.99,CSTCO,NA,\n').encode()], batch_size=2)
+        self.assertEqual(total, 4)
+        self.assertEqual(list(BoxTracker.objects.order_by('pk').values_list('bid', flat=True)), ['1.PSF.1', '2.PSF.2', '3.PSF.3', '4.BBG.1.BP', '4.BBG.1.BRB', '4.BBG.1.GSP'])
+        pack_box = BoxTracker.objects.get(bid='4.BBG.1.BP')
+        self.assertEqual((pack_box.price, pack_box.started, pack_box.finished), (Decimal('12.99'), None, None))
+
+    def test_can_ids_continue_across_uploads(self):
+        box = make_box('1.PSF.1')
+        upload.stream_upload('cans', [(CAN_HEADER + CAN_ROW * 2).encode()], box.bid)
+        upload.stream_upload('cans', [(CAN_HEADER + CAN_ROW).encode()], box.bid)
+        self.assertEqual(sorted(CanData.objects.values_list('cid', flat=True)), ['1.CD.1', '2.CD.1', '3.CD.1'])
+        box.refresh_from_db()
+        self.assertTrue(box.filled)
+
+    def test_packs_without_flavors_are_rejected(self):
+        packs = {'BBG': ('BP', 'BRB', 'GSP'), 'CMX': ()}
+        self.assertEqual(upload.bd_formatter('1.PSF.1', 'PSF', packs), [('1.PSF.1', 'PSF')])
+        with self.assertRaisesMessage(ValueError, 'Combo pack CMX has no flavors'):
+            upload.bd_formatter('2.CMX.1', 'CMX', packs)
+
+        with mock.patch.object(upload.combo_packs, 'packs', return_value=packs), \
+                self.assertRaisesMessage(streaming.UploadFormatError, 'Rows 1-2'):
+            upload.stream_upload('boxes', [(BOX_HEADER + BOX_ROW + 'CMX,01/03/2024,$12.99,CSTCO,,\n').encode()])
+        self.assertFalse(BoxTracker.objects.exists())
+
+    def test_bad_rows_raise_format_errors(self):
+        with self.assertRaisesMessage(streaming.UploadFormatError, 'Rows 3-3'):
+            upload.stream_upload('boxes', [(BOX_HEADER + BOX_ROW * 2 + 'PSF,someday,5.99,TGT,,\n').encode()], batch_size=2)
+
+    @override_settings(UPLOAD_IN_BACKGROUND=False)
+    def test_bad_upload_is_rejected_as_a_whole(self):
+        upload_file = SimpleUploadedFile('boxes.csv', (BOX_HEADER + BOX_ROW * 3 + 'PSF,01/02/2024,free,TGT,,\n').encode())
+        response = self.client.post('/insert_data', {'bdqu': upload_file}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid price', response.json()['error'])
+        self.assertFalse(BoxTracker.objects.exists())
+
+
+class UploadJobTests(ScratchSettingsMixin, TestCase):
+
+    def run_upload_job(self, kind:str, content:str, box_bid:str='') -> UploadJob:
+        job = UploadJob.objects.create(kind=kind, file=SimpleUploadedFile('upload.csv', content.encode()), box_bid=box_bid, total_bytes=len(content))
+        with override_settings(UPLOAD_BATCH_SIZE=2):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_completed_job_reports_progress_and_triggers_the_pipeline(self):
+        with mock.patch.object(jobs, 'trigger_pipeline') as trigger:
+            job = self.run_upload_job('boxes', BOX_HEADER + BOX_ROW * 5)
+
+        self.assertEqual(job.status, 'complete')
+        self.assertEqual((job.total_rows, job.processed_rows, job.percent()), (5, 5, 100.0))
+        self.assertEqual(BoxTracker.objects.filter(upload_job=job).count(), 5)
+        trigger.assert_called_once()
+
+    def test_failed_box_job_removes_its_rows(self):
+        make_box('1.PSF.1')
+        with mock.patch.object(jobs, 'trigger_pipeline') as trigger:
+            job = self.run_upload_job('boxes', BOX_HEADER + BOX_ROW * 4 + 'PSF,01/02/2024,free,TGT,,\n')
+
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.processed_rows, 4)
+        self.assertIn('Invalid price', job.error)
+        self.assertEqual(list(BoxTracker.objects.values_list('bid', flat=True)), ['1.PSF.1'])
+        trigger.assert_not_called()
+
+    def test_failed_can_job_removes_its_rows_and_unfills_the_box(self):
+        box = make_box('1.PSF.1')
+        job = self.run_upload_job('cans', CAN_HEADER + CAN_ROW * 3 + '4,heavy,12,15,0.5,Y\n', box.bid)
+
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(CanData.objects.exists())
+        box.refresh_from_db()
+        self.assertFalse(box.filled)
+
+        # cans uploaded before the failed job keep the box filled
+        self.run_upload_job('cans', CAN_HEADER + CAN_ROW, box.bid)
+        self.run_upload_job('cans', CAN_HEADER + CAN_ROW * 3 + '4,heavy,12,15,0.5,Y\n', box.bid)
+        box.refresh_from_db()
+        self.assertEqual(CanData.objects.count(), 1)
+        self.assertTrue(box.filled)
+
+    def test_pipeline_runs_are_coalesced(self):
+        with override_settings(UPLOAD_PIPELINE_COMMAND=['true']), \
+                mock.patch.object(jobs, '_pipeline_executor') as executor, mock.patch.object(jobs, '_pipeline_queued', False):
+            self.assertTrue(jobs.trigger_pipeline())
+            self.assertFalse(jobs.trigger_pipeline())
+            executor.submit.assert_called_once_with(jobs._run_pipeline, ['true'])
+
+            # once the queued run starts, the next upload queues another
+            with mock.patch.object(jobs.subprocess, 'run') as run:
+                run.return_value.returncode = 0
+                jobs._run_pipeline(['true'])
+            self.assertTrue(jobs.trigger_pipeline())
+
+    def test_disabled_pipeline_is_not_queued(self):
+        with mock.patch.object(jobs, '_pipeline_executor') as executor:
+            self.assertFalse(jobs.trigger_pipeline())
+        executor.submit.assert_not_called()
+
+
+class ChartDataTests(TestCase):
+    databases = {'default', 'raw_data', 'static_analyses', 'dynamic_analyses'}
+
+    # rows of the analysis tables as the DataAnalysis pipeline writes them (dates are pandas datetime text)
+    ROWS = {
+        BoxPurchase: [('A1', '2024-01-05 00:00:00', 5.99, 'TGT', 'alice'), ('B1', '2024-01-02 00:00:00', 6.49, 'WMT', 'bob')],
+        BoxFlavor: [('A1.PSF', 'A1', 'PSF', '2024-01-06 00:00:00', None, 1, 'alice'), ('B1.LM', 'B1', 'LM', None, None, 0, 'bob')],
+        RawCan: [('A1.PSF.1', 'A1.PSF', 'alice', 370, 12.0, 15, 0.5, None, 'Y'), ('B1.LM.1', 'B1.LM', 'bob', 365, 12.0, None, None, None, 'N')],
+        BoxAnalysis: [('A1.PSF', 1, 7, 100.0, 4.1, 4.2, 'alice')],
+        CanAnalysis: [('A1.PSF.1', 1, 355.0, 355.0, 11.5, 11.5, 4.1, 4.2, 'alice')],
+        FlavorAnalysis: [('PSF', 1, 7.0, 1.0, 100.0, 4.1, 4.2)],
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        # the pipeline creates these tables, so the (unmanaged) test databases start without them;
+        # they are created outside of the test transactions since SQLite can't alter schemas inside them
+        for model in cls.ROWS:
+            with connections[model.analysis_database].schema_editor() as editor:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for model in cls.ROWS:
+            with connections[model.analysis_database].schema_editor() as editor:
+                editor.delete_model(model)
+
+    @classmethod
+    def setUpTestData(cls):
+        for model, values in cls.ROWS.items():
+            with connections[model.analysis_database].cursor() as cursor:
+                cursor.executemany(f'INSERT INTO {model._meta.db_table} VALUES ({", ".join(["%s"] * len(values[0]))})', values)
+
+    def test_models_read_the_analysis_databases(self):
+        self.assertEqual(list(BoxFlavor.objects.order_by('id').values_list('id', 'box__location')), [('A1.PSF', 'TGT'), ('B1.LM', 'WMT')])
+        self.assertEqual(RawCan.objects.get(pk='A1.PSF.1').box.flavor, 'PSF')
+        with self.assertRaises(ReadOnlyDatabaseError):
+            FlavorAnalysis.objects.create(flavor='LM')
+
+    def test_boxes_join_their_analyses(self):
+        payload = charts.chart_payload('boxes', {})
+        self.assertEqual(payload['rows'], 2)
+        self.assertEqual(payload['data']['box_id'], ['B1.LM', 'A1.PSF'])
+        self.assertEqual(payload['data']['purchase_date'], ['2024-01-02', '2024-01-05'])
+        self.assertEqual(payload['data']['start_date'], [None, '2024-01-06'])
+        self.assertEqual(payload['data']['drink_velocity'], [None, 7])
+
+    def test_fields_and_filters(self):
+        payload = charts.chart_payload('cans', {'flavor': 'PSF', 'fields': 'percentage_mass_remaining,can_id'})
+        self.assertEqual(payload['data'], {'percentage_mass_remaining': [4.1], 'can_id': ['A1.PSF.1']})
+
+        payload = charts.chart_payload('cans', {'box': 'B1.LM'})
+        self.assertEqual((payload['data']['flavor'], payload['data']['objective_finish_status']), (['LM'], [None]))
+
+        self.assertEqual(charts.chart_payload('flavors', {'flavor': 'KL'})['data']['flavor'], [])
+        with self.assertRaises(charts.ChartDataError):
+            charts.chart_payload('flavors', {'fields': 'flavor,bogus'})
+
+    def test_missing_tables_are_unavailable(self):
+        response = self.client.get('/api/charts/can_measurements')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get('/api/charts/flavors').json()['data']['average_pmr'], [4.1])
@@ -9,6 +9,11 @@ urlpatterns = [
     path('add_data', views.add_data, name='add_data'),
     path('view_graphs', views.view_graphs, name='view_graphs'),
     path('view_stats', views.view_stats, name='view_stats'),
+    path('view_stats/export', views.export_stats, name='export_stats'),
+    path('profiles/<str:profile_id>', views.view_profile, name='view_profile'),
+    path('api/charts/<str:dataset>', views.chart_data, name='chart_data'),
     path('insert_data', views.insert_data, name='insert_data'),
+    path('upload_jobs/<int:job_id>', views.upload_job_status, name='upload_job_status'),
+    path('metrics/requests', views.request_metrics_summary, name='request_metrics'),
     path('test', views.test, name='test'),
 ]
\ No newline at end of file
@@ -1,32 +1,99 @@
 import datetime
 import csv
+import logging
 
-from django.shortcuts import render, redirect
-from django.http import HttpResponse
-from .models import BasicAverages, BoxAverages, BoxTracker, CanData, AbbreviationReferences, RawTracker
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render, redirect, get_object_or_404
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, JsonResponse, Http404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+from .models import Profile, BasicAverages, BoxAverages, BoxTracker, CanData, AbbreviationReferences, RawTracker, UploadJob
 
-from .data import upload
+from .data import upload, counters, browse, charts, jobs
+from .data.streaming import UploadFormatError
+from .data.versioning import versioned_page, bump_data_version
+from .middleware import request_metrics, view_budget
+
+
+logger = logging.getLogger(__name__)
 
 def index(respone):
     return render(respone, 'app/base.html')
 
+@versioned_page
 def home(respone):
     return render(respone, 'app/homepage.html')
 
 def add_data(response):
     all_boxes = [box[0] for box in BoxTracker.objects.filter(filled=False).values_list('bid')]
-    
 
-    return render(response, 'app/quick_upload.html', {'available_boxes':all_boxes})
+    # background uploads submitted by the last insert_data
+    job_ids = [int(job) for job in response.GET.get('jobs', '').split(',') if job.isdigit()]
+    upload_jobs = [job.progress() for job in UploadJob.objects.filter(pk__in=job_ids).order_by('pk')]
+
+    return render(response, 'app/quick_upload.html', {'available_boxes':all_boxes, 'upload_jobs':upload_jobs})
     # return render(respone, 'app/add_data.html', {'page_intro':title, 'page_description':pg_desc, 'title':title, 'verified':True})
 
+@versioned_page
 def view_graphs(respone):
-    return render(respone, 'app/view_graphs.html')
+    # charts are rendered by the DataAnalysis pipeline; the page only links the files in its manifest
+    images, generated = charts.chart_images()
+    return render(respone, 'app/view_graphs.html', {'charts': images, 'generated': generated})
 
+@versioned_page
 def view_stats(respone):
-    all_boxes = [box for box in BoxTracker.objects.all().values_list()] # list of tupled box data
-    return render(respone, 'app/view_data.html', {'documented_boxes':all_boxes})
-
+    # one keyset page of boxes at a time (see data/browse.py for the GET parameters)
+    options = browse.parse_box_params(respone.GET)
+    page = browse.box_page(options)
+    # totals over every filtered box, computed in one aggregate query
+    summary = browse.filtered_boxes(options).statistics()
+
+    # filters are carried over to the page/export links
+    filters = respone.GET.copy()
+    for key in ('after', 'before'):
+        filters.pop(key, None)
+
+    context = {
+        'documented_boxes': page['rows'],
+        'headers': [header for _, header in browse.BOX_COLUMNS],
+        'sort_fields': browse.SORT_FIELDS,
+        'options': options,
+        'next_cursor': page['after'],
+        'previous_cursor': page['before'],
+        'query': filters.urlencode(),
+        'summary': summary,
+    }
+    return render(respone, 'app/view_data.html', context)
+
+def export_stats(respone):
+    """ Streams every box matching the view_stats filters as a CSV """
+    options = browse.parse_box_params(respone.GET)
+    export = StreamingHttpResponse(browse.stream_boxes_csv(options), content_type='text/csv')
+    export['Content-Disposition'] = 'attachment; filename="box_data.csv"'
+    return export
+
+@versioned_page
+def view_profile(respone, profile_id:str):
+    # summaries are kept current by the DataAnalysis pipeline, so the page is a single-row lookup
+    profile = get_object_or_404(Profile, pk=profile_id)
+    return render(respone, 'app/profile.html', {'profile': profile})
+
+@require_safe
+@gzip_page
+@versioned_page
+def chart_data(respone, dataset:str):
+    """ Columnar JSON of a precomputed chart dataset (see data/charts.py for the datasets, fields and filters) """
+    if dataset not in charts.CHART_DATASETS:
+        raise Http404(f'Unknown chart dataset: {dataset}')
+
+    try:
+        payload = charts.chart_payload(dataset, respone.GET)
+    except charts.ChartDataError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+
+    return JsonResponse(payload, json_dumps_params={'separators': (',', ':')})
 
 
 
@@ -41,80 +108,79 @@ def insert_data(response):
         abbr_abbreviations = [response.POST.get(f'abbr-abbr{i}', '') for i in range(1, 7)]
         abbr_type = [response.POST.get(f'abbr-type{i}', '') for i in range(1, 7)]
         all_pairs = [(item[0][0],item[0][1], item[1]) for item in zip(zip(abbr_names, abbr_abbreviations), abbr_type)]
-        print(all_pairs)
-        
-        
-        for name, abbreviation, type in all_pairs:
-            if name != '':
-                current_all = len(AbbreviationReferences.objects.all())
-                current_type = len(AbbreviationReferences.objects.filter(uid__contains=type))
-                id = upload.abbreviation_uid_generator(current_all, current_type, type)
-                ar = AbbreviationReferences(uid=id, name=name, abbreviation=abbreviation)
-                ar.save()
-                print('uploaded')
+        new_pairs = [(name, abbreviation, type) for name, abbreviation, type in all_pairs if name != '']
+        uids = counters.reserve_abbreviation_uids([type for _, _, type in new_pairs])
+        AbbreviationReferences.objects.bulk_create([
+            AbbreviationReferences(uid=uid, name=name, abbreviation=abbreviation)
+            for uid, (name, abbreviation, _) in zip(uids, new_pairs)
+        ])
+        logger.debug('Uploaded %s abbreviations', len(new_pairs))
         
     
-    if response.FILES.get('bdqu'):
-        bd_file = response.FILES['bdqu'].read().decode('utf-8').splitlines()
-        format_bd = csv.DictReader(bd_file)
-
-        for box in format_bd:
-            update_raw_tracker(box['Flavor'])
-            id = bid_generator(box['Flavor'])
-            
-            formatting = upload.bd_formatter(id, box['Flavor'])
-
-            for bid, flavor_code in formatting:
-                # eventually, start and finish dates will also be flavor specific
-                bd = BoxTracker(bid=bid, flavor=flavor_code, purchase_date=box['Purchased'], price=box['Price'], location=box['Location'], started=box['Started'], finished=box['Finished'], contributing=False, filled=False)
-                bd.save()
-
-    if response.FILES.get('cdqu'):
-        cd_file = response.FILES['cdqu'].read().decode('utf-8').splitlines()
-        format_cd = csv.DictReader(cd_file)
-        box = response.POST['fill_box']
-        
-        for can in format_cd:
-            all_cans = len(CanData.objects.all()) + 1 
-            c_id = f'{all_cans}.CD.' + can['Can']
-
-            imass = can['Initial Mass']
-            ivol = can['Initial Volumne']
-            fmass = can['Final Mass']
-            fvol = can['Final Volume']
-
-            plm = upload.percent_loss_calculator(imass, fmass)
-            plv = upload.percent_loss_calculator(ivol, fvol)
-
-            cd = CanData(cid=c_id, bid=BoxTracker.objects.get(bid=box), initial_grams=imass, initial_floz=ivol, final_grams=fmass, final_floz=fvol, finished=can['Finished'], percent_remaining_g=plm, percent_remaining_floz=plv)
-            cd.save()
-
-            bx = BoxTracker.objects.get(bid=box)
-            bx.filled = True
-            bx.save()
+    queued = []
+    if settings.UPLOAD_IN_BACKGROUND:
+        # files are stored and returned right away; the upload workers parse and insert them (see data/jobs.py)
+        if response.FILES.get('bdqu'):
+            queued.append(jobs.submit_upload('boxes', response.FILES['bdqu']))
+        if response.FILES.get('cdqu'):
+            queued.append(jobs.submit_upload('cans', response.FILES['cdqu'], response.POST['fill_box']))
+    else:
+        # files are read and inserted a batch at a time without loading them whole (see upload.stream_upload);
+        # a file that can't be read is rejected as a whole
+        try:
+            with transaction.atomic():
+                if response.FILES.get('bdqu'):
+                    upload.stream_upload('boxes', response.FILES['bdqu'].chunks(), batch_size=settings.UPLOAD_BATCH_SIZE)
+
+                if response.FILES.get('cdqu'):
+                    upload.stream_upload('cans', response.FILES['cdqu'].chunks(), response.POST['fill_box'], settings.UPLOAD_BATCH_SIZE)
+        except UploadFormatError as e:
+            if 'submitabbr' in response.POST:
+                bump_data_version()
+            if response.accepts('application/json') and not response.accepts('text/html'):
+                return JsonResponse({'error': str(e)}, status=400)
+            return HttpResponseBadRequest(f'Invalid upload: {e}')
     
+    # cached dashboard pages are keyed on the data version (background jobs bump it once they write)
+    if 'submitabbr' in response.POST or (response.FILES and not queued):
+        bump_data_version()
+
     # return HttpResponse('Uploaded Box Data')
-    
+
+    if queued and response.accepts('application/json') and not response.accepts('text/html'):
+        return JsonResponse({'jobs': [job.progress() for job in queued]}, status=202)
+    if queued:
+        return redirect(f'/add_data?jobs={",".join(str(job.pk) for job in queued)}')
     return redirect('/add_data')
 
-def update_raw_tracker(flavor:str) -> bool:
-    total = RawTracker.objects.get(value='TotalBoxes')
-    total.amount += 1
-    total.save()
-    
-    all_values = [data[0] for data in RawTracker.objects.values_list('value')]
-    if flavor not in all_values:
-        update = RawTracker(value=flavor, amount=1)
-    elif flavor in all_values:
-        update = RawTracker.objects.get(value=flavor)
-        update.amount += 1
-    update.save()
-
-    return True
+def upload_job_status(response, job_id:int):
+    """ Status and progress of a background upload """
+    job = get_object_or_404(UploadJob, pk=job_id)
+    return JsonResponse(job.progress())
+
+def request_metrics_summary(response):
+    """ Latency and query statistics of the latest requests of each view (see middleware.RequestMetricsMiddleware) """
+    if not settings.REQUEST_METRICS:
+        raise Http404('Request metrics are disabled')
+    if not (settings.DEBUG or response.user.is_staff):
+        raise PermissionDenied
+
+    summary = request_metrics.summary()
+    if response.accepts('application/json') and not response.accepts('text/html'):
+        return JsonResponse({'views': summary, 'budgets': settings.REQUEST_BUDGETS})
+
+    for row in summary:
+        row['budget'] = view_budget(row['view'])
+    return render(response, 'app/request_metrics.html', {'views': summary, 'window': settings.REQUEST_METRICS_WINDOW})
+
+def update_raw_tracker(flavor:str) -> str:
+    """ Atomically advances the total and flavor box counters, returning the new box ID """
+    return counters.next_box_id(flavor)
  
 def bid_generator(flavor_code:str) -> str:
-    overall = RawTracker.objects.get(value='TotalBoxes').amount
-    flavor_amt = RawTracker.objects.get(value=flavor_code).amount
+    """ Latest box ID handed out for the flavor (does not reserve a new one) """
+    overall = counters.current(counters.TOTAL_BOXES)
+    flavor_amt = counters.current(flavor_code)
     return f'{overall}.{flavor_code}.{flavor_amt}'
 
 
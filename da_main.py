@@ -1,15 +1,61 @@
 # import DataAnalysis as da
 # import DataAnalysis.config as dac
 
-from DataAnalysis.database.run import DAUtilPipelinePresets
+from DataAnalysis.config import PROFILE_DIR
+from DataAnalysis.database.run import DAUtilPipelinePresets, PIPELINE_STAGES
+from DataAnalysis.database.utils.profiling import StageProfiler
+from DataAnalysis.utils import get_current_time
 # from DataAnalysis.database.tools.dynamic_analysis import update_flavor_analysis
 # from DataAnalysis.database.utils.registry import DatabaseRegistry
 
+import argparse
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Runs the La Croix data pipeline')
+    parser.add_argument(
+        '--preset', type=int, default=1, choices=[1, 2],
+        help='1: recreate databases and fill everything (default). 2: extract raw data and update analyses'
+    )
+    parser.add_argument(
+        '--stage', action='append', choices=[stage.name for stage in PIPELINE_STAGES], metavar='STAGE',
+        help='Run only this stage and its dependencies instead of a preset (repeatable)'
+    )
+    parser.add_argument(
+        '--profile-id', action='append', metavar='PROFILE_ID',
+        help='Re-process only this profile\'s data, leaving other profiles untouched (repeatable). Runs the preset 2 stages unless --stage is given'
+    )
+    parser.add_argument('--force', action='store_true', help='Re-run stages even if their inputs are unchanged')
+    parser.add_argument('--checkpoint', action='store_true', help='Save a checkpoint of every completed stage for a later --resume')
+    parser.add_argument('--resume', action='store_true', help='Restore stages from matching checkpoints (and checkpoint the stages that run)')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Profile each stage; writes <stage>.prof dumps, stacks.collapsed and summary.txt (stages run serially)'
+    )
+    parser.add_argument('--trace-memory', action='store_true', help='Record the peak memory of each stage (implies --profile)')
+    parser.add_argument('--top', type=int, default=25, help='Number of functions in the profile summary')
+    parser.add_argument('--profile-dir', default=None, help=f'Profile output directory. Default is a timestamped folder in {PROFILE_DIR}')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-        
-    pipelines = DAUtilPipelinePresets()
-    pipelines.run_preset(1) # NOTE recreate databases; fills all databases in order: reference -> raw_data -> static_analyses -> dynamic_analyses
+    args = parse_args()
 
-    
+    profiler = None
+    if args.profile or args.trace_memory:
+        output_dir = args.profile_dir if args.profile_dir else str(PROFILE_DIR / get_current_time('FILE_DATETIME'))
+        profiler = StageProfiler(output_dir, trace_memory=args.trace_memory, top=args.top)
+
+    pipelines = DAUtilPipelinePresets()
+    try:
+        profiles = tuple(args.profile_id) if args.profile_id else None
+        if args.stage:
+            pipelines.run_stages(tuple(args.stage), force=args.force, checkpoint=args.checkpoint, resume=args.resume, profiler=profiler, profiles=profiles)
+        elif profiles:
+            pipelines.reprocess_profiles(profiles, force=args.force, checkpoint=args.checkpoint, resume=args.resume, profiler=profiler)
+        else:
+            pipelines.run_preset(args.preset, force=args.force, checkpoint=args.checkpoint, resume=args.resume, profiler=profiler) # NOTE preset 1 recreates databases; fills all databases in order: reference -> raw_data -> static_analyses -> dynamic_analyses
+    finally:
+        # still report on the stages that ran if one failed
+        if profiler:
+            profiler.write_reports()